@@ -0,0 +1,30 @@
+import hmac
+
+import fastapi as f
+from typing import List, Literal, Optional
+
+from config import get_config
+from models.duplicate import DuplicateCluster
+from helpers.dedup import duplicate_index
+
+config = get_config()
+
+router = f.APIRouter(
+    prefix="/api/duplicates",
+    tags=["Duplicates"],
+)
+
+
+def require_admin(x_admin_token: str = f.Header("")):
+    # Lost-item clusters share a reporter, so clusters reveal which reports belong to one person
+    if not config.DEDUP_ADMIN_TOKEN: raise f.HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token.encode(), config.DEDUP_ADMIN_TOKEN.encode()): raise f.HTTPException(status_code=403, detail="Invalid admin token.")
+
+# --- GET /api/duplicates ---
+@router.get("", response_model=List[DuplicateCluster], dependencies=[f.Depends(require_admin)])
+async def list_duplicate_clusters(
+    kind: Optional[Literal["lost", "found"]] = None,
+    skip: int = f.Query(0, ge=0), limit: int = f.Query(50, ge=1, le=200),
+):
+    """ Clusters of near-duplicate reports, largest first, from the in-memory LSH index. Requires X-Admin-Token. """
+    return duplicate_index.clusters(kind, skip=skip, limit=limit)
@@ -8,15 +8,27 @@ import uuid
 import os
 import shutil
 
-from models.found_item import FoundItemCreate, FoundItemDB, FoundItemPublicResponse
+from models.found_item import FoundItemCreate, FoundItemDB, FoundItemPublicResponse, FoundItemPublicListAdapter
 from db_setup import get_db, config
 from helpers.logger import logger
-from helpers.email_utils import send_email
+from helpers.email_utils import send_email_async
+from helpers.serialization import dump_list, public_projection
+from helpers.http_cache import conditional_response
+from helpers import stats
+from helpers import item_cache
+from helpers.uploads import claim_uploads, restore_uploads, UploadError
+from helpers.admission import check_email_limit
+from helpers.image_index import index_images
+from helpers.invalidation import publish
+from helpers.dedup import dedup_fields, duplicate_index
+from helpers.geo import resolve_location, parse_near, point, near_pipeline
 
 # Use the same IMAGE_DIR as defined in api/items.py or main.py
 # Ensure consistency or move IMAGE_DIR definition to config.py
-IMAGE_DIR = "images"
-os.makedirs(IMAGE_DIR, exist_ok=True) # Ensure it exists
+IMAGE_DIR = "images" # Created by the app lifespan
+
+PUBLIC_PROJECTION = public_projection(FoundItemPublicResponse)
+LIST_QUERY = {"duplicate_of": None} if config.DEDUP_HIDE_IN_LISTS else {}
 
 router = f.APIRouter(
     prefix="/api/found-items",
@@ -33,18 +45,27 @@ async def create_found_item_report(
     state: Annotated[Optional[str], Form()] = None,
     city: Annotated[Optional[str], Form()] = None,
     images: Annotated[List[UploadFile], File(description="Up to 5 images of the found item")] = [],
+    upload_ids: Annotated[List[str], Form(description="IDs of completed resumable uploads (counted toward the 5 image limit)")] = [],
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """
     Create a new report for an item that someone has found.
     """
     logger.info(f"Received request to create found item report. Contact provided: {bool(finder_contact)}")
+    await check_email_limit(finder_contact)
 
-    if len(images) > 5:
+    if len(images) + len(upload_ids) > 5:
         raise HTTPException(status_code=400, detail="Maximum of 5 images allowed.")
 
+    try: date_found = datetime.fromisoformat(date_found_str.replace("Z", "+00:00")) # Validate before claiming uploads
+    except ValueError as e:
+        logger.warning(f"Validation error creating found item report: {e}")
+        raise HTTPException(status_code=422, detail=f"Invalid date format: {date_found_str}")
+
     # --- Image Saving ---
-    saved_image_filenames = []
+    try: claimed_uploads = await claim_uploads(db, config, upload_ids, IMAGE_DIR, prefix="found_report_")
+    except UploadError as e: raise HTTPException(status_code=e.status_code, detail=e.detail)
+    saved_image_filenames = [upload["image_filename"] for upload in claimed_uploads]
     for image in images:
         if not image.filename: continue
         allowed_types = ["image/jpeg", "image/png", "image/webp", "image/gif"]
@@ -61,10 +82,9 @@ async def create_found_item_report(
         except Exception as e: logger.error(f"Failed save found item image {image.filename}: {e}", exc_info=True)
         finally: await image.close()
 
-    # --- Data Validation & Model Creation ---
+    # --- Model Creation ---
     item_db: Optional[FoundItemDB] = None
     try:
-        date_found = datetime.fromisoformat(date_found_str.replace("Z", "+00:00"))
         # Basic validation for finder_contact if provided (could enhance)
         if finder_contact and '@' not in finder_contact and not finder_contact.replace('+','').isdigit():
              logger.warning(f"Potentially invalid finder_contact format: {finder_contact}")
@@ -75,21 +95,32 @@ async def create_found_item_report(
             country=country, state=state, city=city,
             image_filenames=saved_image_filenames
         )
-        item_db = FoundItemDB(**item_data.dict())
+        item_db = FoundItemDB(**item_data.model_dump())
 
-    except (p.ValidationError, ValueError) as e:
+    except p.ValidationError as e:
         logger.warning(f"Validation error creating found item report: {e}")
-        detail = e.errors() if isinstance(e, p.ValidationError) else f"Invalid date format: {date_found_str}"
-        raise HTTPException(status_code=422, detail=detail)
-    if item_db is None: raise HTTPException(status_code=500, detail="Item data processing error.")
+        await restore_uploads(db, config, claimed_uploads, IMAGE_DIR)
+        raise HTTPException(status_code=422, detail=e.errors())
 
     # --- DB Insert ---
+    inserted = False
     try:
         # Note: No HttpUrl conversion needed here as finder_contact is just str
-        insert_result = await db.found_items.insert_one(item_db.dict(by_alias=True))
+        item_dict_for_db = item_db.model_dump(by_alias=True)
+        item_dict_for_db.update(await resolve_location(country, state, city))
+        item_dict_for_db["dedup"] = dedup_fields("found", description, country, city, date_found=date_found)
+        duplicate = duplicate_index.find_duplicate("found", item_dict_for_db["dedup"])
+        if duplicate:
+            item_dict_for_db["duplicate_of"] = duplicate[0] # Several finders reporting the same item
+            logger.info(f"Found item {item_db.id} near-duplicates {duplicate[0]} (similarity {duplicate[1]:.2f}).")
+        insert_result = await db.found_items.insert_one(item_dict_for_db)
         if not insert_result.inserted_id:
              raise HTTPException(status_code=500, detail="Failed to save found item report.")
+        inserted = True
         logger.info(f"Successfully inserted found item {item_db.id} into database.")
+        await stats.record_item(db, "found", item_dict_for_db)
+        await publish(db, "found_items", "insert", item_db.id, {"dedup": item_dict_for_db["dedup"], "duplicate_of": item_dict_for_db.get("duplicate_of")})
+        index_images(db, IMAGE_DIR, "found", item_db.id, saved_image_filenames)
 
         # Fetch the newly created item from DB to ensure it includes DB-generated fields like _id
         created_item_doc = await db.found_items.find_one({"_id": insert_result.inserted_id})
@@ -104,19 +135,28 @@ async def create_found_item_report(
 
     except Exception as e:
         logger.error(f"Database error inserting found item: {str(e)}", exc_info=True)
+        if not inserted: await restore_uploads(db, config, claimed_uploads, IMAGE_DIR)
         raise HTTPException(status_code=500, detail="Database error occurred while saving report.")
 
 
 @router.get("", response_model=List[FoundItemPublicResponse])
 async def list_public_found_items(
+    request: f.Request,
     skip: int = f.Query(0, ge=0), limit: int = f.Query(10, ge=1, le=100),
+    near: Optional[str] = f.Query(None, description="'lat,lng': only items within radius_km, nearest first"),
+    radius_km: float = f.Query(config.GEO_DEFAULT_RADIUS_KM, gt=0, le=config.GEO_MAX_RADIUS_KM),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Retrieve a list of publicly viewable found items."""
-    logger.debug(f"Fetching public found items list: skip={skip}, limit={limit}")
-    items_cursor = db.found_items.find().sort("created_at", -1).skip(skip).limit(limit)
+    """Retrieve a list of publicly viewable found items, newest first or by distance from `near`."""
+    logger.debug(f"Fetching public found items list: skip={skip}, limit={limit}, near={near}")
+    if near:
+        try: center = point(*parse_near(near))
+        except ValueError: raise HTTPException(status_code=422, detail="near must be 'lat,lng'.")
+        items_cursor = db.found_items.aggregate(near_pipeline(center, radius_km, PUBLIC_PROJECTION, skip, limit, query=LIST_QUERY))
+    else:
+        items_cursor = db.found_items.find(LIST_QUERY, PUBLIC_PROJECTION).sort("created_at", -1).skip(skip).limit(limit)
     items = await items_cursor.to_list(length=limit)
-    return items
+    return conditional_response(request, dump_list(FoundItemPublicListAdapter, items), max_age=config.LIST_CACHE_MAX_AGE)
 
 
 @router.get("/{item_id}", response_model=FoundItemPublicResponse)
@@ -126,7 +166,7 @@ async def get_public_found_item(item_id: str, db: AsyncIOMotorDatabase = Depends
     try: uuid.UUID(item_id)
     except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
 
-    item = await db.found_items.find_one({"_id": item_id})
+    item = await item_cache.find_item(db, "found_items", item_id)
     if item is None: raise HTTPException(status_code=404, detail="Found item not found.")
 
     logger.info(f"Successfully retrieved public found item {item_id}.")
@@ -148,7 +188,8 @@ async def claim_found_item(
     logger.info(f"Received claim for found item {item_id}")
     try: uuid.UUID(item_id)
     except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
-    logger.debug(f"Claim data: {claim_data.json()}")
+    await check_email_limit(claim_data.owner_email)
+    logger.debug(f"Claim data: {claim_data.model_dump_json()}")
     # Get the found item to verify it exists and get finder contact info
     item = await db.found_items.find_one({"_id": item_id})
     logger.debug(f"Found item details: {item}")
@@ -174,7 +215,7 @@ async def claim_found_item(
     )
     logger.debug(f"Sending claim email to finder: {finder_contact}")
     
-    email_sent = send_email(to_email=finder_contact, subject=email_subj, body=email_body)
+    email_sent = await send_email_async(to_email=finder_contact, subject=email_subj, body=email_body)
     if not email_sent:
         logger.error(f"Failed to send claim email to finder {finder_contact} for item {item_id}")
         raise HTTPException(status_code=500, detail="Failed to notify the finder. Please try again later.")
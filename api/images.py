@@ -0,0 +1,63 @@
+import fastapi as f
+from fastapi import UploadFile, File, Depends, HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import List, Literal
+import uuid
+import os
+
+from models.match import ImageMatch
+from models.upload import ALLOWED_IMAGE_TYPES
+from db_setup import get_db, config
+from helpers.logger import logger
+from helpers.archive import find_one_live_or_archived
+from helpers.image_hash import hash_images
+from helpers.image_index import image_index
+
+router = f.APIRouter(
+    prefix="/api/images",
+    tags=["Images"],
+)
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# --- GET /api/images/similar ---
+@router.get("/similar", response_model=List[ImageMatch])
+async def similar_to_item(
+    item_id: str, kind: Literal["lost", "found"] = "lost",
+    max_distance: int = f.Query(config.IMAGE_MATCH_MAX_DISTANCE, ge=0, le=32), limit: int = f.Query(20, ge=1, le=100),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """ Photos visually similar to any photo of the given lost or found item. """
+    try: uuid.UUID(item_id)
+    except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
+    item, _ = await find_one_live_or_archived(db, "lost_items" if kind == "lost" else "found_items", {"_id": item_id})
+    if item is None: raise HTTPException(status_code=404, detail="Item not found.")
+    return image_index.search_hashes(item.get("image_hashes", []), max_distance, exclude_item=item_id, limit=limit)
+
+# --- POST /api/images/similar ---
+@router.post("/similar", response_model=List[ImageMatch])
+async def similar_to_upload(
+    image: UploadFile = File(..., description="Photo to search for"),
+    max_distance: int = f.Query(config.IMAGE_MATCH_MAX_DISTANCE, ge=0, le=32), limit: int = f.Query(20, ge=1, le=100),
+):
+    """ Photos visually similar to an uploaded photo. The photo is hashed and discarded. """
+    if image.content_type not in ALLOWED_IMAGE_TYPES: raise HTTPException(status_code=415, detail="Unsupported image type.")
+    too_large = HTTPException(status_code=413, detail=f"File exceeds the {config.UPLOAD_MAX_BYTES} byte limit.")
+    if image.size is not None and image.size > config.UPLOAD_MAX_BYTES: raise too_large
+    os.makedirs(config.UPLOAD_TMP_DIR, exist_ok=True)
+    tmp_name = f"search_{uuid.uuid4()}"
+    try:
+        with open(os.path.join(config.UPLOAD_TMP_DIR, tmp_name), "wb") as buffer:
+            await image.seek(0)
+            written = 0
+            while chunk := await image.read(COPY_CHUNK_BYTES): # Counted, in case the part carried no size
+                written += len(chunk)
+                if written > config.UPLOAD_MAX_BYTES: raise too_large
+                buffer.write(chunk)
+        hashes = await hash_images(config.UPLOAD_TMP_DIR, [tmp_name])
+    finally:
+        await image.close()
+        try: os.remove(os.path.join(config.UPLOAD_TMP_DIR, tmp_name))
+        except OSError as e: logger.warning(f"Could not remove search image {tmp_name}: {e}")
+    if not hashes: raise HTTPException(status_code=422, detail="Image could not be decoded.")
+    return image_index.search_hashes(hashes, max_distance, limit=limit)
@@ -12,7 +12,7 @@ import shutil # For file operations
 from models.item import (
     LostItemCreate, LostItemDB, LostItemManagementResponse,
     LostItemPublicResponse, ItemFoundPayload, LostItemUpdate,
-    FoundReportDetail
+    FoundReportDetail, LostItemPublicListAdapter
 )
 # Import newly created FoundItem models (though not used in this router)
 from models.found_item import (
@@ -20,18 +20,45 @@ from models.found_item import (
 )
 from db_setup import get_db, config # Import config object directly
 from helpers.logger import logger
-from helpers.email_utils import send_email
+from helpers.email_utils import send_email_async
+from helpers.serialization import dump_list, public_projection
+from helpers.http_cache import conditional_response
+from helpers import stats
+from helpers.archive import find_one_live_or_archived
+from helpers.uploads import claim_uploads, restore_uploads, UploadError
+from helpers import management_tokens
+from helpers.admission import check_email_limit
+from helpers.image_index import index_images
+from helpers.invalidation import publish
+from helpers import item_cache
+from helpers.dedup import dedup_fields, duplicate_index, release_canonical
+from helpers.matching import find_matches
+from models.match import FoundItemMatch
+from helpers.geo import resolve_location, parse_near, point, near_pipeline
+from helpers.nginx import image_response
 
-# Define the base directory for image storage relative to the project root
+# Define the base directory for image storage relative to the project root (created by the app lifespan)
 IMAGE_DIR = "images"
-# Ensure the image directory exists
-os.makedirs(IMAGE_DIR, exist_ok=True)
+
+HTTP_URL_ADAPTER = p.TypeAdapter(p.HttpUrl)
+PUBLIC_PROJECTION = public_projection(LostItemPublicResponse)
+FOUND_PUBLIC_PROJECTION = public_projection(FoundItemPublicResponse)
+LIST_QUERY = {"duplicate_of": None} if config.DEDUP_HIDE_IN_LISTS else {}
 
 router = f.APIRouter(
     prefix="/api/items",
     tags=["Lost Items"],
 )
 
+async def get_managed_item(db: AsyncIOMotorDatabase, item_id: str, token: str):
+    """ Loads an item (live or archived) and verifies its management token; 404/403 otherwise. """
+    item, collection = await find_one_live_or_archived(db, "lost_items", {"_id": item_id})
+    if item is None: raise HTTPException(status_code=404, detail="Item not found.")
+    if not await management_tokens.verify_token(item, token, collection): raise HTTPException(status_code=403, detail="Invalid token.")
+    item.pop("management_token_hash", None)
+    item["management_token"] = token # Only the hash is stored; echo the verified token back
+    return item, collection
+
 # --- POST /api/items (Create Lost Item) ---
 @router.post("", response_model=LostItemManagementResponse, status_code=f.status.HTTP_201_CREATED)
 async def create_lost_item(
@@ -43,13 +70,26 @@ async def create_lost_item(
     state: Annotated[Optional[str], Form()] = None,
     city: Annotated[Optional[str], Form()] = None,
     images: Annotated[List[UploadFile], File(description="Up to 5 images of the lost item")] = [],
+    upload_ids: Annotated[List[str], Form(description="IDs of completed resumable uploads (counted toward the 5 image limit)")] = [],
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """ Create a new lost item report. """
     logger.info(f"Received request to create lost item from {reporter_email}")
-    if len(images) > 5: raise HTTPException(status_code=400, detail="Maximum of 5 images allowed.")
+    await check_email_limit(reporter_email)
+    if len(images) + len(upload_ids) > 5: raise HTTPException(status_code=400, detail="Maximum of 5 images allowed.")
 
-    saved_image_filenames = []
+    try: # Validate before claiming uploads, so a bad request doesn't consume them
+        date_lost = datetime.fromisoformat(date_lost_str.replace("Z", "+00:00"))
+        product_link: Optional[p.HttpUrl] = None
+        if product_link_str: product_link = HTTP_URL_ADAPTER.validate_python(product_link_str)
+    except (p.ValidationError, ValueError) as e:
+        logger.warning(f"Validation error creating item: {e}")
+        detail = e.errors() if isinstance(e, p.ValidationError) else f"Invalid date format: {date_lost_str}"
+        raise HTTPException(status_code=422, detail=detail)
+
+    try: claimed_uploads = await claim_uploads(db, config, upload_ids, IMAGE_DIR)
+    except UploadError as e: raise HTTPException(status_code=e.status_code, detail=e.detail)
+    saved_image_filenames = [upload["image_filename"] for upload in claimed_uploads]
     for image in images: # Image Saving Loop
         if not image.filename: continue
         allowed_types = ["image/jpeg", "image/png", "image/webp", "image/gif"]
@@ -66,38 +106,47 @@ async def create_lost_item(
         finally: await image.close()
 
     item_db: Optional[LostItemDB] = None
-    try: # Data Validation & Model Creation
-        date_lost = datetime.fromisoformat(date_lost_str.replace("Z", "+00:00"))
-        product_link: Optional[p.HttpUrl] = None
-        if product_link_str: product_link = p.parse_obj_as(p.HttpUrl, product_link_str)
+    try: # Model Creation
         item_data = LostItemCreate(
             description=description, reporter_email=reporter_email, date_lost=date_lost,
             product_link=product_link, image_filenames=saved_image_filenames,
             country=country, state=state, city=city
         )
-        item_db = LostItemDB(**item_data.dict())
-    except (p.ValidationError, ValueError) as e:
+        item_db = LostItemDB(**item_data.model_dump())
+    except p.ValidationError as e:
         logger.warning(f"Validation error creating item: {e}")
-        detail = e.errors() if isinstance(e, p.ValidationError) else f"Invalid date format: {date_lost_str}"
-        raise HTTPException(status_code=422, detail=detail)
-    if item_db is None: raise HTTPException(status_code=500, detail="Item data processing error.")
+        await restore_uploads(db, config, claimed_uploads, IMAGE_DIR)
+        raise HTTPException(status_code=422, detail=e.errors())
 
+    inserted = False
     try: # DB Insert & Email
-        item_dict_for_db = item_db.dict(by_alias=True)
+        item_dict_for_db = item_db.model_dump(by_alias=True)
         if item_dict_for_db.get("product_link"): item_dict_for_db["product_link"] = str(item_dict_for_db["product_link"])
+        item_dict_for_db["management_token_hash"] = await management_tokens.hash_token(item_dict_for_db.pop("management_token"))
+        item_dict_for_db.update(await resolve_location(country, state, city))
+        item_dict_for_db["dedup"] = dedup_fields("lost", description, country, city, reporter_email=reporter_email)
+        duplicate = duplicate_index.find_duplicate("lost", item_dict_for_db["dedup"])
+        if duplicate:
+            item_db.duplicate_of = item_dict_for_db["duplicate_of"] = duplicate[0]
+            logger.info(f"Item {item_db.id} near-duplicates {duplicate[0]} (similarity {duplicate[1]:.2f}).")
         insert_result = await db.lost_items.insert_one(item_dict_for_db)
         if not insert_result.inserted_id: raise HTTPException(status_code=500, detail="Failed to save item report.")
+        inserted = True
         logger.info(f"Inserted item {item_db.id} into database.")
+        await stats.record_item(db, "lost", item_dict_for_db)
+        await publish(db, "lost_items", "insert", item_db.id, {"dedup": item_dict_for_db["dedup"], "duplicate_of": item_db.duplicate_of})
+        index_images(db, IMAGE_DIR, "lost", item_db.id, saved_image_filenames)
 
         mgmt_link = f"{config.FRONTEND_BASE_URL}/manage/{item_db.id}?token={item_db.management_token}"
         email_subj = "Your Lost Item Report"
         email_body = f"Report details:\nDesc: {item_db.description}\nManage: {mgmt_link}\nKeep link secure."
-        email_sent = send_email(to_email=item_db.reporter_email, subject=email_subj, body=email_body)
+        email_sent = await send_email_async(to_email=item_db.reporter_email, subject=email_subj, body=email_body)
         if not email_sent: logger.error(f"Failed management email item {item_db.id} to {item_db.reporter_email}.")
         else: logger.info(f"Management email sent for item {item_db.id}")
         return item_db
     except Exception as e:
         logger.error(f"Database error inserting item: {str(e)}", exc_info=True)
+        if not inserted: await restore_uploads(db, config, claimed_uploads, IMAGE_DIR)
         raise HTTPException(status_code=500, detail="Database error during save.")
 
 # --- GET /api/items/{item_id}/manage ---
@@ -106,30 +155,58 @@ async def get_item_for_management(item_id: str, token: str = f.Query(...), db: A
     """ Retrieve item details for management. """
     try: uuid.UUID(item_id)
     except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
-    item = await db.lost_items.find_one({"_id": item_id, "management_token": token})
-    if item is None:
-        exists = await db.lost_items.count_documents({"_id": item_id}) > 0
-        if exists: raise HTTPException(status_code=403, detail="Invalid token.")
-        else: raise HTTPException(status_code=404, detail="Item not found.")
+    item, _ = await get_managed_item(db, item_id, token)
     return item
 
+# --- GET /api/items/{item_id}/manage/images/{filename} ---
+@router.get("/{item_id}/manage/images/{filename}")
+async def get_managed_item_image(item_id: str, filename: str, token: str = f.Query(...), db: AsyncIOMotorDatabase = Depends(get_db)):
+    """ Serve an image of the item or of its found reports to the item's owner. """
+    try: uuid.UUID(item_id)
+    except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
+    item, _ = await get_managed_item(db, item_id, token)
+    filenames = set(item.get("image_filenames", []))
+    for report in item.get("found_reports", []): filenames.update(report.get("finder_image_filenames", []))
+    if filename not in filenames: raise HTTPException(status_code=404, detail="Image not found.")
+    return image_response(filename, cache_control="private, max-age=3600")
+
 # --- GET /api/items/{item_id} ---
 @router.get("/{item_id}", response_model=LostItemPublicResponse)
 async def get_public_item(item_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """ Retrieve public item details. """
     try: uuid.UUID(item_id)
     except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
-    item = await db.lost_items.find_one({"_id": item_id})
+    item = await item_cache.find_item(db, "lost_items", item_id)
     if item is None: raise HTTPException(status_code=404, detail="Item not found.")
     return item
 
+# --- GET /api/items/{item_id}/matches ---
+@router.get("/{item_id}/matches", response_model=List[FoundItemMatch])
+async def get_item_matches(item_id: str, limit: int = f.Query(10, ge=1, le=50), db: AsyncIOMotorDatabase = Depends(get_db)):
+    """ Found items ranked by how well they match this lost item (location, date, description and photos). """
+    try: uuid.UUID(item_id)
+    except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
+    item = await item_cache.find_item(db, "lost_items", item_id)
+    if item is None: raise HTTPException(status_code=404, detail="Item not found.")
+    return await find_matches(db, item, limit=limit, projection=FOUND_PUBLIC_PROJECTION)
+
 # --- GET /api/items ---
 @router.get("", response_model=List[LostItemPublicResponse])
-async def list_public_items(skip: int = f.Query(0, ge=0), limit: int = f.Query(10, ge=1, le=100), db: AsyncIOMotorDatabase = Depends(get_db)):
-    """ List public items with pagination. """
-    items_cursor = db.lost_items.find().sort("created_at", -1).skip(skip).limit(limit)
+async def list_public_items(
+    request: f.Request, skip: int = f.Query(0, ge=0), limit: int = f.Query(10, ge=1, le=100),
+    near: Optional[str] = f.Query(None, description="'lat,lng': only items within radius_km, nearest first"),
+    radius_km: float = f.Query(config.GEO_DEFAULT_RADIUS_KM, gt=0, le=config.GEO_MAX_RADIUS_KM),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """ List public items with pagination, newest first or by distance from `near`. """
+    if near:
+        try: center = point(*parse_near(near))
+        except ValueError: raise HTTPException(status_code=422, detail="near must be 'lat,lng'.")
+        items_cursor = db.lost_items.aggregate(near_pipeline(center, radius_km, PUBLIC_PROJECTION, skip, limit, query=LIST_QUERY))
+    else:
+        items_cursor = db.lost_items.find(LIST_QUERY, PUBLIC_PROJECTION).sort("created_at", -1).skip(skip).limit(limit)
     items = await items_cursor.to_list(length=limit)
-    return items
+    return conditional_response(request, dump_list(LostItemPublicListAdapter, items), max_age=config.LIST_CACHE_MAX_AGE)
 
 # --- POST /api/items/{item_id}/found ---
 @router.post("/{item_id}/found", status_code=f.status.HTTP_204_NO_CONTENT)
@@ -142,18 +219,26 @@ async def report_item_found_detailed(
     found_state: Annotated[Optional[str], Form()] = None,
     found_city: Annotated[Optional[str], Form()] = None,
     finder_images: Annotated[List[UploadFile], File(description="Up to 5 images from finder")] = [],
+    upload_ids: Annotated[List[str], Form(description="IDs of completed resumable uploads (counted toward the 5 image limit)")] = [],
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """ Report finding a specific lost item with details. """
     logger.info(f"Received detailed 'found' report for item {item_id}")
     try: uuid.UUID(item_id)
     except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
+    await check_email_limit(finder_contact)
 
     lost_item = await db.lost_items.find_one({"_id": item_id})
     if lost_item is None: raise HTTPException(status_code=404, detail="Lost item not found.")
-    if len(finder_images) > 5: raise HTTPException(status_code=400, detail="Max 5 finder images.")
+    if len(finder_images) + len(upload_ids) > 5: raise HTTPException(status_code=400, detail="Max 5 finder images.")
 
-    finder_saved_filenames = [] # Save finder images
+    try: date_found = datetime.fromisoformat(date_found_str.replace("Z", "+00:00")) if date_found_str else None
+    except ValueError: raise HTTPException(status_code=422, detail="Invalid date format found.")
+
+    try: claimed_uploads = await claim_uploads(db, config, upload_ids, IMAGE_DIR, prefix="found_")
+    except UploadError as e: raise HTTPException(status_code=e.status_code, detail=e.detail)
+    finder_saved_filenames = [upload["image_filename"] for upload in claimed_uploads]
+    # Save inline finder images
     for image in finder_images:
         if not image.filename: continue
         allowed_types = ["image/jpeg", "image/png", "image/webp", "image/gif"]
@@ -168,21 +253,22 @@ async def report_item_found_detailed(
         except Exception as e: logger.error(f"Failed save finder image {image.filename}: {e}", exc_info=True)
         finally: await image.close()
 
-    try: # Create FoundReportDetail object
-        date_found = datetime.fromisoformat(date_found_str.replace("Z", "+00:00")) if date_found_str else None
+    try: # Create FoundReportDetail object and add it to the DB
         found_report = FoundReportDetail(
             finder_contact=finder_contact, finder_description=finder_description, date_found=date_found,
             found_country=found_country, found_state=found_state, found_city=found_city,
             finder_image_filenames=finder_saved_filenames
         )
-    except (p.ValidationError, ValueError) as e:
-        detail = e.errors() if isinstance(e, p.ValidationError) else "Invalid date format found."
-        raise HTTPException(status_code=422, detail=detail)
-
-    # Add report to DB
-    update_result = await db.lost_items.update_one({"_id": item_id}, {"$push": {"found_reports": found_report.dict()}})
-    if update_result.modified_count == 0: raise HTTPException(status_code=404, detail="Item not found during update.")
+        update_result = await db.lost_items.update_one({"_id": item_id}, {"$push": {"found_reports": found_report.model_dump()}})
+        if update_result.modified_count == 0: raise HTTPException(status_code=404, detail="Item not found during update.")
+    except Exception as e:
+        await restore_uploads(db, config, claimed_uploads, IMAGE_DIR) # Let the finder retry with the same upload ids
+        if isinstance(e, p.ValidationError): raise HTTPException(status_code=422, detail=e.errors())
+        raise
     logger.info(f"Added found report to item {item_id}.")
+    await stats.record_found_report(db, found_report.model_dump())
+    await publish(db, "lost_items", "update", item_id)
+    index_images(db, IMAGE_DIR, "found_report", item_id, finder_saved_filenames, report_id=found_report.report_id)
 
     # Notify original reporter
     reporter_email = lost_item.get("reporter_email")
@@ -195,7 +281,7 @@ async def report_item_found_detailed(
                       f"Images: {len(found_report.finder_image_filenames)}\n---\n"
                       f"Your Item Desc: '{lost_item.get('description', 'N/A')}'\n"
                       f"Please contact finder if match. Be cautious.\nID: {item_id}")
-        email_sent = send_email(to_email=reporter_email, subject=email_subj, body=email_body)
+        email_sent = await send_email_async(to_email=reporter_email, subject=email_subj, body=email_body)
         if not email_sent: logger.error(f"Failed 'found' email to {reporter_email} item {item_id}.")
     else: logger.warning(f"Cannot send 'found' email item {item_id}: No reporter email.")
     return f.Response(status_code=f.status.HTTP_204_NO_CONTENT)
@@ -206,21 +292,27 @@ async def update_managed_item(item_id: str, update_data: LostItemUpdate, token:
     """ Update managed item. """
     try: uuid.UUID(item_id)
     except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
-    item = await db.lost_items.find_one({"_id": item_id, "management_token": token})
-    if item is None:
-        exists = await db.lost_items.count_documents({"_id": item_id}) > 0
-        if exists: raise HTTPException(status_code=403, detail="Invalid token.")
-        else: raise HTTPException(status_code=404, detail="Item not found.")
+    item, collection = await get_managed_item(db, item_id, token)
 
-    update_payload = update_data.dict(exclude_unset=True)
+    update_payload = update_data.model_dump(exclude_unset=True)
     if not update_payload: return LostItemManagementResponse(**item) # No changes
+    if update_payload.get("product_link"): update_payload["product_link"] = str(update_payload["product_link"])
+    if {"country", "state", "city"} & update_payload.keys():
+        location = {k: update_payload.get(k, item.get(k)) for k in ("country", "state", "city")}
+        update_payload.update(await resolve_location(**location))
+    if {"description", "country", "city"} & update_payload.keys():
+        current = {k: update_payload.get(k, item.get(k)) for k in ("description", "country", "city")}
+        update_payload["dedup"] = dedup_fields("lost", **current, reporter_email=item.get("reporter_email"))
 
     try: # Perform update
-        update_result = await db.lost_items.update_one({"_id": item_id}, {"$set": update_payload})
+        update_result = await collection.update_one({"_id": item_id}, {"$set": update_payload})
         if update_result.matched_count == 0: raise HTTPException(status_code=404, detail="Item not found during update.")
-        updated_item = await db.lost_items.find_one({"_id": item_id})
+        updated_item = await collection.find_one({"_id": item_id})
         if not updated_item: raise HTTPException(status_code=500, detail="Failed retrieve after update.")
         logger.info(f"Updated item {item_id}.")
+        await publish(db, collection.name, "update", item_id, update_payload)
+        await stats.record_item_update(db, "lost", item, updated_item)
+        updated_item["management_token"] = token
         return updated_item
     except Exception as e:
         logger.error(f"DB error updating item {item_id}: {str(e)}", exc_info=True)
@@ -233,11 +325,7 @@ async def delete_managed_item(item_id: str, token: str = f.Query(...), db: Async
     logger.info(f"Attempting deletion item {item_id} token {token[:4]}...")
     try: uuid.UUID(item_id)
     except ValueError: raise HTTPException(status_code=400, detail="Invalid item ID format.")
-    item = await db.lost_items.find_one({"_id": item_id, "management_token": token})
-    if item is None:
-        exists = await db.lost_items.count_documents({"_id": item_id}) > 0
-        if exists: raise HTTPException(status_code=403, detail="Invalid token.")
-        else: raise HTTPException(status_code=404, detail="Item not found.")
+    item, collection = await get_managed_item(db, item_id, token)
 
     # Collect all image filenames (original + all found reports)
     image_filenames = item.get("image_filenames", [])
@@ -257,8 +345,11 @@ async def delete_managed_item(item_id: str, token: str = f.Query(...), db: Async
 
     # Delete DB record
     try:
-        delete_result = await db.lost_items.delete_one({"_id": item_id})
+        delete_result = await collection.delete_one({"_id": item_id})
         if delete_result.deleted_count == 0: logger.error(f"Delete failed: Item {item_id} missing.")
+        else: await stats.record_item(db, "lost", item, delta=-1)
+        await publish(db, collection.name, "delete", item_id) # Drops sessions, cached copies and image hashes on every worker
+        await release_canonical(db, "lost_items", item_id)
         logger.info(f"Deleted item {item_id} from database.")
         return f.Response(status_code=f.status.HTTP_204_NO_CONTENT)
     except Exception as e:
@@ -1,25 +1,97 @@
 import fastapi as f
 from fastapi import HTTPException, Query
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import datetime
+import time
 import motor.motor_asyncio
+import orjson
+import pymongo
 from bson import ObjectId
 
 from helpers.logger import logger
+from helpers.http_cache import conditional_response, weak_etag
+from helpers.circuit_breaker import get_breaker, CircuitOpenError
+from helpers.deadline import dependency_timeout
 
-from config import Config
+from config import get_config
 
-config = Config() 
+config = get_config()
 MONGODB_URL = config.MONGO_WCA
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
-db = client.WorldDB
+# WorldDB client: opened by connect_world_db() in the app lifespan (or by scripts), never at import
+client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
+db: Optional[motor.motor_asyncio.AsyncIOMotorDatabase] = None
+
+
+def connect_world_db():
+    global client, db
+    if client is not None: return
+    client = motor.motor_asyncio.AsyncIOMotorClient(
+        MONGODB_URL,
+        serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=config.MONGO_CONNECT_TIMEOUT_MS,
+    )
+    db = client.WorldDB
+
+
+def close_world_db():
+    global client, db
+    if client is not None: client.close()
+    client, db = None, None
 
 router = f.APIRouter(
     prefix="/api/locations",
     tags=["Locations"],
 )
 
+# --- Serialized response cache ---
+# Location data is reference data: keep each serialized list with its ETag so repeat requests
+# and If-None-Match revalidations skip both the regex scan and serialization. Expired entries are
+# kept (until evicted) as a fallback while WorldDB is failing or its circuit is open.
+CACHE_MAX_ENTRIES = 2048
+_response_cache: Dict[Tuple[str, ...], Tuple[float, str, bytes]] = {}
+world_db_breaker = get_breaker("world_db", config.BREAKER_FAILURE_THRESHOLD, config.BREAKER_RECOVERY_SECONDS)
+
+
+def _get_cached(key: Tuple[str, ...], allow_stale: bool = False) -> Optional[Tuple[str, bytes]]:
+    entry = _response_cache.get(key)
+    if entry is None: return None
+    stored_at, etag, content = entry
+    if not allow_stale and time.monotonic() - stored_at > config.LOCATION_CACHE_TTL_SECONDS: return None
+    return etag, content
+
+
+def _store(key: Tuple[str, ...], docs: List[Dict[str, Any]]) -> Tuple[str, bytes]:
+    content = orjson.dumps([{**doc, '_id': str(doc['_id'])} for doc in docs], default=str)
+    etag = weak_etag(content)
+    _response_cache.pop(key, None)
+    if len(_response_cache) >= CACHE_MAX_ENTRIES:
+        _response_cache.pop(next(iter(_response_cache))) # Evict the oldest entry
+    _response_cache[key] = (time.monotonic(), etag, content)
+    return etag, content
+
+
+async def _fetch(key: Tuple[str, ...], cursor_factory) -> Optional[Tuple[str, bytes]]:
+    """
+    Runs a WorldDB query (bounded by WORLD_DB_TIMEOUT_SECONDS and the request deadline) through the circuit
+    breaker and caches the result. Returns None when nothing matched. On failure serves a stale cached copy if there is one.
+    """
+    async def query(timeout: float):
+        with pymongo.timeout(timeout): return await cursor_factory().to_list(length=None)
+
+    try:
+        timeout, budget_limited = dependency_timeout(config.WORLD_DB_TIMEOUT_SECONDS)
+        docs = await world_db_breaker.call(query, timeout, budget_limited=budget_limited)
+    except Exception as e:
+        stale = _get_cached(key, allow_stale=True)
+        if stale is None: raise
+        logger.warning(f"WorldDB unavailable ({e}); serving stale {key[0]} list.")
+        return stale
+    docs = [doc for doc in docs if '_id' in doc]
+    return _store(key, docs) if docs else None
+
 
+def _respond(request: f.Request, etag: str, content: bytes) -> f.Response:
+    return conditional_response(request, content, max_age=config.LOCATION_CACHE_MAX_AGE, etag=etag)
 
 
 def sanitize(text: str) -> str:
@@ -32,36 +104,44 @@ def sanitize(text: str) -> str:
     return text
 
 @router.get("/countries", response_model=List[Dict[str, Any]])
-async def get_countries_list():
+async def get_countries_list(request: f.Request):
     """Retrieve the list of countries."""
+    key = ("countries",)
+    cached = _get_cached(key)
+    if cached: return _respond(request, *cached)
     try:
-        countries = db.countries.find()
-        country_list = [country async for country in countries if '_id' in country]
-        country_list = [{**country, '_id': str(country['_id'])} for country in country_list]
-        return country_list
+        result = await _fetch(key, lambda: db.countries.find())
+        if result is None: return _respond(request, *_store(key, []))
+        return _respond(request, *result)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to retrieve countries: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve country data from database.")
 
 @router.get("/states", response_model=List[Dict[str, Any]])
-async def get_states_list(country: str = Query(..., description="Name of the country to get states for")):
+async def get_states_list(request: f.Request, country: str = Query(..., description="Name of the country to get states for")):
     """Retrieve the list of states for a specific country."""
     try:
         country = sanitize(country)
-        states = db.state.find({"country_name": {"$regex": country, "$options": "i"}})
-        state_list = [state async for state in states if '_id' in state]
-        if len(state_list) == 0:
+        key = ("states", country)
+        cached = _get_cached(key)
+        if cached: return _respond(request, *cached)
+        result = await _fetch(key, lambda: db.state.find({"country_name": {"$regex": country, "$options": "i"}}))
+        if result is None:
             raise HTTPException(status_code=404, detail="Country not found")
-        state_list = [{**state, '_id': str(state['_id'])} for state in state_list]
-        return state_list
+        return _respond(request, *result)
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to retrieve states: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve state data from database.")
 
 @router.get("/cities", response_model=List[Dict[str, Any]])
 async def get_cities_list(
+    request: f.Request,
     country: str = Query(..., description="Name of the country"),
     state: str = Query(..., description="Name of the state")
 ):
@@ -69,17 +149,20 @@ async def get_cities_list(
     try:
         country = sanitize(country)
         state = sanitize(state)
-        cities = db.cities.find({
+        key = ("cities", country, state)
+        cached = _get_cached(key)
+        if cached: return _respond(request, *cached)
+        result = await _fetch(key, lambda: db.cities.find({
             "country_name": {"$regex": country, "$options": "i"},
             "state_name": {"$regex": state, "$options": "i"}
-        })
-        cities_list = [city async for city in cities if "_id" in city]
-        if len(cities_list) == 0:
+        }))
+        if result is None:
             raise HTTPException(status_code=404, detail="Country or state not found")
-        cities_list = [{**city, '_id': str(city['_id'])} for city in cities_list]
-        return cities_list
+        return _respond(request, *result)
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to retrieve cities: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve city data from database.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve city data from database.")
@@ -0,0 +1,19 @@
+import fastapi as f
+from fastapi import Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from models.stats import StatsResponse
+from db_setup import get_db, config
+from helpers.http_cache import conditional_response
+from helpers.stats import read_stats
+
+router = f.APIRouter(
+    prefix="/api/stats",
+    tags=["Stats"],
+)
+
+@router.get("", response_model=StatsResponse)
+async def get_stats(request: f.Request, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """ Facet counts (lost/found by country, state, city and week; found reports by week) from pre-aggregated counters. """
+    stats = StatsResponse.model_validate(await read_stats(db))
+    return conditional_response(request, stats.model_dump_json().encode(), max_age=config.STATS_CACHE_MAX_AGE)
@@ -0,0 +1,82 @@
+import fastapi as f
+from fastapi import Depends, HTTPException, Header
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Annotated
+import uuid
+
+from models.upload import UploadCreate, UploadStatus
+from db_setup import get_db, config
+from helpers.logger import logger
+from helpers import uploads
+from helpers.uploads import UploadError
+
+TUS_HEADERS = {"Tus-Resumable": "1.0.0"}
+CHUNK_CONTENT_TYPE = "application/offset+octet-stream"
+
+router = f.APIRouter(
+    prefix="/api/uploads",
+    tags=["Uploads"],
+)
+
+def _validate_id(upload_id: str):
+    try: uuid.UUID(upload_id)
+    except ValueError: raise HTTPException(status_code=400, detail="Invalid upload ID format.")
+
+def _offset_headers(session: dict) -> dict:
+    return {**TUS_HEADERS, "Upload-Offset": str(session["offset"]), "Upload-Length": str(session["size"]), "Cache-Control": "no-store"}
+
+# --- POST /api/uploads (Create upload session) ---
+@router.post("", response_model=UploadStatus, status_code=f.status.HTTP_201_CREATED)
+async def create_upload(payload: UploadCreate, response: f.Response, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """ Start a resumable image upload. PATCH bytes to the returned Location, then POST /complete. """
+    try: session = await uploads.create_session(db, config, payload.filename, payload.content_type, payload.size)
+    except UploadError as e: raise HTTPException(status_code=e.status_code, detail=e.detail)
+    logger.info(f"Created upload session {session['_id']} ({payload.size} bytes)")
+    response.headers.update({**_offset_headers(session), "Location": f"{router.prefix}/{session['_id']}"})
+    return session
+
+# --- HEAD /api/uploads/{upload_id} (Query offset, tus) ---
+@router.head("/{upload_id}", status_code=f.status.HTTP_200_OK)
+async def head_upload(upload_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """ Current offset in the Upload-Offset header. """
+    _validate_id(upload_id)
+    try: session = await uploads.get_session(db, upload_id)
+    except UploadError as e: raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return f.Response(status_code=f.status.HTTP_200_OK, headers=_offset_headers(session))
+
+# --- GET /api/uploads/{upload_id} ---
+@router.get("/{upload_id}", response_model=UploadStatus)
+async def get_upload(upload_id: str, response: f.Response, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """ Session state, including the offset to resume from. """
+    _validate_id(upload_id)
+    try: session = await uploads.get_session(db, upload_id)
+    except UploadError as e: raise HTTPException(status_code=e.status_code, detail=e.detail)
+    response.headers.update(_offset_headers(session))
+    return session
+
+# --- PATCH /api/uploads/{upload_id} (Append bytes) ---
+@router.patch("/{upload_id}", status_code=f.status.HTTP_204_NO_CONTENT)
+async def patch_upload(
+    upload_id: str,
+    request: f.Request,
+    upload_offset: Annotated[int, Header(ge=0)],
+    content_type: Annotated[str, Header()] = "",
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """ Append a byte range starting at Upload-Offset. The body is streamed to disk, not buffered. """
+    _validate_id(upload_id)
+    if content_type.split(";")[0].strip() != CHUNK_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be {CHUNK_CONTENT_TYPE}.")
+    try: session = await uploads.write_chunk(db, config, upload_id, upload_offset, request.stream())
+    except UploadError as e: raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return f.Response(status_code=f.status.HTTP_204_NO_CONTENT, headers=_offset_headers(session))
+
+# --- POST /api/uploads/{upload_id}/complete ---
+@router.post("/{upload_id}/complete", response_model=UploadStatus)
+async def complete_upload(upload_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """ Finalize an upload once all bytes are received; its id can then be passed as `upload_ids` when creating items. """
+    _validate_id(upload_id)
+    try: session = await uploads.complete_session(db, upload_id)
+    except UploadError as e: raise HTTPException(status_code=e.status_code, detail=e.detail)
+    logger.info(f"Completed upload {upload_id}")
+    return session
@@ -0,0 +1,82 @@
+"""
+Argon2 management-token verify throughput.
+
+Measures verifies/second with the configured cost parameters (ARGON2_* in config.py):
+inline on one thread, then through the bounded executor used by the API at 1..N workers,
+and reports throughput per core. Also shows the verified-session cache hit path.
+
+Run from the project root:
+    python -m benchmarks.bench_argon2 [--seconds 3] [--max-workers 4]
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+from config import get_config
+from helpers import password_helpers
+from helpers.password_helpers import check_password, check_password_async, hash_password
+
+
+def bench_inline(token: str, hashed: str, seconds: float) -> float:
+    count, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        check_password(token, hashed)
+        count += 1
+    return count / seconds
+
+
+async def bench_executor(token: str, hashed: str, seconds: float, workers: int) -> float:
+    password_helpers.shutdown_executor()
+    password_helpers.config.ARGON2_MAX_WORKERS = workers
+    count, deadline = 0, time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal count
+        while time.perf_counter() < deadline:
+            await check_password_async(token, hashed)
+            count += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers * 2)))
+    elapsed = time.perf_counter() - start
+    password_helpers.shutdown_executor()
+    return count / elapsed
+
+
+async def bench_cache_hit(seconds: float) -> float:
+    from helpers import management_tokens
+    token = str(uuid.uuid4())
+    item = {"_id": str(uuid.uuid4()), "management_token_hash": await management_tokens.hash_token(token)}
+    await management_tokens.verify_token(item, token, collection=None) # Warm the cache
+    count, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        await management_tokens.verify_token(item, token, collection=None)
+        count += 1
+    return count / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    config = get_config()
+    token = str(uuid.uuid4())
+    hashed = hash_password(token)
+    print(f"Argon2 t={config.ARGON2_TIME_COST} m={config.ARGON2_MEMORY_COST_KIB}KiB p={config.ARGON2_PARALLELISM}, "
+          f"{os.cpu_count()} CPUs")
+
+    inline = bench_inline(token, hashed, args.seconds)
+    print(f"  inline (blocks event loop): {inline:9.1f} verify/s")
+    for workers in sorted({1, 2, args.max_workers}):
+        rate = asyncio.run(bench_executor(token, hashed, args.seconds, workers))
+        cores = min(workers, os.cpu_count() or 1)
+        print(f"  executor, {workers:2d} worker(s):    {rate:9.1f} verify/s  ({rate / cores:7.1f} per core)")
+    print(f"  session cache hit:          {asyncio.run(bench_cache_hit(args.seconds)):9.0f} verify/s")
+
+
+if __name__ == "__main__":
+    main()
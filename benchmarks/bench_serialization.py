@@ -0,0 +1,82 @@
+"""
+Serialization benchmark for GET /api/items list pages.
+
+Compares the previous path (FastAPI response_model: validate each raw Mongo dict,
+jsonable_encoder, stdlib json.dumps) with the precompiled TypeAdapter path used by
+helpers.serialization.list_response. Reports microseconds per item.
+
+Run from the project root:
+    python -m benchmarks.bench_serialization [--items 100] [--rounds 200]
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from models.item import LostItemPublicResponse, LostItemPublicListAdapter
+from helpers.serialization import list_response
+
+
+def make_docs(n: int) -> List[dict]:
+    """Raw documents shaped like lost_items rows, including private fields."""
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": str(uuid.uuid4()),
+            "description": f"Black leather wallet with several cards inside, item {i}",
+            "reporter_email": f"user{i}@example.com",
+            "management_token": str(uuid.uuid4()),
+            "date_lost": now - timedelta(days=i),
+            "product_link": "https://example.com/products/wallet",
+            "image_filenames": [f"{uuid.uuid4()}.jpg" for _ in range(i % 5)],
+            "country": "India", "state": "Telangana", "city": "Hyderabad",
+            "created_at": now - timedelta(hours=i),
+            "found_reports": [],
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_path(docs: List[dict]) -> bytes:
+    """Approximates FastAPI's serialize_response for response_model=List[LostItemPublicResponse]."""
+    validated = [LostItemPublicResponse.model_validate(d) for d in docs]
+    encoded = jsonable_encoder([v.model_dump(by_alias=True) for v in validated])
+    return json.dumps(encoded, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def adapter_path(docs: List[dict]) -> bytes:
+    return list_response(LostItemPublicListAdapter, docs).body
+
+
+def bench(fn, docs: List[dict], rounds: int) -> float:
+    fn(docs)  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(docs)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(docs)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100, help="Items per page (API max is 100)")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    docs = make_docs(args.items)
+    assert json.loads(legacy_path(docs)) == json.loads(adapter_path(docs)), "Serializers disagree"
+
+    before = bench(legacy_path, docs, args.rounds)
+    after = bench(adapter_path, docs, args.rounds)
+    print(f"LostItemPublicResponse x {args.items}, {args.rounds} rounds")
+    print(f"  before (response_model + json.dumps): {before:8.2f} us/item")
+    print(f"  after  (TypeAdapter.dump_json):       {after:8.2f} us/item")
+    print(f"  speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Worker startup budget.
+
+Each measurement runs in a fresh interpreter, and the median of --runs is reported:
+
+* import time: `python -X importtime -c "import main"`, cumulative per project module (main,
+  config, db_setup, api.*, helpers.*, models.*) and for a few heavy third-party packages;
+* time to first request: interpreter start -> `import main` -> lifespan startup (Mongo, clients,
+  directories, background tasks) -> first response to --path. This needs the configured MongoDB
+  (MONGO_URI / MONGO_WCA); skip it with --no-request.
+
+It also checks that the modules kept out of the import path (LAZY_MODULES) stay out.
+
+The script exits with 1 when the startup budget is blown:
+* `import main` takes longer than --max-import-ms, or the time to first request is over
+  --max-first-request-ms. These absolute limits need no baseline, so they apply on any fresh
+  checkout or CI run; pass 0 to disable one;
+* a lazy module was imported eagerly;
+* with a baseline at --baseline (written by a previous --save-baseline run on the same machine),
+  the total import time or the time to first request grew by more than --threshold, or a single
+  module grew by more than --threshold and --min-delta-ms.
+
+Run from the project root:
+    python -m benchmarks.bench_startup [--runs 5] [--max-import-ms 1500] [--baseline benchmarks/startup_baseline.json] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_MODULE = re.compile(r"^(main|config|db_setup|(api|helpers|models)(\.\w+)?)$")
+THIRD_PARTY = ("fastapi", "pydantic", "motor.motor_asyncio", "pymongo", "loguru", "starlette")
+# Only needed on first use (or only in some deployments); importing `main` must not pull them in
+LAZY_MODULES = ("httpx", "icecream", "dotenv", "PIL")
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+_FIRST_REQUEST_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from starlette.testclient import TestClient
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    status = client.get(sys.argv[1]).status_code
+    answered = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1e3, "lifespan_ms": (ready - imported) * 1e3,
+                  "request_ms": (answered - ready) * 1e3, "status": status}))
+"""
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=PROJECT_ROOT, capture_output=True, text=True)
+
+
+def measure_imports() -> Dict[str, float]:
+    """Cumulative import time in ms for project and watched modules, plus "<total>" for `import main`."""
+    result = _run(["-X", "importtime", "-c", "import main"])
+    if result.returncode != 0: sys.exit(f"import main failed:\n{result.stderr[-2000:]}")
+    times: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match: continue
+        name, cumulative = match.group(4), int(match.group(2)) / 1e3
+        if PROJECT_MODULE.match(name) or name in THIRD_PARTY or name in LAZY_MODULES: times[name] = cumulative
+    times["<total>"] = times.get("main", 0.0)
+    return times
+
+
+def measure_first_request(path: str) -> Dict[str, float]:
+    started = time.perf_counter()
+    result = _run(["-c", _FIRST_REQUEST_SCRIPT, path])
+    wall_ms = (time.perf_counter() - started) * 1e3
+    if result.returncode != 0: sys.exit(f"First request failed (is MongoDB reachable? use --no-request to skip):\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    if timings.pop("status") >= 500: sys.exit(f"First request to {path} failed with a server error.")
+    timings["time_to_first_request_ms"] = wall_ms # Includes interpreter startup and teardown
+    return timings
+
+
+def median_of(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    keys = set().union(*samples)
+    return {key: statistics.median(s.get(key, 0.0) for s in samples) for key in keys}
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, min_delta_ms: float) -> List[str]:
+    failures = []
+    totals = [("import main", current["imports"].get("<total>"), baseline["imports"].get("<total>"))]
+    if "request" in current and "request" in baseline:
+        totals.append(("time to first request", current["request"]["time_to_first_request_ms"], baseline["request"]["time_to_first_request_ms"]))
+    for label, now, before in totals:
+        if now is not None and before and now > before * (1 + threshold):
+            failures.append(f"{label}: {now:.1f} ms vs baseline {before:.1f} ms (+{now / before - 1:.0%})")
+    for name, now in current["imports"].items():
+        before = baseline["imports"].get(name, 0.0)
+        if name != "<total>" and now - before > min_delta_ms and now > before * (1 + threshold):
+            failures.append(f"module {name}: {now:.1f} ms vs baseline {before:.1f} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/api/items?limit=1", help="Endpoint for the first request")
+    parser.add_argument("--no-request", action="store_true", help="Only measure imports (no MongoDB needed)")
+    parser.add_argument("--baseline", default=os.path.join("benchmarks", "startup_baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run's results to --baseline")
+    parser.add_argument("--max-import-ms", type=float, default=1500.0, help="Absolute budget for `import main` (0 = none)")
+    parser.add_argument("--max-first-request-ms", type=float, default=5000.0, help="Absolute budget for the time to first request (0 = none)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (0.2 = +20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore per-module changes smaller than this")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list")
+    args = parser.parse_args()
+
+    _run(["-c", "import main"]) # Warm the bytecode cache so every run measures the same thing
+    current = {"imports": median_of([measure_imports() for _ in range(args.runs)])}
+    if not args.no_request:
+        current["request"] = median_of([measure_first_request(args.path) for _ in range(args.runs)])
+
+    imports = current["imports"]
+    print(f"import main: {imports['<total>']:.1f} ms (median of {args.runs})")
+    ranked = sorted(((ms, name) for name, ms in imports.items() if name != "<total>" and name not in LAZY_MODULES), reverse=True)
+    for ms, name in ranked[:args.top]: print(f"  {name:32s} {ms:8.1f} ms")
+    eager = [name for name in LAZY_MODULES if name in imports and not (name == "dotenv" and os.path.exists(os.path.join(PROJECT_ROOT, ".env")))]
+    print(f"lazy modules imported eagerly: {', '.join(eager) or 'none'}")
+    if "request" in current:
+        request = current["request"]
+        print(f"time to first request: {request['time_to_first_request_ms']:.1f} ms "
+              f"(import {request['import_ms']:.1f}, lifespan {request['lifespan_ms']:.1f}, request {request['request_ms']:.1f})")
+
+    failures = [f"{name} is imported by `import main`" for name in eager]
+    if args.max_import_ms and imports["<total>"] > args.max_import_ms:
+        failures.append(f"import main: {imports['<total>']:.1f} ms, over the {args.max_import_ms:.0f} ms budget")
+    if args.max_first_request_ms and "request" in current and current["request"]["time_to_first_request_ms"] > args.max_first_request_ms:
+        failures.append(f"time to first request: {current['request']['time_to_first_request_ms']:.1f} ms, over the {args.max_first_request_ms:.0f} ms budget")
+    baseline_path = os.path.join(PROJECT_ROOT, args.baseline)
+    if args.save_baseline:
+        with open(baseline_path, "w") as fh: json.dump(current, fh, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as fh: failures += compare(current, json.load(fh), args.threshold, args.min_delta_ms)
+    else:
+        print(f"No baseline at {args.baseline}; only the absolute budgets apply (--save-baseline records one).")
+
+    if failures:
+        print("\nStartup budget exceeded:")
+        for failure in failures: print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,23 @@
 import os
-from dotenv import load_dotenv
+from functools import lru_cache
+
+
+def _load_dotenv():
+    """Loads the nearest .env (searching upwards, like python-dotenv does); dotenv is only imported when there is one."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory: return
+        directory = parent
+
 
 # Load environment variables from .env file
-load_dotenv()
+_load_dotenv()
 
 class Config:
     MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
@@ -18,6 +33,10 @@ class Config:
     # Location API Settings
     LOCATION_API_BASE_URL: str = os.getenv("LOCATION_API_BASE_URL", "")
     LOCATION_API_KEY: str = os.getenv("LOCATION_API_KEY", "")
+    LOCATION_API_CACHE_TTL_SECONDS: int = int(os.getenv("LOCATION_API_CACHE_TTL_SECONDS", "3600"))
+    LOCATION_API_STALE_TTL_SECONDS: int = int(os.getenv("LOCATION_API_STALE_TTL_SECONDS", "86400"))  # serve stale this long past TTL
+    LOCATION_API_MAX_CONNECTIONS: int = int(os.getenv("LOCATION_API_MAX_CONNECTIONS", "20"))
+    LOCATION_API_HTTP2: bool = os.getenv("LOCATION_API_HTTP2", "true").lower() == "true"  # needs the optional `h2` package
 
     # Frontend URL (needed for generating links in emails)
     FRONTEND_BASE_URL: str = os.getenv("FRONTEND_BASE_URL", "http://localhost:5353/")
@@ -26,8 +45,113 @@ class Config:
     APP_PORT: int = int(os.getenv("APP_PORT", "5424"))
     SESSION_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("SESSION_TOKEN_EXPIRE_MINUTES", "1440"))
     ALLOWED_ORIGINS: list[str] = ["*"]
+
+    # HTTP caching & compression
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes
+    LIST_CACHE_MAX_AGE: int = int(os.getenv("LIST_CACHE_MAX_AGE", "0"))  # seconds; 0 = always revalidate
+    LOCATION_CACHE_MAX_AGE: int = int(os.getenv("LOCATION_CACHE_MAX_AGE", "86400"))  # seconds
+    LOCATION_CACHE_TTL_SECONDS: int = int(os.getenv("LOCATION_CACHE_TTL_SECONDS", "3600"))  # in-process cache
+    STATS_CACHE_MAX_AGE: int = int(os.getenv("STATS_CACHE_MAX_AGE", "60"))  # seconds
+
+    # Archival of stale items into *_archive collections
+    ARCHIVE_ENABLED: bool = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+    ARCHIVE_BATCH_SIZE: int = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+    ARCHIVE_DUTY_CYCLE: float = float(os.getenv("ARCHIVE_DUTY_CYCLE", "0.2"))  # max fraction of wall time spent archiving
+    ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+    # Resumable uploads
+    UPLOAD_TMP_DIR: str = os.getenv("UPLOAD_TMP_DIR", "uploads_tmp")  # must be on the same filesystem as images/
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))
+    UPLOAD_SESSION_TTL_SECONDS: int = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", "86400"))
+    UPLOAD_CLEANUP_INTERVAL_SECONDS: int = int(os.getenv("UPLOAD_CLEANUP_INTERVAL_SECONDS", "3600"))
+
+    # Argon2 (management token hashing). Tokens are random UUIDs, so modest cost parameters suffice.
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", "2"))
+    ARGON2_MEMORY_COST_KIB: int = int(os.getenv("ARGON2_MEMORY_COST_KIB", "19456"))
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", "1"))
+    ARGON2_MAX_WORKERS: int = int(os.getenv("ARGON2_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+    ARGON2_QUEUE_FACTOR: int = int(os.getenv("ARGON2_QUEUE_FACTOR", "8"))  # max queued verifies per worker
+    MANAGEMENT_SESSION_TTL_SECONDS: int = int(os.getenv("MANAGEMENT_SESSION_TTL_SECONDS", "300"))
+
+    # Admission control for write/upload endpoints
+    ADMISSION_IP_RATE_PER_MINUTE: float = float(os.getenv("ADMISSION_IP_RATE_PER_MINUTE", "6"))
+    ADMISSION_IP_BURST: int = int(os.getenv("ADMISSION_IP_BURST", "10"))
+    ADMISSION_EMAIL_RATE_PER_MINUTE: float = float(os.getenv("ADMISSION_EMAIL_RATE_PER_MINUTE", "0.5"))
+    ADMISSION_EMAIL_BURST: int = int(os.getenv("ADMISSION_EMAIL_BURST", "5"))
+    ADMISSION_UPLOAD_CONCURRENCY: int = int(os.getenv("ADMISSION_UPLOAD_CONCURRENCY", "8"))  # per worker
+    ADMISSION_UPLOAD_QUEUE: int = int(os.getenv("ADMISSION_UPLOAD_QUEUE", "16"))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+    ADMISSION_SHARED: bool = os.getenv("ADMISSION_SHARED", "false").lower() == "true"  # share buckets via Mongo
+    # Behind a reverse proxy that overwrites X-Forwarded-For with the client address; on by default with NGINX_ENABLED
+    TRUST_FORWARDED_FOR: bool = os.getenv("TRUST_FORWARDED_FOR", os.getenv("NGINX_ENABLED", "false")).lower() == "true"
+
+    # Deadlines, timeouts and circuit breakers
+    REQUEST_DEADLINE_SECONDS: float = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))  # default per-request budget
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGO_CONNECT_TIMEOUT_MS: int = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    SMTP_TIMEOUT_SECONDS: float = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
+    LOCATION_API_TIMEOUT_SECONDS: float = float(os.getenv("LOCATION_API_TIMEOUT_SECONDS", "5"))
+    WORLD_DB_TIMEOUT_SECONDS: float = float(os.getenv("WORLD_DB_TIMEOUT_SECONDS", "2"))  # location list queries; under the 3 s /api/locations budget
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RECOVERY_SECONDS: float = float(os.getenv("BREAKER_RECOVERY_SECONDS", "30"))
+    EMAIL_OUTBOX_INTERVAL_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_INTERVAL_SECONDS", "60"))
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "10"))
+
+    # Perceptual image hashing and photo matching
+    IMAGE_HASH_WORKERS: int = int(os.getenv("IMAGE_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+    IMAGE_MATCH_MAX_DISTANCE: int = int(os.getenv("IMAGE_MATCH_MAX_DISTANCE", "10"))  # Hamming bits out of 64
+    MATCH_DATE_WINDOW_DAYS: int = int(os.getenv("MATCH_DATE_WINDOW_DAYS", "30"))
+    MATCH_CANDIDATE_LIMIT: int = int(os.getenv("MATCH_CANDIDATE_LIMIT", "200"))
+
+    # Idempotency-Key handling for create/report endpoints
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_LOCK_SECONDS: int = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))  # longer than any write's deadline
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "25"))
+    IDEMPOTENCY_DB_TIMEOUT_SECONDS: float = float(os.getenv("IDEMPOTENCY_DB_TIMEOUT_SECONDS", "2"))
+
+    # Schema manifest (helpers/schema.py)
+    SCHEMA_AUTO_APPLY: bool = os.getenv("SCHEMA_AUTO_APPLY", "true").lower() == "true"  # else run `python -m helpers.schema apply` on deploy
+    SCHEMA_SLOW_BUILD_SECONDS: float = float(os.getenv("SCHEMA_SLOW_BUILD_SECONDS", "10"))
+
+    # Geo search (coordinates resolved from WorldDB)
+    GEO_LOOKUP_TIMEOUT_SECONDS: float = float(os.getenv("GEO_LOOKUP_TIMEOUT_SECONDS", "1"))
+    GEO_DEFAULT_RADIUS_KM: float = float(os.getenv("GEO_DEFAULT_RADIUS_KM", "25"))
+    GEO_MAX_RADIUS_KM: float = float(os.getenv("GEO_MAX_RADIUS_KM", "500"))
+    MATCH_RADIUS_KM: float = float(os.getenv("MATCH_RADIUS_KM", "30"))  # city-level items this close count as nearby
+
+    # Background match notifications (per-owner email digests)
+    MATCH_NOTIFY_ENABLED: bool = os.getenv("MATCH_NOTIFY_ENABLED", "true").lower() == "true"
+    MATCH_NOTIFY_INTERVAL_SECONDS: int = int(os.getenv("MATCH_NOTIFY_INTERVAL_SECONDS", "300"))
+    MATCH_DIGEST_INTERVAL_SECONDS: int = int(os.getenv("MATCH_DIGEST_INTERVAL_SECONDS", "86400"))  # at most one digest per owner per interval
+    MATCH_NOTIFY_MIN_SCORE: float = float(os.getenv("MATCH_NOTIFY_MIN_SCORE", "0.5"))
+    MATCH_NOTIFY_BATCH_SIZE: int = int(os.getenv("MATCH_NOTIFY_BATCH_SIZE", "100"))
+    MATCH_SCAN_LAG_SECONDS: int = int(os.getenv("MATCH_SCAN_LAG_SECONDS", "60"))  # > the POST budget, so slow inserts land before the scan passes them
+
+    # Cross-worker cache invalidation (helpers/invalidation.py) and the public item cache it keeps fresh
+    INVALIDATION_MODE: str = os.getenv("INVALIDATION_MODE", "auto").lower()  # auto, change_stream, capped or off
+    INVALIDATION_POLL_SECONDS: float = float(os.getenv("INVALIDATION_POLL_SECONDS", "1"))  # capped mode: reopen delay for a dead cursor
+    ITEM_CACHE_SIZE: int = int(os.getenv("ITEM_CACHE_SIZE", "10000"))  # per worker; 0 disables
+    ITEM_CACHE_TTL_SECONDS: int = int(os.getenv("ITEM_CACHE_TTL_SECONDS", "600"))  # backstop only; writes evict entries immediately
+
+    # Near-duplicate reports (helpers/dedup.py)
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", "0.6"))  # estimated Jaccard similarity of description shingles
+    DEDUP_DATE_WINDOW_DAYS: int = int(os.getenv("DEDUP_DATE_WINDOW_DAYS", "7"))  # found items: max days between date_found
+    DEDUP_HIDE_IN_LISTS: bool = os.getenv("DEDUP_HIDE_IN_LISTS", "true").lower() == "true"  # list pages skip flagged duplicates
+    DEDUP_ADMIN_TOKEN: str = os.getenv("DEDUP_ADMIN_TOKEN", "")  # X-Admin-Token for GET /api/duplicates; unset disables it
     NGINX_HOST: str = os.getenv("NGINX_HOST", "localhost")
     NGINX_SITES_AVAILABLE: str = "/etc/nginx/sites-available"
     NGINX_SITES_ENABLED: str = "/etc/nginx/sites-enabled"
     NGINX_LOG_DIR: str = "/var/log/nginx"
-    NGINX_CONF_FILE: str = "/etc/nginx/nginx.conf"
\ No newline at end of file
+    NGINX_CONF_FILE: str = "/etc/nginx/nginx.conf"
+    NGINX_ENABLED: bool = os.getenv("NGINX_ENABLED", "false").lower() == "true"  # serve images via X-Accel-Redirect
+    NGINX_INTERNAL_IMAGES_PREFIX: str = os.getenv("NGINX_INTERNAL_IMAGES_PREFIX", "/_images/")
+    NGINX_UPSTREAMS: str = os.getenv("NGINX_UPSTREAMS", f"{APP_HOST}:{APP_PORT}")  # comma-separated uvicorn addresses
+    NGINX_KEEPALIVE: int = int(os.getenv("NGINX_KEEPALIVE", "32"))
+    NGINX_CACHE_DIR: str = os.getenv("NGINX_CACHE_DIR", "/var/cache/nginx/lostfound")
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """The process-wide Config; every module shares this instance instead of creating its own."""
+    return Config()
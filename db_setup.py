@@ -2,10 +2,10 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 import fastapi as f
 
 from helpers.mongo_manager import MongoManager
-from config import Config
+from config import get_config
 from helpers.logger import logger
 
-config = Config()
+config = get_config()
 mongo_manager = MongoManager(config=config)
 
 async def get_db() -> AsyncIOMotorDatabase:
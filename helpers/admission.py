@@ -0,0 +1,183 @@
+"""
+Admission control for write and upload endpoints.
+
+Two layers, both answering fast without touching disk, DB writes or SMTP:
+
+* AdmissionMiddleware (ASGI) runs before the multipart body is read. For the write routes in
+  WRITE_ROUTES it applies a per-IP token bucket (429 + Retry-After) and, for upload routes, a global
+  concurrency gate with a bounded wait queue (503 when the queue is full or the wait times out).
+  Every other request - all reads - passes through with a single regex check.
+* check_email_limit() is called by endpoints once the email is known (it lives in the body).
+
+Buckets are in-process by default. With ADMISSION_SHARED=true they are approximated across workers
+by fixed-window counters in the `rate_limits` collection (window = burst / rate, limit = burst),
+expired by a TTL index. If Mongo is unreachable the shared limiter fails open.
+"""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, List, NamedTuple, Optional, Pattern, Tuple
+
+import fastapi as f
+from pymongo import ReturnDocument
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import get_config
+from helpers.logger import logger
+
+config = get_config()
+
+RATE_LIMITS_COLLECTION = "rate_limits"
+
+
+class TokenBucketLimiter:
+    """In-process token buckets, one per key, bounded to `max_keys` (least recently used evicted)."""
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 100_000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict() # key -> (tokens, updated_at)
+
+    async def acquire(self, key: str) -> float:
+        """Takes one token. Returns 0 if allowed, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (float(self.burst), now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        allowed = tokens >= 1
+        if allowed: tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys: self._buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) / self.rate
+
+
+class MongoWindowLimiter:
+    """Cross-worker approximation of a token bucket: `burst` requests per `burst / rate` second window."""
+    def __init__(self, scope_name: str, rate_per_minute: float, burst: int, get_db: Callable):
+        self.scope_name = scope_name
+        self.burst = burst
+        self.window = max(1.0, burst / (rate_per_minute / 60.0))
+        self.get_db = get_db
+
+    async def acquire(self, key: str) -> float:
+        now = time.time()
+        window_start = now - (now % self.window)
+        try:
+            doc = await self.get_db()[RATE_LIMITS_COLLECTION].find_one_and_update(
+                {"_id": f"{self.scope_name}:{key}:{int(window_start)}"},
+                {"$inc": {"count": 1},
+                 "$setOnInsert": {"expires_at": datetime.utcnow() + timedelta(seconds=self.window * 2)}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+        except Exception as e:
+            logger.warning(f"Shared rate limiter unavailable, allowing request: {e}")
+            return 0.0
+        return 0.0 if doc["count"] <= self.burst else window_start + self.window - now
+
+
+class ConcurrencyGate:
+    """At most `max_concurrent` holders; at most `max_queue` waiters; waiters give up after `timeout`."""
+    def __init__(self, max_concurrent: int, max_queue: int, timeout: float):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+
+    async def acquire(self) -> bool:
+        if self._semaphore.locked() and self.waiting >= self.max_queue: return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+
+def _build_limiter(scope_name: str, rate_per_minute: float, burst: int):
+    if config.ADMISSION_SHARED:
+        from db_setup import mongo_manager # Late import: db_setup is created after helpers are importable
+        return MongoWindowLimiter(scope_name, rate_per_minute, burst, mongo_manager.get_db)
+    return TokenBucketLimiter(rate_per_minute, burst)
+
+
+class WriteRoute(NamedTuple):
+    method: str
+    path: Pattern
+    rate_limited: bool
+    upload: bool
+
+
+WRITE_ROUTES: List[WriteRoute] = [
+    WriteRoute("POST", re.compile(r"^/api/items/?$"), rate_limited=True, upload=True),
+    WriteRoute("POST", re.compile(r"^/api/items/[^/]+/found/?$"), rate_limited=True, upload=True),
+    WriteRoute("POST", re.compile(r"^/api/found-items/?$"), rate_limited=True, upload=True),
+    WriteRoute("POST", re.compile(r"^/api/found-items/[^/]+/claim/?$"), rate_limited=True, upload=False),
+    WriteRoute("POST", re.compile(r"^/api/uploads/?$"), rate_limited=True, upload=False),
+    WriteRoute("POST", re.compile(r"^/api/images/similar/?$"), rate_limited=True, upload=True), # Hashes an uploaded photo
+    WriteRoute("PATCH", re.compile(r"^/api/uploads/[^/]+/?$"), rate_limited=False, upload=True), # Many chunks per file
+]
+
+ip_limiter = _build_limiter("ip", config.ADMISSION_IP_RATE_PER_MINUTE, config.ADMISSION_IP_BURST)
+email_limiter = _build_limiter("email", config.ADMISSION_EMAIL_RATE_PER_MINUTE, config.ADMISSION_EMAIL_BURST)
+
+
+def client_ip(scope: Scope) -> str:
+    if config.TRUST_FORWARDED_FOR:
+        # Rightmost entry: the address our proxy saw. Anything left of it is client-supplied and spoofable.
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for": return value.decode("latin-1").split(",")[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, int(retry_after + 0.999)))})
+
+
+async def check_email_limit(email: Optional[str]):
+    """Raises 429 when `email` has exceeded its submission budget. No-op for missing emails."""
+    if not email: return
+    retry_after = await email_limiter.acquire(email.strip().lower())
+    if retry_after:
+        raise f.HTTPException(status_code=429, detail="Too many submissions for this email. Please try again later.",
+                              headers={"Retry-After": str(max(1, int(retry_after + 0.999)))})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.upload_gate = ConcurrencyGate(config.ADMISSION_UPLOAD_CONCURRENCY, config.ADMISSION_UPLOAD_QUEUE,
+                                           config.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        route = None
+        if scope["type"] == "http" and scope["method"] in ("POST", "PATCH"):
+            route = next((r for r in WRITE_ROUTES if r.method == scope["method"] and r.path.match(scope["path"])), None)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        if route.rate_limited:
+            retry_after = await ip_limiter.acquire(client_ip(scope))
+            if retry_after:
+                await _reject(429, "Too many requests. Please slow down.", retry_after)(scope, receive, send)
+                return
+        if not route.upload:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.upload_gate.acquire():
+            logger.warning(f"Upload admission rejected (queue full): {scope['method']} {scope['path']}")
+            await _reject(503, "Server is busy processing uploads. Please retry shortly.", config.ADMISSION_QUEUE_TIMEOUT_SECONDS)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.upload_gate.release()
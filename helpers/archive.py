@@ -0,0 +1,154 @@
+"""
+Hot/cold tiering for lost_items and found_items.
+
+Items whose `created_at` is older than ARCHIVE_AFTER_DAYS are moved in small batches into
+`<collection>_archive`. Archive collections only carry the `_id` index, so the live collections,
+their `created_at`/text indexes and the working set stay proportional to recent reports.
+
+Moving is copy-then-delete with upserts keyed by `_id`, so a crash between the two steps is
+harmless and the next run simply resumes from the oldest remaining live document. The delete
+matches the whole copied document, so a write that lands in between keeps the item live (its
+archive copy is refreshed) until a later batch moves it unchanged. Runs are
+throttled to a duty cycle (work for at most ARCHIVE_DUTY_CYCLE of wall time) and guarded by a
+lease in `archive_state`, so only one worker archives at a time.
+
+Reads use `find_one_live_or_archived`, which falls back to the archive on a miss and remembers
+archived ids in a small in-process tombstone cache so repeat lookups go straight to the archive.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import DeleteOne, ReplaceOne
+
+from config import Config
+from helpers.logger import logger
+from helpers.lease import acquire_lease, release_lease
+from helpers.invalidation import publish
+from helpers.dedup import release_canonical
+
+ARCHIVED_COLLECTIONS = ("lost_items", "found_items")
+STATE_COLLECTION = "archive_state"
+TOMBSTONE_CACHE_SIZE = 10_000
+LEASE_SECONDS = 300
+
+_tombstones: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+
+
+def archive_name(collection_name: str) -> str:
+    return f"{collection_name}_archive"
+
+
+def _remember_archived(collection_name: str, item_id: str):
+    key = (collection_name, item_id)
+    _tombstones[key] = None
+    _tombstones.move_to_end(key)
+    while len(_tombstones) > TOMBSTONE_CACHE_SIZE:
+        _tombstones.popitem(last=False)
+
+
+def _forget_archived(collection_name: str, item_id: str):
+    _tombstones.pop((collection_name, item_id), None)
+
+
+async def find_one_live_or_archived(
+    db: AsyncIOMotorDatabase, collection_name: str, query: Dict[str, Any]
+) -> Tuple[Optional[Dict[str, Any]], AsyncIOMotorCollection]:
+    """
+    Looks up a document by a query containing `_id`, trying the live collection first
+    (or the archive first, if the id is a known tombstone). Returns (document, collection it lives in);
+    the collection is the live one when nothing matched.
+    """
+    live, archive = db[collection_name], db[archive_name(collection_name)]
+    item_id = query.get("_id")
+    order = (archive, live) if (collection_name, item_id) in _tombstones else (live, archive)
+    for collection in order:
+        doc = await collection.find_one(query)
+        if doc is not None:
+            if collection is archive: _remember_archived(collection_name, item_id)
+            else: _forget_archived(collection_name, item_id)
+            return doc, collection
+    return None, live
+
+
+# --- Archiver ---
+
+async def _archive_batch(db: AsyncIOMotorDatabase, collection_name: str, cutoff: datetime, batch_size: int) -> int:
+    live, archive = db[collection_name], db[archive_name(collection_name)]
+    docs = await live.find({"created_at": {"$lt": cutoff}}).sort("created_at", 1).limit(batch_size).to_list(length=batch_size)
+    if not docs: return 0
+    await archive.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs], ordered=False)
+    # Delete only documents still equal to the copied snapshot: a found report or edit that landed after the copy must not be lost
+    await live.bulk_write([DeleteOne(d) for d in docs], ordered=False)
+    changed = await live.find({"_id": {"$in": [d["_id"] for d in docs]}}).to_list(length=len(docs))
+    if changed: # Refresh their archive copies; they stay live and are moved by the next batch
+        await archive.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in changed], ordered=False)
+        logger.debug(f"{len(changed)} {collection_name} changed while being archived; retrying them.")
+    changed_ids = {d["_id"] for d in changed}
+    ids = [d["_id"] for d in docs if d["_id"] not in changed_ids]
+    for item_id in ids:
+        _remember_archived(collection_name, item_id)
+        await publish(db, collection_name, "delete", item_id)
+        await release_canonical(db, collection_name, item_id)
+    await db[STATE_COLLECTION].update_one(
+        {"_id": collection_name},
+        {"$set": {"last_batch_at": datetime.utcnow(), "last_created_at": docs[-1]["created_at"]}, "$inc": {"moved": len(ids)}},
+        upsert=True,
+    )
+    return len(ids)
+
+
+async def run_archiver(db: AsyncIOMotorDatabase, config: Config, max_batches: Optional[int] = None) -> Dict[str, int]:
+    """
+    Archives everything older than ARCHIVE_AFTER_DAYS, one throttled batch at a time.
+    Returns {collection: moved_count}. Safe to interrupt and rerun at any point.
+    """
+    if not await acquire_lease(db, STATE_COLLECTION, LEASE_SECONDS):
+        logger.debug("Archiver lease held by another worker; skipping run.")
+        return {}
+    cutoff = datetime.utcnow() - timedelta(days=config.ARCHIVE_AFTER_DAYS)
+    duty_cycle = min(max(config.ARCHIVE_DUTY_CYCLE, 0.01), 1.0)
+    moved = {name: 0 for name in ARCHIVED_COLLECTIONS}
+    batches = 0
+    try:
+        for collection_name in ARCHIVED_COLLECTIONS:
+            while max_batches is None or batches < max_batches:
+                started = time.monotonic()
+                count = await _archive_batch(db, collection_name, cutoff, config.ARCHIVE_BATCH_SIZE)
+                if count == 0: break
+                moved[collection_name] += count
+                batches += 1
+                # Sleep long enough that archiving uses at most `duty_cycle` of wall time
+                elapsed = time.monotonic() - started
+                await asyncio.sleep(elapsed * (1 / duty_cycle - 1))
+                if not await acquire_lease(db, STATE_COLLECTION, LEASE_SECONDS): return moved # Lost the lease mid-run
+        if any(moved.values()): logger.info(f"Archived items older than {cutoff:%Y-%m-%d}: {moved}")
+        return moved
+    finally:
+        await release_lease(db, STATE_COLLECTION)
+
+
+async def archive_loop(db: AsyncIOMotorDatabase, config: Config):
+    """Background task: runs the archiver every ARCHIVE_INTERVAL_SECONDS until cancelled."""
+    while True:
+        try:
+            await run_archiver(db, config)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Archiver run failed: {e}", exc_info=True)
+        await asyncio.sleep(config.ARCHIVE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    from db_setup import mongo_manager, config as app_config
+
+    async def _main():
+        await mongo_manager.connect()
+        try: await run_archiver(mongo_manager.get_db(), app_config)
+        finally: await mongo_manager.disconnect()
+
+    asyncio.run(_main())
@@ -0,0 +1,50 @@
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer keys under a metric (Hamming distance by default).
+    Range queries visit only children whose edge distance lies within [d - r, d + r] of the
+    query's distance to the node, which for small radii prunes almost the whole tree.
+    Deletion is not supported; callers filter removed values and rebuild periodically.
+    """
+    __slots__ = ("distance", "root", "size")
+
+    def __init__(self, distance: Optional[Callable[[int, int], int]] = None):
+        self.distance = distance or (lambda a, b: (a ^ b).bit_count())
+        self.root: Optional[list] = None # [key, values, {edge_distance: child}]
+        self.size = 0
+
+    def add(self, key: int, value: Any):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [value], {}]
+            return
+        node = self.root
+        while True:
+            d = self.distance(key, node[0])
+            if d == 0:
+                node[1].append(value) # Identical hash: share the node
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [key, [value], {}]
+                return
+            node = child
+
+    def search(self, key: int, radius: int) -> List[Tuple[int, Any]]:
+        """All (distance, value) pairs within `radius` of `key`, nearest first."""
+        if self.root is None: return []
+        results = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = self.distance(key, node[0])
+            if d <= radius: results.extend((d, value) for value in node[1])
+            low, high = d - radius, d + radius
+            stack.extend(child for edge, child in node[2].items() if low <= edge <= high)
+        results.sort(key=lambda pair: pair[0])
+        return results
+
+    def __len__(self) -> int:
+        return self.size
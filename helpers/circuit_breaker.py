@@ -0,0 +1,87 @@
+import time
+from typing import Dict
+
+from helpers.deadline import DeadlineExceeded
+from helpers.logger import logger
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. After `failure_threshold` consecutive failures it opens and
+    fails fast for `recovery_timeout` seconds, then lets a single trial call through (half-open):
+    success closes it again, failure re-opens it. A call that is cancelled or runs out of the
+    caller's own time budget says nothing about the dependency and is not counted either way.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at: float = 0.0
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold: return "closed"
+        if time.monotonic() - self.opened_at >= self.recovery_timeout: return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed": return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.failures >= self.failure_threshold: logger.info(f"Circuit '{self.name}' closed.")
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.failures >= self.failure_threshold:
+            if self.failures == self.failure_threshold: logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures.")
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Ends a call without a verdict, so a half-open breaker lets the next trial through."""
+        self.trial_in_flight = False
+
+    async def call(self, fn, *args, budget_limited: bool = False, **kwargs):
+        """
+        Awaits fn(*args, **kwargs) through the breaker; raises CircuitOpenError when open.
+        With `budget_limited` (see helpers.deadline.dependency_timeout), a timeout is the caller's, not a failure.
+        """
+        if not self.allow(): raise CircuitOpenError(f"{self.name} is unavailable (circuit open).")
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            if isinstance(e, DeadlineExceeded) or (budget_limited and is_timeout(e)): self.release()
+            else: self.record_failure()
+            raise
+        except BaseException: # Cancelled: must not leave a half-open trial in flight forever
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+
+def is_timeout(e: BaseException) -> bool:
+    """True for timeout errors: builtin/asyncio timeouts and pymongo's (PyMongoError.timeout)."""
+    return isinstance(e, TimeoutError) or getattr(e, "timeout", False) is True
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> CircuitBreaker:
+    """Process-wide breaker registry, so every caller of a dependency shares one breaker."""
+    if name not in _breakers: _breakers[name] = CircuitBreaker(name, failure_threshold, recovery_timeout)
+    return _breakers[name]
@@ -0,0 +1,114 @@
+import gzip
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try: # Brotli is optional; without it we only negotiate gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+# (gzip level, brotli quality) per content-type prefix. Dynamic JSON is compressed on every
+# request so it gets cheaper settings; text assets compress well and are requested less often.
+DEFAULT_LEVELS: Dict[str, Tuple[int, int]] = {
+    "application/json": (5, 4),
+    "application/javascript": (6, 6),
+    "image/svg+xml": (6, 6),
+    "text/": (6, 5),
+}
+
+
+def _parse_accept_encoding(value: str) -> Dict[str, float]:
+    """Returns {coding: q} from an Accept-Encoding header, ignoring malformed parts."""
+    codings = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token: continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try: q = float(params[2:])
+            except ValueError: continue
+        codings[token.strip().lower()] = q
+    return codings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Prefers brotli when the client accepts it and the module is installed, then gzip."""
+    codings = _parse_accept_encoding(accept_encoding)
+    if brotli is not None and codings.get("br", 0) > 0: return "br"
+    if codings.get("gzip", 0) > 0: return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses compressible responses (JSON, text, SVG, JS) larger than `minimum_size`
+    with brotli or gzip, picking the level from `levels` by content type.
+    Anything else (images, already-encoded bodies, 304s) passes through untouched.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, levels: Optional[Dict[str, Tuple[int, int]]] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = levels or DEFAULT_LEVELS
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding, self.minimum_size, self.levels)
+        await self.app(scope, receive, responder)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, encoding: str, minimum_size: int, levels: Dict[str, Tuple[int, int]]):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.levels = levels
+        self.start_message: Optional[Message] = None
+        self.level: Optional[Tuple[int, int]] = None
+        self.chunks = []
+
+    def _level_for(self, headers: MutableHeaders) -> Optional[Tuple[int, int]]:
+        if "content-encoding" in headers: return None
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        for prefix, level in self.levels.items():
+            if content_type.startswith(prefix): return level
+        return None
+
+    def _compress(self, body: bytes) -> bytes:
+        gzip_level, brotli_quality = self.level
+        if self.encoding == "br": return brotli.compress(body, quality=brotli_quality)
+        return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.level = self._level_for(MutableHeaders(raw=message["headers"]))
+            if self.level is None: await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.level is None:
+            await self.send(message)
+            return
+
+        # Buffer compressible bodies; API responses are small enough that this is cheaper
+        # than streaming a compressor and lets us skip tiny payloads entirely.
+        self.chunks.append(message.get("body", b""))
+        if message.get("more_body", False): return
+        body = b"".join(self.chunks)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        if len(body) >= self.minimum_size:
+            body = self._compress(body)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers and not headers["etag"].startswith("W/"):
+                headers["ETag"] = f"W/{headers['etag']}" # Encoded bytes differ from the original representation
+        headers["Content-Length"] = str(len(body))
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": body})
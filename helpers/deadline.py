@@ -0,0 +1,98 @@
+"""
+Per-request deadlines.
+
+DeadlineMiddleware gives every /api request a time budget (ENDPOINT_BUDGETS, else
+REQUEST_DEADLINE_SECONDS) and stores the absolute deadline in a contextvar. The same block runs
+under `pymongo.timeout(...)`, so every Mongo operation made while handling the request - including
+the WorldDB lookups - is sent with a maxTimeMS derived from the time left (pymongo client-side
+operation timeout; Motor copies the context into its executor threads).
+
+Non-Mongo calls (SMTP, outbound HTTP) take their timeout from `remaining(cap)`.
+When the budget is gone, `remaining` raises DeadlineExceeded, answered as 504 by main.py.
+Calls behind a circuit breaker use `dependency_timeout(cap)` before asking the breaker, so running
+out of the caller's budget is never counted as the dependency failing.
+"""
+import asyncio
+import contextvars
+import re
+import time
+from typing import List, Optional, Pattern, Tuple
+
+import pymongo
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import get_config
+
+config = get_config()
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+# (methods, path pattern, seconds). First match wins.
+ENDPOINT_BUDGETS: List[Tuple[Tuple[str, ...], Pattern, float]] = [
+    (("GET",), re.compile(r"^/api/locations/"), 3.0),
+    (("GET", "HEAD"), re.compile(r"^/api/(items|found-items|stats|uploads)"), 5.0),
+    (("PATCH",), re.compile(r"^/api/uploads/"), 300.0), # Streams a whole chunk from a slow client
+    (("POST", "PUT", "DELETE"), re.compile(r"^/api/"), 20.0), # Argon2, image writes and SMTP
+]
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def budget_for(method: str, path: str) -> Optional[float]:
+    if not path.startswith("/api/"): return None
+    for methods, pattern, seconds in ENDPOINT_BUDGETS:
+        if method in methods and pattern.match(path): return seconds
+    return config.REQUEST_DEADLINE_SECONDS
+
+
+def remaining(cap: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds left in the current request's budget, limited to `cap`.
+    Outside a request returns `cap` unchanged; raises DeadlineExceeded once the budget is spent.
+    """
+    deadline = _deadline.get()
+    if deadline is None: return cap
+    left = deadline - time.monotonic()
+    if left <= 0: raise DeadlineExceeded("Request deadline exceeded.")
+    return left if cap is None else min(cap, left)
+
+
+def dependency_timeout(cap: float) -> Tuple[float, bool]:
+    """
+    Timeout for one dependency call: `cap`, or the request's remaining budget if that is shorter.
+    The flag is True when the budget set the timeout, so a timeout is the caller's, not the dependency's.
+    """
+    timeout = remaining(cap)
+    return timeout, timeout < cap
+
+
+class DeadlineMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        budget = budget_for(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        token = _deadline.set(time.monotonic() + budget)
+        try:
+            with pymongo.timeout(budget):
+                await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+_detached_tasks = set()
+
+def run_detached(coro) -> "asyncio.Task":
+    """
+    Runs follow-up work after the response in a fresh context, so it is not bound by (or cancelled
+    through) the originating request's deadline and Mongo timeout. Keeps a strong reference until done.
+    """
+    task = asyncio.create_task(coro, context=contextvars.Context())
+    _detached_tasks.add(task)
+    task.add_done_callback(_detached_tasks.discard)
+    return task
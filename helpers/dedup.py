@@ -0,0 +1,233 @@
+"""
+Near-duplicate detection for lost and found reports.
+
+At ingest every report gets a `dedup` field: the MinHash signature of its description
+(helpers.minhash), its location shard (country|city), and the key duplicates must share. For
+lost items that key is the owner (a hash of reporter_email). For found items it is the day found,
+matched within DEDUP_DATE_WINDOW_DAYS. An in-process LSH index buckets signatures by (kind,
+location shard, band) in LSH_BANDS bands of LSH_ROWS rows. Finding the candidates for a new
+report therefore costs LSH_BANDS dict lookups, whatever the collection size. Candidates count as
+duplicates at an estimated Jaccard similarity of at least DEDUP_THRESHOLD.
+
+A duplicate is still stored, so no finder contact or management link is lost. It is stored with
+`duplicate_of` set to its cluster's canonical (first) report: list pages hide it, and
+GET /api/duplicates lists the clusters. When a canonical report is deleted or archived, the
+smallest-id duplicate takes its place (release_canonical), so the rest of the cluster stays visible. The index is per worker. Startup rebuilds it in one
+streaming pass over the live collections, which holds one cursor batch of documents at a time.
+The invalidation bus keeps it current with other workers' writes.
+"""
+import asyncio
+import hashlib
+import sys
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from config import get_config
+from helpers.deadline import run_detached
+from helpers.invalidation import Invalidation, bus, publish
+from helpers.logger import logger
+from helpers.minhash import NUM_PERM, signature, similarity
+
+config = get_config()
+
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS # 16 x 4: a pair at 0.6 similarity shares a bucket with ~89% probability
+COLLECTIONS = {"lost": "lost_items", "found": "found_items"}
+_KINDS = {name: kind for kind, name in COLLECTIONS.items()}
+
+
+def dedup_fields(kind: str, description: str, country: Optional[str] = None, city: Optional[str] = None,
+                 reporter_email: Optional[str] = None, date_found: Optional[datetime] = None) -> Dict[str, Any]:
+    """The `dedup` sub-document stored on a report."""
+    return {
+        "minhash": signature(description),
+        "shard": f"{(country or '').strip().lower()}|{(city or '').strip().lower()}",
+        "owner": hashlib.sha256(reporter_email.strip().lower().encode()).hexdigest()[:16] if kind == "lost" and reporter_email else None,
+        "day": date_found.toordinal() if kind == "found" and date_found else None,
+    }
+
+
+def _doc_fields(kind: str, doc: Dict) -> Dict[str, Any]:
+    return doc.get("dedup") or dedup_fields(kind, doc.get("description", ""), doc.get("country"), doc.get("city"),
+                                            doc.get("reporter_email"), doc.get("date_found"))
+
+
+class _Entry(NamedTuple):
+    minhash: array
+    shard: str
+    owner: Optional[str]
+    day: Optional[int]
+    canonical: str # The entry's own id unless it is a duplicate
+
+
+class DuplicateIndex:
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._buckets: Dict[int, List[str]] = {} # hash((kind, shard, band, band values)) -> item ids
+        self._members: Dict[Tuple[str, str], Set[str]] = {} # (kind, canonical id) -> duplicate ids
+        self._pending: Optional[list] = None # Changes made while a rebuild is scanning
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _band_keys(kind: str, shard: str, minhash) -> List[int]:
+        return [hash((kind, shard, band, tuple(minhash[band * LSH_ROWS:(band + 1) * LSH_ROWS]))) for band in range(LSH_BANDS)]
+
+    def find_duplicate(self, kind: str, fields: Dict[str, Any]) -> Optional[Tuple[str, float]]:
+        """(canonical id, similarity) of the closest indexed duplicate of a new report, or None."""
+        minhash, best = fields["minhash"], None
+        candidates = {item_id for key in self._band_keys(kind, fields["shard"], minhash) for item_id in self._buckets.get(key, ())}
+        for item_id in candidates:
+            entry = self._entries.get((kind, item_id))
+            if entry is None or entry.shard != fields["shard"]: continue # Bucket hash collision
+            if kind == "lost" and (not entry.owner or entry.owner != fields["owner"]): continue
+            if kind == "found" and entry.day is not None and fields["day"] is not None and abs(entry.day - fields["day"]) > config.DEDUP_DATE_WINDOW_DAYS: continue
+            score = similarity(entry.minhash, minhash)
+            if score >= config.DEDUP_THRESHOLD and (best is None or score > best[1]): best = (entry.canonical, score)
+        return best
+
+    def add(self, kind: str, item_id: str, fields: Dict[str, Any], duplicate_of: Optional[str] = None):
+        """Indexes a report, replacing any previous entry (an edit keeps the report's cluster)."""
+        if self._pending is not None: self._pending.append(("add", kind, item_id, fields, duplicate_of))
+        previous = self._entries.get((kind, item_id))
+        if previous is not None:
+            self._unlink(kind, item_id, previous)
+            duplicate_of = duplicate_of or (previous.canonical if previous.canonical != item_id else None)
+        entry = _Entry(array("I", fields["minhash"]), fields["shard"], fields.get("owner"), fields.get("day"), duplicate_of or item_id)
+        self._entries[(kind, item_id)] = entry
+        for key in self._band_keys(kind, entry.shard, entry.minhash): self._buckets.setdefault(key, []).append(item_id)
+        if duplicate_of: self._members.setdefault((kind, duplicate_of), set()).add(item_id)
+
+    def remove(self, kind: str, item_id: str):
+        if self._pending is not None: self._pending.append(("remove", kind, item_id))
+        entry = self._entries.pop((kind, item_id), None)
+        if entry is None: return
+        self._unlink(kind, item_id, entry)
+        if entry.canonical != item_id:
+            members = self._members.get((kind, entry.canonical))
+            if members is not None:
+                members.discard(item_id)
+                if not members: del self._members[(kind, entry.canonical)]
+        else:
+            self._promote(kind, item_id)
+
+    def _promote(self, kind: str, canonical: str):
+        """Re-keys the cluster of a removed canonical report on its smallest member id, as release_canonical does in Mongo."""
+        members = self._members.pop((kind, canonical), None)
+        if not members: return
+        successor = min(members)
+        members.discard(successor)
+        for item_id in (successor, *members):
+            entry = self._entries.get((kind, item_id))
+            if entry is not None: self._entries[(kind, item_id)] = entry._replace(canonical=successor)
+        if members: self._members[(kind, successor)] = members
+
+    def _unlink(self, kind: str, item_id: str, entry: _Entry):
+        for key in self._band_keys(kind, entry.shard, entry.minhash):
+            bucket = self._buckets.get(key)
+            if bucket is None: continue
+            if item_id in bucket: bucket.remove(item_id)
+            if not bucket: del self._buckets[key]
+
+    def clusters(self, kind: Optional[str] = None, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Duplicate clusters, largest first: the canonical report plus the ids flagged as its duplicates."""
+        found = [{"kind": k, "canonical_id": canonical, "duplicate_ids": sorted(members), "size": len(members) + 1}
+                 for (k, canonical), members in self._members.items() if kind is None or k == kind]
+        found.sort(key=lambda c: (-c["size"], c["kind"], c["canonical_id"]))
+        return found[skip:skip + limit]
+
+    async def rebuild(self, db, batch_size: int = 1000):
+        """Streams the live collections into fresh structures, then swaps them in."""
+        async with self._lock:
+            fresh = DuplicateIndex()
+            self._pending = []
+            computed = 0
+            try:
+                for kind, name in COLLECTIONS.items():
+                    projection = {"dedup": 1, "duplicate_of": 1, "description": 1, "country": 1, "city": 1, "reporter_email": 1, "date_found": 1}
+                    async for doc in db[name].find({}, projection, batch_size=batch_size):
+                        fresh.add(kind, doc["_id"], _doc_fields(kind, doc), doc.get("duplicate_of"))
+                        if not doc.get("dedup"): # Signature computed on the loop (~ms per long description): yield after each one
+                            computed += 1
+                            await asyncio.sleep(0)
+                        elif len(fresh) % batch_size == 0: await asyncio.sleep(0)
+                for change in self._pending: # Applied mid-scan
+                    if change[0] == "add": fresh.add(*change[1:])
+                    else: fresh.remove(*change[1:])
+                for kind, canonical in [key for key in fresh._members if key not in fresh._entries]:
+                    fresh._promote(kind, canonical) # Canonical removed while its duplicates were being written
+                self._entries, self._buckets, self._members = fresh._entries, fresh._buckets, fresh._members
+            finally:
+                self._pending = None
+            logger.info(f"Duplicate index rebuilt with {len(self)} reports in {len(self._members)} clusters.")
+            if computed: logger.warning(f"{computed} reports have no stored signature; run `python -m helpers.dedup backfill` to speed up startup.")
+
+
+duplicate_index = DuplicateIndex()
+
+
+async def rebuild_duplicate_index(db):
+    try: await duplicate_index.rebuild(db)
+    except Exception as e: logger.error(f"Duplicate index rebuild failed: {e}", exc_info=True)
+
+
+async def release_canonical(db, collection_name: str, item_id: str) -> Optional[str]:
+    """
+    Called by the worker that deleted or archived a report. If the report was a cluster's canonical,
+    its smallest-id duplicate becomes the new canonical and the others point to it, so they don't
+    stay hidden from list pages behind a missing report. Every worker's index makes the same choice
+    when it sees the delete event. Returns the promoted id, if any.
+    """
+    if collection_name not in _KINDS: return None
+    collection = db[collection_name]
+    survivors = [doc["_id"] async for doc in collection.find({"duplicate_of": item_id}, {"_id": 1})]
+    if not survivors: return None
+    successor = min(survivors)
+    await collection.update_one({"_id": successor}, {"$set": {"duplicate_of": None}})
+    await collection.update_many({"duplicate_of": item_id}, {"$set": {"duplicate_of": successor}})
+    for survivor in survivors: await publish(db, collection_name, "update", survivor) # Evicts cached copies
+    logger.info(f"Promoted {successor} to canonical of {len(survivors)} reports after {item_id} was removed.")
+    return successor
+
+
+def _on_invalidation(event: Invalidation):
+    kind = _KINDS.get(event.collection)
+    if kind is None: return # Archived reports are not indexed
+    if event.op == "delete": duplicate_index.remove(kind, event.item_id)
+    elif event.fields.get("dedup"): duplicate_index.add(kind, event.item_id, event.fields["dedup"], event.fields.get("duplicate_of"))
+
+
+def _on_reset():
+    from db_setup import mongo_manager # Late import, as in helpers.idempotency
+    db = mongo_manager.get_db()
+    if db is not None: run_detached(rebuild_duplicate_index(db))
+
+
+bus.subscribe(_on_invalidation, on_reset=_on_reset)
+
+
+async def backfill(db, batch_size: int = 500) -> Dict[str, int]:
+    """Stores `dedup` on reports saved before it existed, so startup rebuilds don't recompute it."""
+    updated = {}
+    for kind, name in COLLECTIONS.items():
+        updated[name] = 0
+        projection = {"description": 1, "country": 1, "city": 1, "reporter_email": 1, "date_found": 1}
+        async for doc in db[name].find({"dedup": None}, projection, batch_size=batch_size):
+            await db[name].update_one({"_id": doc["_id"]}, {"$set": {"dedup": _doc_fields(kind, doc)}})
+            updated[name] += 1
+    return updated
+
+
+if __name__ == "__main__":
+    from db_setup import mongo_manager
+
+    async def _main():
+        await mongo_manager.connect()
+        try: print(await backfill(mongo_manager.get_db()))
+        finally: await mongo_manager.disconnect()
+
+    if sys.argv[1:] != ["backfill"]: sys.exit("usage: python -m helpers.dedup backfill")
+    asyncio.run(_main())
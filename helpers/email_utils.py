@@ -1,11 +1,36 @@
+import asyncio
 import smtplib
+from datetime import datetime, timedelta
 from email.message import EmailMessage
-from config import Config
+from typing import List, Optional, Tuple
+
+import anyio
+import pymongo
+from pymongo import ReturnDocument
+
+from config import get_config
 from helpers.logger import logger
+from helpers.circuit_breaker import get_breaker, CircuitOpenError
+from helpers.deadline import remaining, run_detached, DeadlineExceeded
+from helpers.lease import worker_id
+
+config = get_config()
+
+OUTBOX_COLLECTION = "email_outbox"
+OUTBOX_QUEUE_TIMEOUT_SECONDS = 5.0
+OUTBOX_CLAIM_SECONDS = 600 # Longer than one SMTP session for a whole batch
+smtp_breaker = get_breaker("smtp", config.BREAKER_FAILURE_THRESHOLD, config.BREAKER_RECOVERY_SECONDS)
+
+def _build_message(to_email: str, subject: str, body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg.set_content(body)
+    msg['Subject'] = subject
+    msg['From'] = config.EMAIL_SENDER
+    msg['To'] = to_email
+    return msg
 
-config = Config() # Instantiate the config object
 
-def send_email(to_email: str, subject: str, body: str) -> bool:
+def send_email(to_email: str, subject: str, body: str, timeout: Optional[float] = None) -> bool:
     """
     Sends an email using Gmail SMTP configuration from the Config object.
 
@@ -13,39 +38,169 @@ def send_email(to_email: str, subject: str, body: str) -> bool:
         to_email: The recipient's email address.
         subject: The email subject line.
         body: The email body content (plain text).
+        timeout: Socket timeout for the SMTP session; defaults to SMTP_TIMEOUT_SECONDS.
 
     Returns:
         True if the email was sent successfully, False otherwise.
     """
-    msg = EmailMessage()
-    msg.set_content(body)
-    msg['Subject'] = subject
-    msg['From'] = config.EMAIL_SENDER
-    msg['To'] = to_email
+    return send_emails([(to_email, subject, body)], timeout=timeout)[0]
+
+
+def send_emails(messages: List[Tuple[str, str, str]], timeout: Optional[float] = None) -> List[bool]:
+    """
+    Sends several (to_email, subject, body) emails over a single SMTP session, so a batch pays for
+    one connect, STARTTLS handshake and login instead of one per message.
 
+    Returns:
+        One flag per message, True if that message was accepted by the server.
+    """
+    results = [False] * len(messages)
+    if not messages: return results
     try:
         # Connect to the Gmail SMTP server
-        server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT)
+        server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT, timeout=timeout or config.SMTP_TIMEOUT_SECONDS)
         server.starttls()  # Secure the connection
         # Login to the sender's account
         server.login(config.EMAIL_SENDER, config.EMAIL_PASSWORD)
-        # Send the email
-        server.send_message(msg)
-        server.quit()
-        logger.info(f"Successfully sent email to {to_email} with subject: {subject}")
-        return True
     except smtplib.SMTPAuthenticationError:
-        # pass
         logger.error(f"SMTP Authentication failed for {config.EMAIL_SENDER}. Check credentials or 'less secure app access'.")
+        return results
     except smtplib.SMTPConnectError:
         logger.error(f"Failed to connect to SMTP server {config.SMTP_SERVER}:{config.SMTP_PORT}.")
+        return results
+    except Exception as e:
+        logger.error(f"Failed to open SMTP session: {e}", exc_info=True)
+        return results
+
+    try:
+        for i, (to_email, subject, body) in enumerate(messages):
+            try:
+                server.send_message(_build_message(to_email, subject, body))
+                results[i] = True
+                logger.info(f"Successfully sent email to {to_email} with subject: {subject}")
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e: # Per-message rejection; the session is still usable
+                logger.error(f"Failed to send email to {to_email}: {e}")
+            except Exception as e:
+                logger.error(f"Failed to send email to {to_email}: {e}", exc_info=True)
+                break # Connection-level failure: the rest of the batch would fail too
+    finally:
+        try: server.quit()
+        except Exception: pass
+    return results
+
+
+async def send_emails_async(messages: List[Tuple[str, str, str]]) -> Optional[List[bool]]:
+    """
+    Sends a batch over one SMTP session from a worker thread, through the SMTP circuit breaker.
+    Returns None without trying when the circuit is open. Nothing is queued on failure;
+    callers keep their own pending state and retry.
+    """
+    if not messages: return []
+    if not smtp_breaker.allow(): return None
+    try: results = await anyio.to_thread.run_sync(lambda: send_emails(messages))
+    except BaseException:
+        smtp_breaker.release() # Cancelled: don't leave a half-open trial in flight
+        raise
+    if any(results): smtp_breaker.record_success()
+    else: smtp_breaker.record_failure()
+    return results
+
+
+async def _insert_outbox(doc: dict):
+    from db_setup import mongo_manager # Late import to keep this module importable without the app
+    with pymongo.timeout(OUTBOX_QUEUE_TIMEOUT_SECONDS):
+        await mongo_manager.get_db()[OUTBOX_COLLECTION].insert_one(doc)
+
+
+async def queue_email(to_email: str, subject: str, body: str) -> bool:
+    """
+    Stores an email in the outbox for email_outbox_loop to deliver once SMTP is healthy.
+    The insert runs outside the request's budget: this is the fallback for when that budget is spent.
+    """
+    try:
+        # A nested pymongo.timeout can only shorten the request's deadline, so start from a fresh context
+        await run_detached(_insert_outbox({
+            "to_email": to_email, "subject": subject, "body": body,
+            "attempts": 0, "created_at": datetime.utcnow(),
+        }))
+        logger.info(f"Queued email to {to_email} for later delivery.")
+        return True
     except Exception as e:
-        # pass
-        logger.error(f"Failed to send email to {to_email}: {e}", exc_info=True)
+        logger.error(f"Failed to queue email to {to_email}: {e}")
+        return False
+
+
+async def send_email_async(to_email: str, subject: str, body: str) -> bool:
+    """
+    Sends an email from a worker thread, bounded by the request deadline and the SMTP circuit breaker.
+    If SMTP is unhealthy (breaker open, failure or no time left) the email is queued in the outbox instead.
+    Returns True if the email was sent or queued.
+    """
+    try:
+        timeout = remaining(config.SMTP_TIMEOUT_SECONDS)
+        if smtp_breaker.allow():
+            try: sent = await anyio.to_thread.run_sync(lambda: send_email(to_email, subject, body, timeout=timeout))
+            except BaseException:
+                smtp_breaker.release() # Cancelled: don't leave a half-open trial in flight
+                raise
+            if sent:
+                smtp_breaker.record_success()
+                return True
+            smtp_breaker.record_failure()
+    except DeadlineExceeded:
+        logger.warning(f"No time left to send email to {to_email}; queueing.")
+    return await queue_email(to_email, subject, body)
+
+
+async def _claim_batch(db, batch_size: int) -> List[dict]:
+    """
+    Claims up to batch_size queued emails for this worker, one atomic find_one_and_update each, so
+    workers draining the outbox at the same time never send the same row. A claim expires after
+    OUTBOX_CLAIM_SECONDS, which returns the rows of a worker that died mid-send to the queue.
+    """
+    batch = []
+    now = datetime.utcnow()
+    for _ in range(batch_size):
+        doc = await db[OUTBOX_COLLECTION].find_one_and_update(
+            {"attempts": {"$lt": config.EMAIL_OUTBOX_MAX_ATTEMPTS}, "$or": [{"claimed_until": None}, {"claimed_until": {"$lt": now}}]},
+            {"$set": {"owner": worker_id, "claimed_until": now + timedelta(seconds=OUTBOX_CLAIM_SECONDS)}},
+            sort=[("created_at", 1)], return_document=ReturnDocument.AFTER,
+        )
+        if doc is None: break
+        batch.append(doc)
+    return batch
+
+
+async def drain_outbox(db, batch_size: int = 20) -> int:
+    """Delivers a batch of queued emails over one SMTP session if the breaker allows it. Returns the number sent."""
+    if smtp_breaker.state == "open": return 0 # Try again next interval, without claiming rows
+    batch = await _claim_batch(db, batch_size)
+    if not batch: return 0
+    results = await send_emails_async([(m["to_email"], m["subject"], m["body"]) for m in batch])
+    if results is None: results = [None] * len(batch) # Circuit opened meanwhile: release the claims untouched
+    sent_ids = [m["_id"] for m, ok in zip(batch, results) if ok]
+    failed_ids = [m["_id"] for m, ok in zip(batch, results) if ok is False]
+    untried_ids = [m["_id"] for m, ok in zip(batch, results) if ok is None]
+    release = {"$set": {"owner": None, "claimed_until": None}}
+    if sent_ids: await db[OUTBOX_COLLECTION].delete_many({"_id": {"$in": sent_ids}}) # Sent, whoever holds the claim now
+    if failed_ids: await db[OUTBOX_COLLECTION].update_many({"_id": {"$in": failed_ids}, "owner": worker_id}, {**release, "$inc": {"attempts": 1}})
+    if untried_ids: await db[OUTBOX_COLLECTION].update_many({"_id": {"$in": untried_ids}, "owner": worker_id}, release)
+    return len(sent_ids)
+
 
-    return False
+async def email_outbox_loop(db):
+    """Background task: drains the outbox every EMAIL_OUTBOX_INTERVAL_SECONDS until cancelled."""
+    while True:
+        try:
+            sent = await drain_outbox(db)
+            if sent: logger.info(f"Delivered {sent} queued emails.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Email outbox drain failed: {e}", exc_info=True)
+        await asyncio.sleep(config.EMAIL_OUTBOX_INTERVAL_SECONDS)
 
 
 # Example usage:
 # if __name__ == "__main__":
-#     send_email("satya@satyendra.in", "Test Subject", "This is a test email body.")
\ No newline at end of file
+#     send_email("satya@satyendra.in", "Test Subject", "This is a test email body.")
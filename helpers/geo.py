@@ -0,0 +1,163 @@
+"""
+Coordinates for free-text locations.
+
+Items are geocoded at write time against the WorldDB reference data behind api/locations.py:
+the city if it is known, else the state, else the country. The result is stored on the item
+as a GeoJSON point (`location_point`, [lng, lat]) with `location_precision`. Both item
+collections have a 2dsphere index on it, which serves `$geoNear` radius queries and the
+`$geoWithin` candidate filters used for matching.
+
+Lookups are cached in-process, including misses, since the reference data is effectively static.
+They go through the WorldDB circuit breaker with a short timeout. If WorldDB is down, the item
+is saved without a point; `python -m helpers.geo backfill` fills those in later.
+"""
+import asyncio
+import math
+import re
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import pymongo
+
+from config import get_config
+from helpers.deadline import dependency_timeout
+from helpers.logger import logger
+
+config = get_config()
+
+EARTH_RADIUS_KM = 6378.1
+CACHE_MAX_ENTRIES = 10_000
+GEO_COLLECTIONS = ("lost_items", "found_items")
+
+_cache: "OrderedDict[Tuple[str, str, str], Optional[Dict]]" = OrderedDict()
+
+
+def point(lat: float, lng: float) -> Dict:
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def parse_near(near: str) -> Tuple[float, float]:
+    """Parses 'lat,lng'; raises ValueError when malformed or out of range."""
+    lat, lng = (float(part) for part in near.split(","))
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180): raise ValueError("Coordinates out of range.")
+    return lat, lng
+
+
+def haversine_km(a: Dict, b: Dict) -> float:
+    """Great-circle distance between two GeoJSON points."""
+    (lng1, lat1), (lng2, lat2) = a["coordinates"], b["coordinates"]
+    dlat, dlng = math.radians(lat2 - lat1), math.radians(lng2 - lng1)
+    h = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def within_km(center: Dict, radius_km: float) -> Dict:
+    """`$geoWithin` filter for a circle (served by the 2dsphere index)."""
+    return {"$geoWithin": {"$centerSphere": [center["coordinates"], radius_km / EARTH_RADIUS_KM]}}
+
+
+def near_pipeline(center: Dict, radius_km: float, projection: Dict, skip: int, limit: int, query: Optional[Dict] = None) -> list:
+    """
+    Aggregation for items within `radius_km` of `center`, nearest first, with `distance_km` added.
+    $geoNear walks the 2dsphere index in distance order, so a page only reads skip + limit documents.
+    """
+    return [
+        {"$geoNear": {"near": center, "key": "location_point", "distanceField": "distance_km", "distanceMultiplier": 0.001,
+                      "maxDistance": radius_km * 1000, "spherical": True, "query": query or {}}},
+        {"$skip": skip}, {"$limit": limit},
+        {"$project": {**projection, "distance_km": 1}},
+    ]
+
+
+def match_area_filter(doc: Dict, radius_km: float) -> Dict:
+    """
+    Candidate filter for matching: same country, or - for city-precise items - anywhere within
+    `radius_km`, so neighbouring towns across a border still meet. Empty when the location is unknown.
+    """
+    clauses = []
+    if doc.get("location_point") and doc.get("location_precision") == "city":
+        clauses.append({"location_point": within_km(doc["location_point"], radius_km)})
+    if doc.get("country"): clauses.append({"country": doc["country"]})
+    if not clauses: return {}
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _exact(name: str) -> Dict:
+    return {"$regex": f"^{re.escape(name.strip())}$", "$options": "i"}
+
+
+def _to_point(doc: Optional[Dict]) -> Optional[Dict]:
+    try: return point(float(doc["latitude"]), float(doc["longitude"])) if doc else None
+    except (KeyError, TypeError, ValueError): return None
+
+
+async def _lookup(country: Optional[str], state: Optional[str], city: Optional[str]) -> Tuple[Optional[Dict], Optional[str]]:
+    from api.locations import db as world_db, world_db_breaker # Late import: shares the WorldDB client and breaker
+    projection = {"latitude": 1, "longitude": 1}
+
+    timeout, budget_limited = dependency_timeout(config.GEO_LOOKUP_TIMEOUT_SECONDS) # Before the breaker: no time left is not a WorldDB failure
+
+    async def query():
+        with pymongo.timeout(timeout):
+            if city and state:
+                found = _to_point(await world_db.cities.find_one({"country_name": _exact(country), "state_name": _exact(state), "name": _exact(city)}, projection))
+                if found: return found, "city"
+            if state:
+                found = _to_point(await world_db.state.find_one({"country_name": _exact(country), "name": _exact(state)}, projection))
+                if found: return found, "state"
+            return _to_point(await world_db.countries.find_one({"name": _exact(country)}, projection)), "country"
+
+    location_point, precision = await world_db_breaker.call(query, budget_limited=budget_limited)
+    return location_point, precision if location_point else None
+
+
+async def resolve_location(country: Optional[str], state: Optional[str], city: Optional[str]) -> Dict:
+    """
+    Fields to store on an item for its location: {"location_point", "location_precision"},
+    both None when the location is unknown or cannot be resolved right now.
+    """
+    if not country: return {"location_point": None, "location_precision": None}
+    key = tuple((part or "").strip().lower() for part in (country, state, city))
+    if key in _cache:
+        _cache.move_to_end(key)
+        return dict(_cache[key])
+    try:
+        location_point, precision = await _lookup(country, state, city)
+    except Exception as e: # WorldDB down, circuit open or out of time: save without coordinates
+        logger.warning(f"Could not geocode {key}: {e}")
+        return {"location_point": None, "location_precision": None}
+    result = {"location_point": location_point, "location_precision": precision}
+    _cache[key] = result
+    while len(_cache) > CACHE_MAX_ENTRIES: _cache.popitem(last=False)
+    return dict(result)
+
+
+async def backfill(db, batch_size: int = 500) -> Dict[str, int]:
+    """Geocodes items that have a country but no point yet (e.g. saved while WorldDB was down)."""
+    updated = {}
+    for name in GEO_COLLECTIONS:
+        updated[name] = 0
+        cursor = db[name].find({"country": {"$nin": [None, ""]}, "location_point": None}, {"country": 1, "state": 1, "city": 1}, batch_size=batch_size)
+        async for doc in cursor:
+            fields = await resolve_location(doc.get("country"), doc.get("state"), doc.get("city"))
+            if fields["location_point"] is None: continue
+            await db[name].update_one({"_id": doc["_id"]}, {"$set": fields})
+            updated[name] += 1
+    return updated
+
+
+if __name__ == "__main__":
+    import sys
+    from db_setup import mongo_manager
+
+    async def _main():
+        from api.locations import connect_world_db, close_world_db
+        await mongo_manager.connect()
+        connect_world_db()
+        try: print(await backfill(mongo_manager.get_db()))
+        finally:
+            close_world_db()
+            await mongo_manager.disconnect()
+
+    if sys.argv[1:] != ["backfill"]: sys.exit("usage: python -m helpers.geo backfill")
+    asyncio.run(_main())
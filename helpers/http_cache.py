@@ -0,0 +1,42 @@
+import hashlib
+from typing import Optional
+
+import fastapi as f
+
+
+def weak_etag(content: bytes) -> str:
+    """Weak ETag derived from the serialized payload (semantic equivalence, not byte-exact after compression)."""
+    return f'W/"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request: f.Request, etag: str) -> bool:
+    """Weak comparison against If-None-Match (RFC 9110 13.1.2)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match: return False
+    if if_none_match.strip() == "*": return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def cache_headers(etag: str, max_age: int) -> dict:
+    # max_age=0 still lets clients store the body but forces a (cheap, 304) revalidation each time
+    cache_control = f"public, max-age={max_age}" if max_age > 0 else "public, no-cache"
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(request: f.Request, etag: str, max_age: int) -> Optional[f.Response]:
+    """Returns a bodiless 304 when the client already holds `etag`, otherwise None."""
+    if etag_matches(request, etag):
+        return f.Response(status_code=f.status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, max_age))
+    return None
+
+
+def conditional_response(request: f.Request, content: bytes, max_age: int, etag: Optional[str] = None) -> f.Response:
+    """
+    Wraps an already-serialized JSON body with ETag/Cache-Control validators,
+    answering 304 Not Modified when If-None-Match matches.
+    """
+    etag = etag or weak_etag(content)
+    return not_modified(request, etag, max_age) or f.Response(
+        content=content, media_type="application/json", headers=cache_headers(etag, max_age)
+    )
@@ -0,0 +1,237 @@
+"""
+Idempotency-Key support for create/report endpoints.
+
+Clients may send `Idempotency-Key: <opaque string>` with the POSTs in IDEMPOTENT_ROUTES. The key,
+scoped to method and path, is claimed by inserting `{_id: sha256(method path key), status:
+"processing"}` into `idempotency_keys`. The `_id` makes the claim atomic across workers, and a TTL
+index on `expires_at` forgets keys after IDEMPOTENCY_TTL_SECONDS.
+
+* First request: runs normally. Its response (status, headers, body) is stored on the key with a
+  fingerprint of the request (method, path, content type and a digest of the body, hashed as the
+  app reads it). Nothing is stored for a server error, a transient 4xx (408/409/425/429) or a
+  request whose body the app did not read to the end; the key is released so a retry runs again.
+  Secrets listed for the route (the plaintext management token) are removed from the stored body.
+  A replay therefore omits them; the owner already has them by email.
+* Repeat of a completed key: the body is read and hashed, not parsed. If the fingerprint matches,
+  the stored response is replayed with `Idempotent-Replayed: true`, and no disk, DB or SMTP work
+  happens. A different request that reuses the key gets 422.
+* Repeat while the first is still processing: waits up to IDEMPOTENCY_WAIT_SECONDS for it to
+  finish, then replays. If it is still running, returns 409 with Retry-After. A claim whose
+  owner died (IDEMPOTENCY_LOCK_SECONDS passed) is taken over.
+
+Each claim carries a fresh per-request token, and completion and release match on it. So a request
+that outlived its lock (a slow upload) can't overwrite or delete the record of the one that took over.
+
+Multipart boundaries are left out of the fingerprint, because clients pick a fresh one per send.
+
+The middleware sits outside AdmissionMiddleware, so replays cost no rate-limit tokens.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Pattern, Tuple
+
+import pymongo
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import get_config
+from helpers.logger import logger
+
+config = get_config()
+
+COLLECTION = "idempotency_keys"
+MAX_KEY_LENGTH = 255
+MAX_STORED_BODY = 64 * 1024
+TRANSIENT_STATUSES = {408, 409, 425, 429}
+_SKIPPED_HEADERS = {b"content-length", b"date", b"server"}
+
+# (method, path pattern, top-level JSON response fields never stored)
+IDEMPOTENT_ROUTES: List[Tuple[str, Pattern, Tuple[str, ...]]] = [
+    ("POST", re.compile(r"^/api/items/?$"), ("management_token",)),
+    ("POST", re.compile(r"^/api/items/[^/]+/found/?$"), ()),
+    ("POST", re.compile(r"^/api/found-items/?$"), ()),
+    ("POST", re.compile(r"^/api/found-items/[^/]+/claim/?$"), ()),
+]
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name: return value.decode("latin-1")
+    return None
+
+
+def _reject(status_code: int, detail: str, retry_after: Optional[int] = None) -> JSONResponse:
+    headers = {"Retry-After": str(retry_after)} if retry_after else None
+    return JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+
+
+class _Fingerprint:
+    """Streaming sha256 of method, path, content type (minus boundary) and body (minus boundary)."""
+    def __init__(self, scope: Scope):
+        content_type = _header(scope, b"content-type") or ""
+        media_type, _, params = content_type.partition(";")
+        boundary = next((v.strip().strip('"') for k, _, v in (p.strip().partition("=") for p in params.split(";")) if k.lower() == "boundary"), "")
+        self._boundary = boundary.encode("latin-1")
+        self._carry = b""
+        self._hash = hashlib.sha256(f"{scope['method']} {scope['path'].rstrip('/')} {media_type.strip().lower()}\n".encode())
+        self.complete = False
+
+    def update(self, message: Message):
+        if message["type"] != "http.request": return
+        data = message.get("body", b"")
+        if self._boundary: # Hold back a tail, so a boundary split across two chunks is still removed
+            data = (self._carry + data).replace(self._boundary, b"")
+            split = max(len(data) - len(self._boundary) + 1, 0)
+            data, self._carry = data[:split], data[split:]
+        self._hash.update(data)
+        if not message.get("more_body", False): self.complete = True
+
+    def hexdigest(self) -> str:
+        final = self._hash.copy()
+        final.update(self._carry)
+        return final.hexdigest()
+
+
+async def _read_fingerprint(scope: Scope, receive: Receive) -> Optional[str]:
+    """Reads the whole request body into a fingerprint. Returns None if the client disconnected."""
+    fingerprint = _Fingerprint(scope)
+    while not fingerprint.complete:
+        message = await receive()
+        if message["type"] == "http.disconnect": return None
+        fingerprint.update(message)
+    return fingerprint.hexdigest()
+
+
+def _redact(body: bytes, headers: List[Tuple[str, str]], fields: Tuple[str, ...]) -> bytes:
+    if not fields or not any(k.lower() == "content-type" and "json" in v for k, v in headers): return body
+    data = json.loads(body)
+    if not isinstance(data, dict): return body
+    for field in fields: data.pop(field, None)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+async def _replay(record: dict, send: Send):
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in record["headers"]]
+    headers += [(b"content-length", str(len(record["body"])).encode()), (b"idempotent-replayed", b"true")]
+    await send({"type": "http.response.start", "status": record["status_code"], "headers": headers})
+    await send({"type": "http.response.body", "body": record["body"]})
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def _claim(self, collection, key_id: str, owner: str) -> Optional[dict]:
+        """Claims the key for `owner` (a per-request token). Returns None if we own it now, else the existing record."""
+        now = datetime.utcnow()
+        with pymongo.timeout(config.IDEMPOTENCY_DB_TIMEOUT_SECONDS):
+            try:
+                await collection.insert_one({
+                    "_id": key_id, "status": "processing", "owner": owner, "created_at": now,
+                    "lock_expires_at": now + timedelta(seconds=config.IDEMPOTENCY_LOCK_SECONDS),
+                    "expires_at": now + timedelta(seconds=config.IDEMPOTENCY_TTL_SECONDS),
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+            # Take over a claim whose owner died mid-request
+            taken = await collection.update_one(
+                {"_id": key_id, "status": "processing", "lock_expires_at": {"$lt": now}},
+                {"$set": {"owner": owner, "lock_expires_at": now + timedelta(seconds=config.IDEMPOTENCY_LOCK_SECONDS)}},
+            )
+            if taken.modified_count: return None
+            return await collection.find_one({"_id": key_id})
+
+    async def _wait_for_completion(self, collection, key_id: str) -> Optional[dict]:
+        """Polls until the key completes (record), is released (None) or the wait times out (processing record)."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.IDEMPOTENCY_WAIT_SECONDS
+        delay = 0.05
+        record = None
+        while loop.time() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+            with pymongo.timeout(config.IDEMPOTENCY_DB_TIMEOUT_SECONDS):
+                record = await collection.find_one({"_id": key_id})
+            if record is None or record["status"] == "completed": return record
+        return record
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        key, redacted = None, ()
+        route = next(((m, p, r) for m, p, r in IDEMPOTENT_ROUTES if scope["type"] == "http" and m == scope["method"] and p.match(scope["path"])), None)
+        if route is not None:
+            key, redacted = _header(scope, b"idempotency-key"), route[2]
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _reject(400, f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.")(scope, receive, send)
+            return
+
+        from db_setup import mongo_manager # Late import, as in helpers.email_utils
+        db = mongo_manager.get_db()
+        if db is None:
+            await self.app(scope, receive, send)
+            return
+        collection = db[COLLECTION]
+        key_id = hashlib.sha256(f"{scope['method']} {scope['path'].rstrip('/')} {key}".encode()).hexdigest()
+
+        owner = str(uuid.uuid4())
+        try:
+            record = await self._claim(collection, key_id, owner)
+            if record is not None:
+                request_fingerprint = await _read_fingerprint(scope, receive)
+                if request_fingerprint is None: return # Client went away
+                if record["status"] != "completed": record = await self._wait_for_completion(collection, key_id)
+                if record is None or record["status"] != "completed":
+                    # Still running, or released after a failure (this request's body is consumed, so it can't run now)
+                    await _reject(409, "A request with this Idempotency-Key is still being processed.", retry_after=1)(scope, receive, send)
+                elif record.get("fingerprint") != request_fingerprint:
+                    await _reject(422, "Idempotency-Key was already used for a different request.")(scope, receive, send)
+                else:
+                    await _replay(record, send)
+                return
+        except PyMongoError as e: # Fail open: without the key store, requests run as if no key was sent
+            logger.warning(f"Idempotency store unavailable, processing without key: {e}")
+            await self.app(scope, receive, send)
+            return
+
+        status, headers, body = 500, [], []
+        stored = False
+        fingerprint = _Fingerprint(scope)
+
+        async def hashing_receive() -> Message:
+            message = await receive()
+            fingerprint.update(message)
+            return message
+
+        async def capture(message: Message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in message.get("headers", []) if k.lower() not in _SKIPPED_HEADERS]
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, hashing_receive, capture)
+            content = _redact(b"".join(body), headers, redacted)
+            if status < 500 and status not in TRANSIENT_STATUSES and len(content) <= MAX_STORED_BODY and fingerprint.complete:
+                result = await collection.update_one(
+                    {"_id": key_id, "owner": owner},
+                    {"$set": {"status": "completed", "status_code": status, "headers": headers, "body": content,
+                              "fingerprint": fingerprint.hexdigest(), "completed_at": datetime.utcnow()},
+                     "$unset": {"lock_expires_at": ""}},
+                )
+                if result.matched_count == 0: logger.warning("Idempotency claim was taken over while the request ran; response not stored.")
+                stored = True
+        finally:
+            if not stored:
+                try: await collection.delete_one({"_id": key_id, "owner": owner, "status": "processing"})
+                except Exception as e: logger.warning(f"Could not release idempotency key: {e}")
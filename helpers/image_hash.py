@@ -0,0 +1,111 @@
+"""
+Perceptual image hashes (pHash, dHash) as 64-bit integers.
+
+Hashing is CPU-bound pure Python plus Pillow decoding, so it runs in a ProcessPoolExecutor
+(IMAGE_HASH_WORKERS) rather than on the event loop. The workers are started by a forkserver (spawn
+where that is unavailable), never forked from the app process. By the time the pool is created the app
+has Motor's executor threads and the event loop running, and a forked child can deadlock on locks those
+threads held. Hashes are stored on documents as 16-char hex strings, since Mongo integers are signed 64-bit.
+"""
+import asyncio
+import importlib.util
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from config import get_config
+from helpers.logger import logger
+
+# Pillow is needed to decode images; without it hashing is skipped. It is only imported where images
+# are decoded (the worker processes), so importing this module stays cheap.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+config = get_config()
+
+HASH_BITS = 64
+_DCT_SIZE = 32
+_DCT_KEEP = 8
+# Precomputed 8x32 DCT-II basis: only the lowest 8 frequencies per axis are needed for pHash
+_DCT_BASIS = [[math.cos(math.pi * (2 * x + 1) * u / (2 * _DCT_SIZE)) for x in range(_DCT_SIZE)] for u in range(_DCT_KEEP)]
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _grayscale(path: str, size) -> List[int]:
+    from PIL import Image
+    with Image.open(path) as img:
+        img.draft("L", (size[0] * 4, size[1] * 4)) # Let JPEG decode at reduced scale
+        return list(img.convert("L").resize(size, Image.Resampling.LANCZOS).getdata())
+
+
+def dhash(path: str) -> int:
+    """Difference hash: 1 bit per horizontally adjacent pixel pair on a 9x8 thumbnail."""
+    pixels = _grayscale(path, (9, 8))
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def phash(path: str) -> int:
+    """DCT hash: low 8x8 DCT coefficients of a 32x32 thumbnail compared against their median."""
+    pixels = _grayscale(path, (_DCT_SIZE, _DCT_SIZE))
+    rows = [pixels[r * _DCT_SIZE:(r + 1) * _DCT_SIZE] for r in range(_DCT_SIZE)]
+    # Separable DCT: transform rows (keeping 8 coefficients), then columns
+    row_dct = [[sum(b * p for b, p in zip(basis, row)) for basis in _DCT_BASIS] for row in rows]
+    coeffs = [sum(_DCT_BASIS[u][x] * row_dct[x][v] for x in range(_DCT_SIZE)) for u in range(_DCT_KEEP) for v in range(_DCT_KEEP)]
+    median = sorted(coeffs[1:])[len(coeffs[1:]) // 2] # Skip the DC term, it only reflects brightness
+    bits = 0
+    for c in coeffs:
+        bits = (bits << 1) | (c > median)
+    return bits
+
+
+def hash_file(path: str) -> Optional[Dict[str, str]]:
+    """Both hashes for one file as hex strings, or None if it cannot be decoded."""
+    if not PILLOW_AVAILABLE: return None
+    try:
+        return {"phash": f"{phash(path):016x}", "dhash": f"{dhash(path):016x}"}
+    except Exception:
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(max_workers=config.IMAGE_HASH_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _executor
+
+
+async def hash_images(image_dir: str, filenames: List[str]) -> List[Dict[str, str]]:
+    """
+    Hashes images in the worker pool, in parallel. Returns [{"filename", "phash", "dhash"}]
+    for the files that could be decoded.
+    """
+    if not PILLOW_AVAILABLE or not filenames: return []
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(executor, hash_file, os.path.join(image_dir, fn)) for fn in filenames),
+        return_exceptions=True,
+    )
+    hashes = []
+    for filename, result in zip(filenames, results):
+        if isinstance(result, dict): hashes.append({"filename": filename, **result})
+        else: logger.warning(f"Could not hash image {filename}: {result}")
+    return hashes
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
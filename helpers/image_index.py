@@ -0,0 +1,164 @@
+"""
+In-process index of perceptual image hashes for visual similarity search.
+
+Every hashed photo (lost item, found item, or a finder's photos on a lost item's found report) is
+a BK-tree entry keyed by its pHash. Searches return entries within a Hamming radius, re-ranked by
+the mean of pHash and dHash distance. New documents are added incrementally at ingest; deletions
+are tombstoned and dropped on the next rebuild, which streams hashes from Mongo at startup.
+The index is per worker process; the invalidation bus applies other workers' additions and
+deletions to it.
+"""
+import asyncio
+import re
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from helpers.bktree import BKTree
+from helpers.deadline import run_detached
+from helpers.image_hash import hash_images, hamming
+from helpers.invalidation import Invalidation, bus, publish
+from helpers.logger import logger
+
+KINDS = ("lost", "found", "found_report")
+_FOUND_REPORT_HASHES = re.compile(r"^found_reports\.(\d+|\$)\.finder_image_hashes$")
+
+
+class ImageRef(NamedTuple):
+    kind: str  # "lost", "found" or "found_report" (finder photos on a lost item)
+    item_id: str
+    filename: str
+    dhash: int
+
+
+class ImageIndex:
+    def __init__(self):
+        self.tree = BKTree(hamming)
+        self.removed: Set[Tuple[str, str]] = set() # (kind, item_id) deleted since the last rebuild
+        self._added: Set[Tuple[str, str, str]] = set() # (kind, item_id, filename) in the tree, so repeated events add nothing
+        self._pending: Optional[list] = None # Entries added while a rebuild is scanning
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _refs(kind: str, doc: Dict) -> List[Tuple[int, ImageRef]]:
+        refs = [(int(h["phash"], 16), ImageRef(kind, doc["_id"], h["filename"], int(h["dhash"], 16)))
+                for h in doc.get("image_hashes", [])]
+        if kind == "lost":
+            for report in doc.get("found_reports", []):
+                refs.extend((int(h["phash"], 16), ImageRef("found_report", doc["_id"], h["filename"], int(h["dhash"], 16)))
+                            for h in report.get("finder_image_hashes", []))
+        return refs
+
+    def add_hashes(self, kind: str, item_id: str, hashes: List[Dict[str, str]]):
+        for phash, ref in self._refs(kind, {"_id": item_id, "image_hashes": hashes}):
+            if (kind, item_id, ref.filename) in self._added: continue
+            self._added.add((kind, item_id, ref.filename))
+            self.tree.add(phash, ref)
+            if self._pending is not None: self._pending.append((phash, ref))
+        self.removed.discard((kind, item_id))
+
+    def remove_item(self, kind: str, item_id: str):
+        self.removed.add((kind, item_id))
+        if kind == "lost": self.removed.add(("found_report", item_id))
+
+    def search(self, phash: int, dhash: Optional[int] = None, max_distance: int = 10,
+               kinds: Tuple[str, ...] = KINDS, exclude_item: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Photos within `max_distance` pHash bits, best first, at most one hit per (kind, item)."""
+        return self._search([(phash, dhash)], max_distance, kinds, exclude_item, limit)
+
+    def search_hashes(self, hashes: List[Dict[str, str]], max_distance: int = 10,
+                      kinds: Tuple[str, ...] = KINDS, exclude_item: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """`search` for several stored hash dicts (an item's photos); each item scores by its closest photo."""
+        return self._search([(int(h["phash"], 16), int(h["dhash"], 16)) for h in hashes], max_distance, kinds, exclude_item, limit)
+
+    def _search(self, queries: List[Tuple[int, Optional[int]]], max_distance: int, kinds: Tuple[str, ...],
+                exclude_item: Optional[str], limit: int) -> List[Dict]:
+        best: Dict[Tuple[str, str], Dict] = {}
+        for phash, dhash in queries:
+            for distance, ref in self.tree.search(phash, max_distance):
+                if ref.kind not in kinds or ref.item_id == exclude_item or (ref.kind, ref.item_id) in self.removed: continue
+                score = distance if dhash is None else (distance + hamming(dhash, ref.dhash)) / 2
+                key = (ref.kind, ref.item_id)
+                if key not in best or score < best[key]["distance"]:
+                    best[key] = {"kind": ref.kind, "item_id": ref.item_id, "filename": ref.filename, "distance": score}
+        return sorted(best.values(), key=lambda hit: hit["distance"])[:limit]
+
+    async def rebuild(self, db, batch_size: int = 1000):
+        """Streams stored hashes from the live collections into a fresh tree, then swaps it in."""
+        async with self._lock:
+            tree, added = BKTree(hamming), set()
+            removed_before = set(self.removed)
+            self._pending = []
+            sources = (
+                ("lost", db.lost_items, {"$or": [{"image_hashes.0": {"$exists": True}}, {"found_reports.finder_image_hashes.0": {"$exists": True}}]},
+                 {"image_hashes": 1, "found_reports.finder_image_hashes": 1}),
+                ("found", db.found_items, {"image_hashes.0": {"$exists": True}}, {"image_hashes": 1}),
+            )
+            try:
+                for kind, collection, query, projection in sources:
+                    async for doc in collection.find(query, projection, batch_size=batch_size):
+                        for phash, ref in self._refs(kind, doc):
+                            tree.add(phash, ref)
+                            added.add((ref.kind, ref.item_id, ref.filename))
+                for phash, ref in self._pending: # Added mid-scan
+                    if (ref.kind, ref.item_id, ref.filename) in added: continue
+                    tree.add(phash, ref)
+                    added.add((ref.kind, ref.item_id, ref.filename))
+                # Keep only tombstones for deletions that raced with the scan
+                self.tree, self._added, self.removed = tree, added, self.removed - removed_before
+            finally:
+                self._pending = None
+            logger.info(f"Image index rebuilt with {len(tree)} hashes.")
+
+
+image_index = ImageIndex()
+
+
+async def _index_images(db, image_dir: str, kind: str, item_id: str, filenames: List[str], report_id: Optional[str]):
+    hashes = await hash_images(image_dir, filenames)
+    if not hashes: return
+    try:
+        if kind == "found":
+            await db.found_items.update_one({"_id": item_id}, {"$set": {"image_hashes": hashes}})
+        elif kind == "found_report":
+            await db.lost_items.update_one({"_id": item_id, "found_reports.report_id": report_id},
+                                           {"$set": {"found_reports.$.finder_image_hashes": hashes}})
+        else:
+            await db.lost_items.update_one({"_id": item_id}, {"$set": {"image_hashes": hashes}})
+    except Exception as e:
+        logger.error(f"Failed to store image hashes for {kind} {item_id}: {e}")
+        return
+    if kind == "found": await publish(db, "found_items", "update", item_id, {"image_hashes": hashes})
+    elif kind == "found_report": await publish(db, "lost_items", "update", item_id, {"found_reports.$.finder_image_hashes": hashes})
+    else: await publish(db, "lost_items", "update", item_id, {"image_hashes": hashes})
+
+
+def index_images(db, image_dir: str, kind: str, item_id: str, filenames: List[str], report_id: Optional[str] = None):
+    """
+    Hashes newly saved images in the worker pool after the response, stores the hashes on the
+    document and adds them to the index. Fire-and-forget; failures are only logged.
+    """
+    if filenames: run_detached(_index_images(db, image_dir, kind, item_id, filenames, report_id))
+
+
+async def rebuild_image_index(db):
+    try: await image_index.rebuild(db)
+    except Exception as e: logger.error(f"Image index rebuild failed: {e}", exc_info=True)
+
+
+def _on_invalidation(event: Invalidation):
+    kind = {"lost_items": "lost", "found_items": "found"}.get(event.collection)
+    if kind is None: return # Archived items are not searchable
+    if event.op == "delete":
+        image_index.remove_item(kind, event.item_id)
+        return
+    for field, value in event.fields.items():
+        if field == "image_hashes": image_index.add_hashes(kind, event.item_id, value)
+        elif kind == "lost" and _FOUND_REPORT_HASHES.match(field): image_index.add_hashes("found_report", event.item_id, value)
+
+
+def _on_reset():
+    from db_setup import mongo_manager # Late import, as in helpers.idempotency
+    db = mongo_manager.get_db()
+    if db is not None: run_detached(rebuild_image_index(db))
+
+
+bus.subscribe(_on_invalidation, on_reset=_on_reset)
@@ -0,0 +1,197 @@
+"""
+Cross-worker cache invalidation bus.
+
+Writes to lost_items / found_items (and their archives) become entity-level events
+`Invalidation(collection, op, item_id, fields)`. Every worker awaits `bus.start(db)` before
+serving, which fixes the mode and the point events are consumed from. It then runs `bus.run(db)`,
+which hands each event to the handlers registered with `bus.subscribe`. The handlers evict or
+patch their in-process caches for exactly that item: the public item cache, management token
+sessions and the image index.
+
+Event sources:
+
+* change_stream (replica sets / sharded clusters): one `db.watch()` per worker, filtered to the
+  watched collections and projected down to the id and the changed fields. The resume token of
+  the last event is kept, so a reconnect picks up exactly where the stream broke. If the oplog no
+  longer holds that token, every cache is reset instead.
+* capped (standalone servers, no change streams): `publish()` appends the event to the capped
+  collection `invalidation_events`, and workers tail it with a tailable-await cursor, resuming
+  from the last seen event.
+
+Writers always call `publish()`. It dispatches to the local handlers at once, so a worker reads
+its own writes, and persists the event only in capped mode. Handlers must be idempotent: a
+worker also sees its own events come back from the stream. INVALIDATION_MODE=auto picks
+change_stream when the server is a replica set member or mongos. A fresh worker starts with
+empty caches, so it only needs events from its own start onwards.
+"""
+import asyncio
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from config import get_config
+from helpers.logger import logger
+
+config = get_config()
+
+WATCHED_COLLECTIONS = ("lost_items", "found_items", "lost_items_archive", "found_items_archive")
+EVENTS_COLLECTION = "invalidation_events"
+EVENTS_CAPPED_BYTES = 16 * 1024 * 1024
+RESUME_OVERLAP = timedelta(seconds=2) # ObjectIds from different workers are only ordered to the second
+RECENT_EVENT_IDS = 1024 # Remembered to skip the overlap when a tailing cursor is reopened
+_HISTORY_LOST_CODES = {280, 286} # ChangeStreamFatalError, ChangeStreamHistoryLost
+
+
+class Invalidation(NamedTuple):
+    collection: str # As written, e.g. "lost_items" or "lost_items_archive"
+    op: str  # "insert", "update", "replace" or "delete"
+    item_id: str
+    fields: Dict[str, Any] # Updated fields (dotted paths) or the inserted document's projected fields; {} for deletes
+
+
+class InvalidationBus:
+    def __init__(self):
+        self.mode: Optional[str] = None # Set by start(): "change_stream", "capped" or "off"
+        self.resume_token: Optional[Dict] = None
+        self.last_event_id: Optional[ObjectId] = None
+        self._tail_started = False
+        self._recent_ids: "OrderedDict[ObjectId, None]" = OrderedDict()
+        self._handlers: List[Callable[[Invalidation], None]] = []
+        self._reset_handlers: List[Callable[[], None]] = []
+
+    def subscribe(self, handler: Callable[[Invalidation], None], on_reset: Optional[Callable[[], None]] = None):
+        """Registers a synchronous, idempotent event handler, and optionally a 'drop everything' one."""
+        self._handlers.append(handler)
+        if on_reset: self._reset_handlers.append(on_reset)
+
+    def dispatch(self, event: Invalidation):
+        for handler in self._handlers:
+            try: handler(event)
+            except Exception as e: logger.error(f"Invalidation handler failed for {event.collection}/{event.item_id}: {e}", exc_info=True)
+
+    def reset(self):
+        for handler in self._reset_handlers:
+            try: handler()
+            except Exception as e: logger.error(f"Cache reset handler failed: {e}", exc_info=True)
+
+    async def _resolve_mode(self, db) -> str:
+        if config.INVALIDATION_MODE != "auto": return config.INVALIDATION_MODE
+        try:
+            hello = await db.command("hello")
+            return "change_stream" if hello.get("setName") or hello.get("msg") == "isdbgrid" else "capped"
+        except Exception as e:
+            logger.warning(f"Could not detect the server topology ({e}); using capped-collection invalidation.")
+            return "capped"
+
+    _PIPELINE = [
+        {"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}, "operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+        {"$project": {"operationType": 1, "ns": 1, "documentKey": 1, "fullDocument.image_hashes": 1, "fullDocument.dedup": 1, "fullDocument.duplicate_of": 1, "updateDescription.updatedFields": 1}},
+    ]
+
+    def _dispatch_change(self, change: Dict):
+        fields = change.get("updateDescription", {}).get("updatedFields") or change.get("fullDocument") or {}
+        fields.pop("_id", None)
+        self.dispatch(Invalidation(change["ns"]["coll"], change["operationType"], change["documentKey"]["_id"], fields))
+
+    async def _watch(self, db):
+        async with db.watch(self._PIPELINE, resume_after=self.resume_token) as stream:
+            logger.info(f"Invalidation bus watching change streams (resumed: {self.resume_token is not None}).")
+            async for change in stream:
+                self._dispatch_change(change)
+                self.resume_token = stream.resume_token
+
+    async def _tail(self, db):
+        events = db[EVENTS_COLLECTION]
+        while True:
+            query = {}
+            if self.last_event_id is not None: # Reopen a little early, so events written out of _id order are not skipped
+                query = {"_id": {"$gte": ObjectId.from_datetime(self.last_event_id.generation_time - RESUME_OVERLAP)}}
+            async for event in events.find(query, cursor_type=CursorType.TAILABLE_AWAIT):
+                if event["_id"] in self._recent_ids: continue
+                self._recent_ids[event["_id"]] = None
+                if len(self._recent_ids) > RECENT_EVENT_IDS: self._recent_ids.popitem(last=False)
+                self.dispatch(Invalidation(event["coll"], event["op"], event["item_id"], event.get("fields") or {}))
+                self.last_event_id = event["_id"]
+            await asyncio.sleep(config.INVALIDATION_POLL_SECONDS) # Cursor died (empty collection or fell behind); reopen
+
+    async def _start_tailing(self, db):
+        await ensure_events_collection(db)
+        newest = await db[EVENTS_COLLECTION].find({}, {"_id": 1}).sort("$natural", -1).limit(1).to_list(length=1)
+        self.last_event_id = newest[0]["_id"] if newest else None
+        if self.last_event_id is not None: self._recent_ids[self.last_event_id] = None
+        self._tail_started = True
+
+    async def start(self, db):
+        """
+        Resolves the mode and the position to consume from (a resume token, or the capped tail).
+        Awaited at startup before requests are served, so every write this worker publishes is
+        persisted, and no write made after startup is missed while run() connects.
+        """
+        self.mode = await self._resolve_mode(db)
+        logger.info(f"Cache invalidation mode: {self.mode}.")
+        try:
+            if self.mode == "capped": await self._start_tailing(db)
+            elif self.mode == "change_stream":
+                async with db.watch(self._PIPELINE) as stream:
+                    change = await stream.try_next() # Returns at once; sets the resume token to "now"
+                    if change is not None: self._dispatch_change(change)
+                    self.resume_token = stream.resume_token
+        except Exception as e: logger.error(f"Could not open the invalidation event source ({e}); retrying in the background.")
+
+    async def run(self, db):
+        """Background task: consumes events until cancelled, reconnecting with backoff."""
+        if self.mode is None: await self.start(db)
+        if self.mode == "off": return
+        delay = 1.0
+        while True:
+            try:
+                if self.mode == "change_stream":
+                    await self._watch(db)
+                else:
+                    if not self._tail_started: await self._start_tailing(db)
+                    await self._tail(db)
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in _HISTORY_LOST_CODES:
+                    logger.warning(f"Invalidation stream history lost ({e.code}); resetting in-process caches.")
+                    self.resume_token = None
+                    self.reset()
+                else:
+                    logger.error(f"Invalidation bus error: {e}")
+            except Exception as e:
+                logger.error(f"Invalidation bus disconnected: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+async def ensure_events_collection(db):
+    # Created before the first insert: an insert into a missing collection would create it uncapped
+    try: await db.create_collection(EVENTS_COLLECTION, capped=True, size=EVENTS_CAPPED_BYTES)
+    except CollectionInvalid: pass # Already exists
+
+
+bus = InvalidationBus()
+
+
+async def publish(db, collection: str, op: str, item_id: str, fields: Optional[Dict[str, Any]] = None):
+    """
+    Announces a write: applies it to this worker's caches now and, in capped mode, appends it to
+    the events collection for the other workers. Change streams carry the write by themselves.
+    Never raises.
+    """
+    event = Invalidation(collection, op, item_id, fields or {})
+    bus.dispatch(event)
+    if bus.mode is None: # Outside the app (CLI scripts), where start() never ran
+        bus.mode = await bus._resolve_mode(db)
+        if bus.mode == "capped":
+            try: await ensure_events_collection(db)
+            except Exception as e: logger.warning(f"Could not open the invalidation events collection: {e}")
+    if bus.mode != "capped": return
+    try: await db[EVENTS_COLLECTION].insert_one({"coll": collection, "op": op, "item_id": item_id, "fields": event.fields})
+    except Exception as e: logger.warning(f"Could not publish invalidation for {collection}/{item_id}: {e}")
@@ -0,0 +1,70 @@
+"""
+Per-worker cache of item documents for the public detail endpoints.
+
+Entries are keyed by (collection, _id) and hold the document as read from Mongo, live or
+archived. Any write to an item evicts its entry through the invalidation bus, on every worker,
+so entries can live for ITEM_CACHE_TTL_SECONDS; the TTL is only a backstop for missed events.
+Misses (404s) are not cached.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import get_config
+from helpers.archive import find_one_live_or_archived
+from helpers.invalidation import Invalidation, bus
+
+config = get_config()
+
+_ARCHIVE_SUFFIX = "_archive"
+_entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_generation = 0 # Bumped by every eviction, so a read that raced with a write is not cached
+
+
+def get(collection_name: str, item_id: str) -> Optional[Dict[str, Any]]:
+    entry = _entries.get((collection_name, item_id))
+    if entry is None: return None
+    if entry[0] < time.monotonic():
+        _entries.pop((collection_name, item_id), None)
+        return None
+    return entry[1]
+
+
+def put(collection_name: str, item_id: str, doc: Dict[str, Any]):
+    if config.ITEM_CACHE_SIZE <= 0: return
+    key = (collection_name, item_id)
+    _entries[key] = (time.monotonic() + config.ITEM_CACHE_TTL_SECONDS, doc)
+    _entries.move_to_end(key)
+    while len(_entries) > config.ITEM_CACHE_SIZE:
+        _entries.popitem(last=False)
+
+
+def evict(collection_name: str, item_id: str):
+    global _generation
+    _generation += 1
+    _entries.pop((collection_name, item_id), None)
+
+
+def clear():
+    global _generation
+    _generation += 1
+    _entries.clear()
+
+
+def _on_invalidation(event: Invalidation):
+    # Entries are keyed by the live collection name, wherever the document currently is
+    name = event.collection[:-len(_ARCHIVE_SUFFIX)] if event.collection.endswith(_ARCHIVE_SUFFIX) else event.collection
+    evict(name, event.item_id)
+
+
+async def find_item(db, collection_name: str, item_id: str) -> Optional[Dict[str, Any]]:
+    """Cached `find_one_live_or_archived` by id, for read-only use (callers must not mutate the result)."""
+    doc = get(collection_name, item_id)
+    if doc is None:
+        generation = _generation
+        doc, _ = await find_one_live_or_archived(db, collection_name, {"_id": item_id})
+        if doc is not None and generation == _generation: put(collection_name, item_id, doc)
+    return doc
+
+
+bus.subscribe(_on_invalidation, on_reset=clear)
@@ -0,0 +1,33 @@
+"""
+Cluster-wide leases for background jobs that must run on one worker at a time.
+
+A lease is a document `{_id: <name>, owner, expires_at}` in a state collection. Taking it is a
+single upsert that only matches when the caller already owns it or it has expired; otherwise the
+upsert collides with the existing `_id` and fails with DuplicateKeyError.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+async def acquire_lease(db: AsyncIOMotorDatabase, collection: str, seconds: int, name: str = "lease") -> bool:
+    """Takes (or renews) the lease. Returns False if another worker holds it."""
+    now = datetime.utcnow()
+    try:
+        await db[collection].update_one(
+            {"_id": name, "$or": [{"owner": worker_id}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": worker_id, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError: # Lease exists, is unexpired and belongs to someone else
+        return False
+
+
+async def release_lease(db: AsyncIOMotorDatabase, collection: str, name: str = "lease"):
+    await db[collection].update_one({"_id": name, "owner": worker_id}, {"$set": {"expires_at": datetime.utcnow()}})
@@ -1,31 +1,172 @@
-import httpx
-from typing import List, Dict, Any, Optional
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 
-from config import Config
+from config import get_config
 from helpers.logger import logger
+from helpers.circuit_breaker import get_breaker
+from helpers.deadline import dependency_timeout
 
-config = Config()
+if TYPE_CHECKING: import httpx # Imported by LocationClient.start(), not at module import
+
+config = get_config()
 
 API_BASE_URL = config.LOCATION_API_BASE_URL
 API_KEY = config.LOCATION_API_KEY
 HEADERS = {"X-API-KEY": API_KEY}
+location_api_breaker = get_breaker("location_api", config.BREAKER_FAILURE_THRESHOLD, config.BREAKER_RECOVERY_SECONDS)
+
+CacheKey = Tuple[str, ...]
+CACHE_MAX_ENTRIES = 5_000 # LRU bound; (country, state) pairs are a small, bounded set in practice
+
+
+class _LeaderCancelled(Exception):
+    """Set on a singleflight future whose leader was cancelled: followers retry instead of failing."""
+
+
+def _http2_available() -> bool:
+    try:
+        import h2 # noqa: F401 - optional dependency enabling httpx HTTP/2
+        return True
+    except ImportError:
+        return False
+
+
+class LocationClient:
+    """
+    Shared client for the external location API.
+
+    * One pooled httpx.AsyncClient (HTTP/2 when `h2` is installed) opened/closed by the app lifespan,
+      so lookups reuse warm TCP+TLS connections.
+    * TTL cache keyed by (endpoint, country, state), LRU-bounded to CACHE_MAX_ENTRIES. Entries older than the TTL are served stale while a
+      single background refresh runs (stale-while-revalidate), and keep being served if the upstream is
+      down or its circuit is open, up to LOCATION_API_STALE_TTL_SECONDS.
+    * Identical concurrent misses share one upstream request (singleflight).
+    """
+    def __init__(self, base_url: str, headers: Dict[str, str], ttl: float, stale_ttl: float, max_connections: int):
+        self.base_url = base_url
+        self.headers = headers
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_connections = max_connections
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._cache: "OrderedDict[CacheKey, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+
+    async def start(self):
+        if self._client is not None: return
+        import httpx
+        http2 = config.LOCATION_API_HTTP2 and _http2_available()
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url, headers=self.headers, http2=http2,
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            timeout=config.LOCATION_API_TIMEOUT_SECONDS,
+        )
+        logger.info(f"Location API client started (http2={http2}, pool={self.max_connections}).")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _fetch(self, endpoint: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """One upstream GET through the circuit breaker; raises on any failure."""
+        import httpx
+        if self._client is None: await self.start() # Used outside the app lifespan (scripts)
+        timeout, budget_limited = dependency_timeout(config.LOCATION_API_TIMEOUT_SECONDS) # Before the breaker: no time left is not an upstream failure
+        if not location_api_breaker.allow(): raise RuntimeError("Location API circuit open.")
+        try:
+            response = await self._client.get(endpoint, params=params or None, timeout=timeout)
+            response.raise_for_status() # Raise exception for 4xx/5xx errors
+            data = response.json()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500: location_api_breaker.record_failure()
+            else: location_api_breaker.record_success()
+            raise
+        except httpx.TimeoutException:
+            if budget_limited: location_api_breaker.release() # The caller's budget ran out, not the upstream
+            else: location_api_breaker.record_failure()
+            raise
+        except Exception:
+            location_api_breaker.record_failure()
+            raise
+        except BaseException: # Cancelled (e.g. a singleflight leader): no verdict, but free the half-open trial
+            location_api_breaker.release()
+            raise
+        location_api_breaker.record_success()
+        return data
+
+    def _store(self, key: CacheKey, data: List[Dict[str, Any]]):
+        self._cache[key] = (time.monotonic(), data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > CACHE_MAX_ENTRIES: self._cache.popitem(last=False)
+
+    async def _load(self, key: CacheKey, endpoint: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Singleflight: concurrent callers for the same key await the same upstream request."""
+        while (future := self._inflight.get(key)) is not None:
+            try: return await asyncio.shield(future)
+            except _LeaderCancelled: continue # The leader's request was cancelled, not failed: lead or follow a new one
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await self._fetch(endpoint, params)
+            self._store(key, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            # A cancellation belongs to the leader's caller; followers only share ordinary failures
+            future.set_exception(e if isinstance(e, Exception) else _LeaderCancelled())
+            future.exception() # Mark retrieved so an unobserved failure isn't logged as never-retrieved
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _refresh_in_background(self, key: CacheKey, endpoint: str, params: Dict[str, str]):
+        if key in self._inflight: return
+
+        async def refresh():
+            try: await self._load(key, endpoint, params)
+            except Exception as e: logger.warning(f"Background refresh of {endpoint} {params} failed: {e}")
+
+        # Fresh context: the refresh must not inherit the triggering request's deadline
+        asyncio.create_task(refresh(), context=contextvars.Context())
+
+    async def get(self, endpoint: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        key = (endpoint, *(params[name].strip().lower() for name in sorted(params)))
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.move_to_end(key)
+            fetched_at, data = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl: return data
+            if age < self.ttl + self.stale_ttl:
+                self._refresh_in_background(key, endpoint, params)
+                return data
+        try:
+            return await self._load(key, endpoint, params)
+        except Exception:
+            if entry is not None and time.monotonic() - entry[0] < self.ttl + self.stale_ttl:
+                return entry[1] # Stale-if-error
+            raise
+
+
+location_client = LocationClient(
+    API_BASE_URL, HEADERS,
+    ttl=config.LOCATION_API_CACHE_TTL_SECONDS,
+    stale_ttl=config.LOCATION_API_STALE_TTL_SECONDS,
+    max_connections=config.LOCATION_API_MAX_CONNECTIONS,
+)
 
-# Use a single httpx client for connection pooling and efficiency
-# Consider lifespan management for the client if used heavily across requests
-# For simplicity here, we create it per function call, but a shared client is better practice.
 
 async def get_countries() -> Optional[List[Dict[str, Any]]]:
     """Fetches the list of countries from the external API."""
-    endpoint = "/countrieslist"
-    url = f"{API_BASE_URL}{endpoint}"
-    logger.debug(f"Fetching countries from {url}")
+    import httpx
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client: # 10 second timeout
-            response = await client.get(url, headers=HEADERS)
-            response.raise_for_status() # Raise exception for 4xx/5xx errors
-            countries = response.json()
-            logger.info(f"Successfully fetched {len(countries)} countries.")
-            return countries
+        countries = await location_client.get("/countrieslist", {})
+        logger.debug(f"Fetched {len(countries)} countries.")
+        return countries
     except httpx.RequestError as e:
         logger.error(f"Error fetching countries: Request failed {e.request.url!r} - {e}")
     except httpx.HTTPStatusError as e:
@@ -36,17 +177,11 @@ async def get_countries() -> Optional[List[Dict[str, Any]]]:
 
 async def get_states_in_country(country_name: str) -> Optional[List[Dict[str, Any]]]:
     """Fetches the list of states for a given country from the external API."""
-    endpoint = "/getstatesincountry"
-    url = f"{API_BASE_URL}{endpoint}"
-    params = {"country": country_name}
-    logger.debug(f"Fetching states for country '{country_name}' from {url}")
+    import httpx
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=HEADERS, params=params)
-            response.raise_for_status()
-            states = response.json()
-            logger.info(f"Successfully fetched {len(states)} states for country '{country_name}'.")
-            return states
+        states = await location_client.get("/getstatesincountry", {"country": country_name})
+        logger.debug(f"Fetched {len(states)} states for country '{country_name}'.")
+        return states
     except httpx.RequestError as e:
         logger.error(f"Error fetching states for {country_name}: Request failed {e.request.url!r} - {e}")
     except httpx.HTTPStatusError as e:
@@ -57,21 +192,15 @@ async def get_states_in_country(country_name: str) -> Optional[List[Dict[str, An
 
 async def get_cities_in_state(country_name: str, state_name: str) -> Optional[List[Dict[str, Any]]]:
     """Fetches the list of cities for a given country and state from the external API."""
-    endpoint = "/getcitiesinstate"
-    url = f"{API_BASE_URL}{endpoint}"
-    params = {"country": country_name, "state": state_name}
-    logger.debug(f"Fetching cities for state '{state_name}', country '{country_name}' from {url}")
+    import httpx
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=HEADERS, params=params)
-            response.raise_for_status()
-            cities = response.json()
-            logger.info(f"Successfully fetched {len(cities)} cities for state '{state_name}', country '{country_name}'.")
-            return cities
+        cities = await location_client.get("/getcitiesinstate", {"country": country_name, "state": state_name})
+        logger.debug(f"Fetched {len(cities)} cities for state '{state_name}', country '{country_name}'.")
+        return cities
     except httpx.RequestError as e:
          logger.error(f"Error fetching cities for {state_name}/{country_name}: Request failed {e.request.url!r} - {e}")
     except httpx.HTTPStatusError as e:
          logger.error(f"Error fetching cities for {state_name}/{country_name}: HTTP Status {e.response.status_code} for {e.request.url!r}")
     except Exception as e:
          logger.error(f"Unexpected error fetching cities for {state_name}/{country_name}: {e}", exc_info=True)
-    return None
\ No newline at end of file
+    return None
@@ -0,0 +1,96 @@
+"""
+Management token hashing and verification.
+
+Tokens are stored as Argon2 hashes (`management_token_hash`); the plaintext only ever exists in the
+creation response and the emailed management link. Argon2 runs on the bounded executor from
+helpers.password_helpers, never on the event loop.
+
+A successful verification is remembered for MANAGEMENT_SESSION_TTL_SECONDS in a small in-process
+cache keyed by (item id, stored hash, keyed digest of the token), so the repeated GET/PUT calls a
+management page makes cost one Argon2 verify instead of one each. Items created before hashing
+still carry a plaintext `management_token`; they are compared in constant time and upgraded to a
+hash on first successful use. Deleting an item on any worker drops its sessions everywhere
+(invalidation bus).
+"""
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from config import get_config
+from helpers.invalidation import Invalidation, bus
+from helpers.logger import logger
+from helpers.password_helpers import hash_password_async, check_password_async
+
+config = get_config()
+
+SESSION_CACHE_SIZE = 4096
+_cache_key_secret = secrets.token_bytes(32) # Per-process; cached digests are useless outside this worker
+_verified: "OrderedDict[Tuple[str, str, bytes], float]" = OrderedDict()
+
+
+def _token_digest(token: str) -> bytes:
+    return hmac.new(_cache_key_secret, token.encode(), hashlib.sha256).digest()
+
+
+def _cache_get(key: Tuple[str, str, bytes]) -> bool:
+    expires_at = _verified.get(key)
+    if expires_at is None: return False
+    if expires_at < time.monotonic():
+        _verified.pop(key, None)
+        return False
+    return True
+
+
+def _cache_put(key: Tuple[str, str, bytes]):
+    _verified[key] = time.monotonic() + config.MANAGEMENT_SESSION_TTL_SECONDS
+    _verified.move_to_end(key)
+    while len(_verified) > SESSION_CACHE_SIZE:
+        _verified.popitem(last=False)
+
+
+def forget_item(item_id: str):
+    """Drops cached verifications for an item (e.g. after deletion)."""
+    for key in [k for k in _verified if k[0] == item_id]:
+        _verified.pop(key, None)
+
+
+async def hash_token(token: str) -> str:
+    return await hash_password_async(token)
+
+
+async def verify_token(item: Dict[str, Any], token: str, collection: AsyncIOMotorCollection) -> bool:
+    """
+    Checks `token` against the item's stored hash (or legacy plaintext token, which is then
+    upgraded in place on `collection`).
+    """
+    if not token: return False
+    stored_hash = item.get("management_token_hash")
+    if stored_hash is None:
+        legacy = item.get("management_token")
+        if not legacy or not hmac.compare_digest(legacy.encode(), token.encode()): return False
+        stored_hash = await hash_token(token)
+        await collection.update_one(
+            {"_id": item["_id"], "management_token": legacy},
+            {"$set": {"management_token_hash": stored_hash}, "$unset": {"management_token": ""}},
+        )
+        logger.info(f"Upgraded plaintext management token to hash for item {item['_id']}.")
+        _cache_put((item["_id"], stored_hash, _token_digest(token)))
+        return True
+
+    key = (item["_id"], stored_hash, _token_digest(token))
+    if _cache_get(key): return True
+    if not await check_password_async(token, stored_hash): return False
+    _cache_put(key)
+    return True
+
+
+def _on_invalidation(event: Invalidation):
+    if event.op == "delete" and event.collection in ("lost_items", "lost_items_archive"): forget_item(event.item_id)
+
+
+bus.subscribe(_on_invalidation, on_reset=_verified.clear)
@@ -0,0 +1,179 @@
+"""
+Match notifications for lost item owners.
+
+Every MATCH_NOTIFY_INTERVAL_SECONDS one worker (lease in `match_notifier_state`) does two things:
+
+1. Scans found_items created after a persisted (created_at, _id) watermark, in batches. Each new
+   found item is scored against live lost_items in the same country or nearby whose loss date is within
+   MATCH_DATE_WINDOW_DAYS before it was found (helpers.matching.score_match). Matches above
+   MATCH_NOTIFY_MIN_SCORE are appended to the owner's pending digest in `match_digests`
+   (one document per reporter_email). Then the watermark advances. Pending entries are written
+   before the watermark moves, so a crash replays a batch instead of losing it; $addToSet
+   absorbs the replay. `created_at` is stamped before the create path geocodes, dedups and
+   inserts, so a report can commit after newer ones; the scan stops MATCH_SCAN_LAG_SECONDS
+   (more than the POST request budget) short of now so the watermark never passes it.
+2. Sends every pending digest whose owner has not had one in MATCH_DIGEST_INTERVAL_SECONDS.
+   All due digests go out over one SMTP session (send_emails_async), least recently sent first.
+   Entries that were sent are pulled from the digest. A failed digest stays pending but backs off
+   (MATCH_NOTIFY_INTERVAL_SECONDS doubling per failure, capped at MATCH_DIGEST_INTERVAL_SECONDS),
+   so addresses that always fail can't fill every batch.
+
+On the very first run the watermark starts at the current time, so existing reports are not
+announced retroactively.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from config import Config
+from helpers.email_utils import send_emails_async
+from helpers.lease import acquire_lease, release_lease
+from helpers.logger import logger
+from helpers.geo import match_area_filter
+from helpers.matching import score_match
+
+STATE_COLLECTION = "match_notifier_state"
+DIGEST_COLLECTION = "match_digests"
+LEASE_SECONDS = 300
+MAX_LISTED_PER_DIGEST = 10
+
+_LOCATION_FIELDS = {"country": 1, "state": 1, "city": 1, "location_point": 1, "location_precision": 1}
+FOUND_PROJECTION = {"description": 1, "date_found": 1, "image_hashes": 1, "created_at": 1, **_LOCATION_FIELDS}
+LOST_PROJECTION = {"reporter_email": 1, "description": 1, "date_lost": 1, "image_hashes": 1, **_LOCATION_FIELDS}
+
+
+async def _load_watermark(db: AsyncIOMotorDatabase) -> Tuple[datetime, str]:
+    state = await db[STATE_COLLECTION].find_one({"_id": "watermark"})
+    if state is None:
+        state = {"created_at": datetime.utcnow(), "last_id": ""}
+        await db[STATE_COLLECTION].update_one({"_id": "watermark"}, {"$setOnInsert": state}, upsert=True)
+    return state["created_at"], state["last_id"]
+
+
+async def _candidates(db: AsyncIOMotorDatabase, found: Dict, config: Config) -> List[Dict]:
+    query: Dict = {"reporter_email": {"$exists": True}, **match_area_filter(found, config.MATCH_RADIUS_KM)}
+    if found.get("date_found"):
+        date_found = found["date_found"].replace(tzinfo=None)
+        query["date_lost"] = {"$gte": date_found - timedelta(days=config.MATCH_DATE_WINDOW_DAYS), "$lte": date_found + timedelta(days=1)}
+    cursor = db.lost_items.find(query, LOST_PROJECTION).sort("created_at", -1).limit(config.MATCH_CANDIDATE_LIMIT)
+    return await cursor.to_list(length=config.MATCH_CANDIDATE_LIMIT)
+
+
+class LeaseLost(Exception):
+    """Raised mid-scan when the lease could not be renewed (another worker took over)."""
+
+
+async def scan_new_found_items(db: AsyncIOMotorDatabase, config: Config) -> int:
+    """
+    Queues digest entries for found items created since the watermark. Returns the number of matches queued.
+    Renews the lease before writing each batch and raises LeaseLost if that fails.
+    """
+    created_at, last_id = await _load_watermark(db)
+    horizon = datetime.utcnow() - timedelta(seconds=config.MATCH_SCAN_LAG_SECONDS) # Reports stamped before this have committed
+    queued = 0
+    while True:
+        query = {"$or": [{"created_at": {"$gt": created_at, "$lte": horizon}}, {"created_at": created_at, "_id": {"$gt": last_id}}],
+                 "duplicate_of": None} # Owners hear about each found item once, not once per finder
+        batch = await db.found_items.find(query, FOUND_PROJECTION).sort([("created_at", 1), ("_id", 1)]) \
+            .limit(config.MATCH_NOTIFY_BATCH_SIZE).to_list(length=config.MATCH_NOTIFY_BATCH_SIZE)
+        if not batch: return queued
+        ops = []
+        for found in batch:
+            for lost in await _candidates(db, found, config):
+                score = score_match(lost, found)
+                if score["score"] < config.MATCH_NOTIFY_MIN_SCORE: continue
+                entry = {
+                    "lost_item_id": lost["_id"], "lost_description": lost.get("description", "")[:80],
+                    "found_item_id": found["_id"], "found_description": found.get("description", "")[:200],
+                    "found_location": ", ".join(filter(None, [found.get("city"), found.get("state"), found.get("country")])),
+                    "score": score["score"],
+                }
+                ops.append(UpdateOne({"_id": lost["reporter_email"]}, {"$addToSet": {"matches": entry}, "$setOnInsert": {"last_sent_at": None}}, upsert=True))
+            await asyncio.sleep(0) # Scoring is CPU work; let requests interleave
+        # Renew per batch: a long scan must not outlive the lease, or a second worker would queue the same matches
+        if not await acquire_lease(db, STATE_COLLECTION, LEASE_SECONDS):
+            logger.warning("Match notifier lost its lease mid-scan; stopping.")
+            raise LeaseLost()
+        if ops: await db[DIGEST_COLLECTION].bulk_write(ops, ordered=False)
+        queued += len(ops)
+        created_at, last_id = batch[-1]["created_at"], batch[-1]["_id"]
+        await db[STATE_COLLECTION].update_one({"_id": "watermark"}, {"$set": {"created_at": created_at, "last_id": last_id}}, upsert=True)
+
+
+def render_digest(matches: List[Dict], frontend_base_url: str) -> Tuple[str, str]:
+    """Subject and plain-text body for one owner's digest, best matches first and grouped by lost item."""
+    matches = sorted(matches, key=lambda m: m["score"], reverse=True)
+    listed, by_lost = matches[:MAX_LISTED_PER_DIGEST], {}
+    for match in listed: by_lost.setdefault(match["lost_item_id"], []).append(match)
+    lines = ["New found items may match what you lost:", ""]
+    for group in by_lost.values():
+        lines.append(f"Your report: '{group[0]['lost_description']}'")
+        for m in group:
+            lines.append(f"  - {m['found_description']} ({m['found_location'] or 'location N/A'}; match {m['score']:.0%})")
+            lines.append(f"    {frontend_base_url.rstrip('/')}/found-item/{m['found_item_id']}")
+        lines.append("")
+    if len(matches) > len(listed): lines.append(f"...and {len(matches) - len(listed)} more on the site.")
+    lines.append("Be cautious when contacting finders.")
+    subject = f"{len(matches)} possible match{'es' if len(matches) != 1 else ''} for your lost item"
+    return subject, "\n".join(lines)
+
+
+def _retry_delay(failures: int, config: Config) -> timedelta:
+    return timedelta(seconds=min(config.MATCH_NOTIFY_INTERVAL_SECONDS * 2 ** min(failures - 1, 16), config.MATCH_DIGEST_INTERVAL_SECONDS))
+
+
+async def send_due_digests(db: AsyncIOMotorDatabase, config: Config, batch_size: int = 100) -> int:
+    """Sends digests to owners outside their quiet interval, over one SMTP session. Returns the number sent."""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=config.MATCH_DIGEST_INTERVAL_SECONDS)
+    due = await db[DIGEST_COLLECTION].find({
+        "matches.0": {"$exists": True},
+        "$and": [{"$or": [{"last_sent_at": None}, {"last_sent_at": {"$lte": cutoff}}]},
+                 {"$or": [{"retry_at": None}, {"retry_at": {"$lte": now}}]}],
+    }).sort([("last_sent_at", 1), ("_id", 1)]).limit(batch_size).to_list(length=batch_size)
+    if not due: return 0
+    results = await send_emails_async([(d["_id"], *render_digest(d["matches"], config.FRONTEND_BASE_URL)) for d in due])
+    if results is None: return 0 # SMTP circuit open; digests stay pending
+    now = datetime.utcnow()
+    ops = []
+    for d, ok in zip(due, results):
+        if ok:
+            ops.append(UpdateOne({"_id": d["_id"]}, {"$pullAll": {"matches": d["matches"]}, "$set": {"last_sent_at": now},
+                                                     "$unset": {"failures": "", "retry_at": ""}}))
+        else:
+            failures = d.get("failures", 0) + 1
+            ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {"failures": failures, "retry_at": now + _retry_delay(failures, config)}}))
+    if ops: await db[DIGEST_COLLECTION].bulk_write(ops, ordered=False)
+    sent = sum(1 for ok in results if ok)
+    if sent < len(due): logger.warning(f"Match notifier: {len(due) - sent} digests failed; retrying with backoff.")
+    return sent
+
+
+async def run_match_notifier(db: AsyncIOMotorDatabase, config: Config) -> Optional[Dict[str, int]]:
+    """One scan + send pass. Returns counts, or None if another worker holds the lease."""
+    if not await acquire_lease(db, STATE_COLLECTION, LEASE_SECONDS):
+        logger.debug("Match notifier lease held by another worker; skipping run.")
+        return None
+    try:
+        counts = {"queued": await scan_new_found_items(db, config), "sent": await send_due_digests(db, config)}
+        if any(counts.values()): logger.info(f"Match notifier: {counts}")
+        return counts
+    except LeaseLost:
+        return None
+    finally:
+        await release_lease(db, STATE_COLLECTION)
+
+
+async def match_notifier_loop(db: AsyncIOMotorDatabase, config: Config):
+    """Background task: runs the notifier every MATCH_NOTIFY_INTERVAL_SECONDS until cancelled."""
+    while True:
+        try:
+            await run_match_notifier(db, config)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Match notifier run failed: {e}", exc_info=True)
+        await asyncio.sleep(config.MATCH_NOTIFY_INTERVAL_SECONDS)
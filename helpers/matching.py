@@ -0,0 +1,97 @@
+"""
+Scoring of found items against a lost item.
+
+score_match combines four signals, each in [0, 1]: location (distance between geocoded cities,
+else same city > state > country),
+date (found within MATCH_DATE_WINDOW_DAYS after the loss, decaying linearly), description token
+overlap (Jaccard) and photo similarity (best pHash/dHash distance between the two sides). The
+image weight is redistributed when either side has no hashed photos.
+
+find_matches gathers candidates from the image index and from recent found items in the same
+country or within MATCH_RADIUS_KM, then scores and ranks them.
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import get_config
+from helpers.image_hash import hamming
+from helpers.image_index import image_index
+from helpers.geo import haversine_km, match_area_filter
+
+config = get_config()
+
+WEIGHTS = {"location": 0.2, "date": 0.1, "text": 0.4, "image": 0.3}
+_WORD = re.compile(r"[a-z0-9]{3,}")
+_STOPWORDS = frozenset("the and with was for from has have had near lost found this that its are".split())
+
+
+def _tokens(text: Optional[str]) -> set:
+    return {w for w in _WORD.findall((text or "").lower()) if w not in _STOPWORDS}
+
+
+def _same(a: Optional[str], b: Optional[str]) -> bool:
+    return bool(a and b and a.strip().lower() == b.strip().lower())
+
+
+def text_similarity(a: Optional[str], b: Optional[str]) -> float:
+    ta, tb = _tokens(a), _tokens(b)
+    return len(ta & tb) / len(ta | tb) if ta and tb else 0.0
+
+
+def location_similarity(lost: Dict, found: Dict) -> float:
+    if lost.get("location_precision") == "city" and found.get("location_precision") == "city":
+        # Both geocoded to a city: neighbouring towns count, even across state or country lines
+        return max(0.0, 1.0 - haversine_km(lost["location_point"], found["location_point"]) / config.MATCH_RADIUS_KM)
+    if not _same(lost.get("country"), found.get("country")): return 0.0
+    if not _same(lost.get("state"), found.get("state")): return 0.4
+    return 1.0 if _same(lost.get("city"), found.get("city")) else 0.7
+
+
+def date_similarity(date_lost: Optional[datetime], date_found: Optional[datetime], window_days: int) -> float:
+    if date_lost is None or date_found is None: return 0.0
+    days = (date_found.replace(tzinfo=None) - date_lost.replace(tzinfo=None)).total_seconds() / 86400
+    if days < -1: return 0.0 # Found before it was lost (one day of slack for timezones)
+    return max(0.0, 1.0 - max(days, 0.0) / window_days)
+
+
+def image_distance(lost_hashes: List[Dict], found_hashes: List[Dict]) -> Optional[float]:
+    """Smallest mean pHash/dHash distance between any pair of photos, or None without photos on both sides."""
+    if not lost_hashes or not found_hashes: return None
+    return min((hamming(int(a["phash"], 16), int(b["phash"], 16)) + hamming(int(a["dhash"], 16), int(b["dhash"], 16))) / 2
+               for a in lost_hashes for b in found_hashes)
+
+
+def score_match(lost: Dict, found: Dict, distance: Optional[float] = None) -> Dict[str, Optional[float]]:
+    """Weighted match score for a lost item / found item pair, with its components."""
+    if distance is None: distance = image_distance(lost.get("image_hashes", []), found.get("image_hashes", []))
+    parts = {
+        "location": location_similarity(lost, found),
+        "date": date_similarity(lost.get("date_lost"), found.get("date_found"), config.MATCH_DATE_WINDOW_DAYS),
+        "text": text_similarity(lost.get("description"), found.get("description")),
+        "image": None if distance is None else max(0.0, 1.0 - distance / (2 * config.IMAGE_MATCH_MAX_DISTANCE)),
+    }
+    weights = {k: w for k, w in WEIGHTS.items() if parts[k] is not None}
+    parts["score"] = round(sum(parts[k] * w for k, w in weights.items()) / sum(weights.values()), 4)
+    return parts
+
+
+async def find_matches(db, lost: Dict, limit: int = 10, projection: Optional[Dict] = None) -> List[Dict]:
+    """
+    Ranks found items for a lost item document. Returns [{"item": found_doc, "score": {...}}], best first.
+    `projection` limits the found item fields loaded (image_hashes is always included).
+    """
+    hits = image_index.search_hashes(lost.get("image_hashes", []), config.IMAGE_MATCH_MAX_DISTANCE, kinds=("found",), limit=config.MATCH_CANDIDATE_LIMIT)
+    distances: Dict[str, float] = {hit["item_id"]: hit["distance"] for hit in hits}
+
+    projection = {**projection, "image_hashes": 1, "location_point": 1, "location_precision": 1} if projection else None
+    query: Dict = match_area_filter(lost, config.MATCH_RADIUS_KM)
+    if lost.get("date_lost"): query["date_found"] = {"$gte": lost["date_lost"].replace(tzinfo=None) - timedelta(days=1)}
+    candidates = {doc["_id"]: doc async for doc in db.found_items.find(query, projection).sort("created_at", -1).limit(config.MATCH_CANDIDATE_LIMIT)}
+    missing = [item_id for item_id in distances if item_id not in candidates]
+    if missing:
+        async for doc in db.found_items.find({"_id": {"$in": missing}}, projection): candidates[doc["_id"]] = doc
+
+    scored = [{"item": doc, "score": score_match(lost, doc, distances.get(item_id))} for item_id, doc in candidates.items()]
+    scored.sort(key=lambda match: match["score"]["score"], reverse=True)
+    return scored[:limit]
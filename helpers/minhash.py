@@ -0,0 +1,40 @@
+"""
+MinHash signatures for short free-text descriptions.
+
+A description is normalised (lowercase words, single spaces) and split into overlapping
+character 4-grams. Each of NUM_PERM seeded universal hash functions keeps its minimum over the
+shingles; the fraction of equal positions in two signatures estimates the Jaccard similarity of
+their shingle sets. Character shingles tolerate the typos and word-order changes of hand-written
+reports better than word shingles do. The seeds are fixed, so signatures stored in Mongo stay
+comparable across processes and releases.
+"""
+import random
+import re
+import zlib
+from typing import List, Sequence, Set
+
+NUM_PERM = 64
+SHINGLE_SIZE = 4
+
+_PRIME = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str) -> Set[str]:
+    normalised = " ".join(_WORD.findall((text or "").lower()))
+    if len(normalised) <= SHINGLE_SIZE: return {normalised}
+    return {normalised[i:i + SHINGLE_SIZE] for i in range(len(normalised) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str) -> List[int]:
+    """NUM_PERM 32-bit minimum hashes of the text's shingles."""
+    hashes = [zlib.crc32(s.encode()) for s in shingles(text)]
+    return [min((a * h + b) % _PRIME for h in hashes) & _MASK for a, b in _PERMUTATIONS]
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
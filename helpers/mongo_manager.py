@@ -14,7 +14,11 @@ class MongoManager:
         if self.client is None:
             logger.info(f"Connecting to MongoDB at {self.config.MONGO_URI}...")
             try:
-                self.client = motor.motor_asyncio.AsyncIOMotorClient(self.config.MONGO_URI)
+                self.client = motor.motor_asyncio.AsyncIOMotorClient(
+                    self.config.MONGO_URI,
+                    serverSelectionTimeoutMS=self.config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    connectTimeoutMS=self.config.MONGO_CONNECT_TIMEOUT_MS,
+                )
                 self.db = self.client[self.config.MONGO_DB_NAME]
                 await self.client.admin.command('ping')
                 logger.info(f"Successfully connected to MongoDB database '{self.config.MONGO_DB_NAME}'.")
@@ -0,0 +1,146 @@
+"""
+nginx integration.
+
+With NGINX_ENABLED=true the app never streams image bytes. It answers image requests with an empty
+response carrying `X-Accel-Redirect`, and nginx serves the file from an `internal` location
+(sendfile, open file cache). Access-checked images (e.g. finder photos behind a management token)
+use the same path after the check.
+
+`python -m helpers.nginx` renders the matching site config from config.py:
+
+* an upstream with keepalive connections to the uvicorn workers (NGINX_UPSTREAMS),
+* the internal image location,
+* buffered, briefly cached public GET endpoints (management requests carrying ?token= bypass the
+  cache); the app's Cache-Control / ETag headers decide what may be cached and for how long,
+* unbuffered streaming for resumable upload chunks, whose bodies are capped at UPLOAD_MAX_BYTES;
+  everywhere else the cap fits the create/report forms with MAX_INLINE_IMAGES inline photos,
+* `X-Forwarded-For` set to the client address. The app's rate limits key on it when
+  TRUST_FORWARDED_FOR is true, which NGINX_ENABLED=true turns on by default.
+
+    python -m helpers.nginx              # print the config
+    python -m helpers.nginx --write      # write it to NGINX_SITES_AVAILABLE and link it into NGINX_SITES_ENABLED
+    python -m helpers.nginx --write --test
+"""
+import os
+import subprocess
+import sys
+from urllib.parse import quote
+
+import fastapi as f
+from fastapi.responses import FileResponse
+
+from config import get_config
+
+config = get_config()
+
+IMAGE_DIR = "images"
+IMAGE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), IMAGE_DIR)
+IMMUTABLE = "public, max-age=31536000, immutable" # Image names are random UUIDs and never reused
+MAX_INLINE_IMAGES = 5 # Photos the multipart create/report routes accept in one request
+
+
+def image_response(filename: str, cache_control: str = IMMUTABLE) -> f.Response:
+    """
+    Response for one stored image: an X-Accel-Redirect to nginx's internal location in nginx mode,
+    otherwise the file itself (development without nginx).
+    """
+    if os.path.basename(filename) != filename or filename.startswith("."): raise f.HTTPException(status_code=404, detail="Image not found.")
+    if config.NGINX_ENABLED:
+        return f.Response(headers={"X-Accel-Redirect": f"{config.NGINX_INTERNAL_IMAGES_PREFIX}{quote(filename)}", "Cache-Control": cache_control})
+    path = os.path.join(IMAGE_DIR, filename)
+    if not os.path.isfile(path): raise f.HTTPException(status_code=404, detail="Image not found.")
+    return FileResponse(path, headers={"Cache-Control": cache_control})
+
+
+def _body_limit_mb(size: int) -> int:
+    return -(-size // (1024 * 1024)) + 1 # Rounded up, plus a megabyte for headers and form fields
+
+
+def render_site_config() -> str:
+    servers = "\n".join(f"    server {server.strip()} max_fails=3 fail_timeout=10s;" for server in config.NGINX_UPSTREAMS.split(",") if server.strip())
+    log_dir = config.NGINX_LOG_DIR.rstrip("/")
+    upload_mb, form_mb = _body_limit_mb(config.UPLOAD_MAX_BYTES), _body_limit_mb(MAX_INLINE_IMAGES * config.UPLOAD_MAX_BYTES)
+    return f"""# Generated by `python -m helpers.nginx`; change config.py / the environment and regenerate instead of editing.
+upstream lostfound_app {{
+{servers}
+    keepalive {config.NGINX_KEEPALIVE};
+}}
+
+proxy_cache_path {config.NGINX_CACHE_DIR} levels=1:2 keys_zone=lostfound_api:10m max_size=256m inactive=10m use_temp_path=off;
+
+server {{
+    listen 80;
+    server_name {config.NGINX_HOST};
+    access_log {log_dir}/lostfound.access.log;
+    error_log {log_dir}/lostfound.error.log;
+    client_max_body_size {form_mb}m; # Multipart create/report forms with up to {MAX_INLINE_IMAGES} photos
+
+    # Keepalive to the app: HTTP/1.1 with the Connection header cleared
+    proxy_http_version 1.1;
+    proxy_set_header Connection "";
+    proxy_set_header Host $host;
+    # Overwrite, not append: the app rate-limits by this address (TRUST_FORWARDED_FOR, on with NGINX_ENABLED)
+    proxy_set_header X-Forwarded-For $remote_addr;
+    proxy_set_header X-Forwarded-Proto $scheme;
+
+    # Image bytes, reachable only through X-Accel-Redirect from the app
+    location {config.NGINX_INTERNAL_IMAGES_PREFIX} {{
+        internal;
+        alias {IMAGE_ROOT}/;
+        sendfile on;
+        tcp_nopush on;
+        open_file_cache max=10000 inactive=60s;
+        open_file_cache_valid 120s;
+    }}
+
+    # Public reads: buffered so slow clients don't hold a worker, and cached as the app's headers allow
+    location ~ ^/api/(items|found-items|stats|locations|images/similar)(/|$) {{
+        proxy_pass http://lostfound_app;
+        proxy_buffering on;
+        proxy_cache lostfound_api;
+        proxy_cache_methods GET HEAD;
+        proxy_cache_valid 200 {config.LIST_CACHE_MAX_AGE}s;
+        proxy_cache_lock on;
+        proxy_cache_revalidate on;
+        proxy_cache_background_update on;
+        proxy_cache_use_stale updating error timeout http_502 http_503;
+        proxy_cache_bypass $arg_token;
+        proxy_no_cache $arg_token;
+        add_header X-Cache-Status $upstream_cache_status;
+    }}
+
+    # Resumable upload chunks stream straight through to the app
+    location /api/uploads {{
+        proxy_pass http://lostfound_app;
+        client_max_body_size {upload_mb}m; # One file, or one chunk of it
+        proxy_request_buffering off;
+        proxy_buffering off;
+    }}
+
+    location / {{
+        proxy_pass http://lostfound_app;
+        proxy_buffering on;
+    }}
+}}
+"""
+
+
+def write_site_config(path: str):
+    with open(path, "w") as fh: fh.write(render_site_config())
+    link = os.path.join(config.NGINX_SITES_ENABLED, os.path.basename(path))
+    if not os.path.lexists(link): os.symlink(path, link)
+
+
+if __name__ == "__main__":
+    args = set(sys.argv[1:])
+    if not args <= {"--write", "--test"}: sys.exit("usage: python -m helpers.nginx [--write] [--test]")
+    if "--write" not in args:
+        print(render_site_config(), end="")
+    else:
+        path = os.path.join(config.NGINX_SITES_AVAILABLE, f"{config.NGINX_HOST}.conf")
+        write_site_config(path)
+        print(f"Wrote {path}")
+    if not config.TRUST_FORWARDED_FOR:
+        print("Warning: TRUST_FORWARDED_FOR is false, so the app will rate-limit all traffic as nginx's own address.", file=sys.stderr)
+    if "--test" in args:
+        sys.exit(subprocess.call(["nginx", "-t", "-c", config.NGINX_CONF_FILE]))
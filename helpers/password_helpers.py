@@ -1,8 +1,25 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
+from config import get_config
 from helpers.logger import logger
 
-ph = PasswordHasher()
+config = get_config()
+
+ph = PasswordHasher(
+    time_cost=config.ARGON2_TIME_COST,
+    memory_cost=config.ARGON2_MEMORY_COST_KIB,
+    parallelism=config.ARGON2_PARALLELISM,
+)
+
+# argon2-cffi releases the GIL while hashing, so a thread pool gives real parallelism
+# without the pickling overhead of a process pool. The pool bounds concurrent Argon2 work;
+# the semaphore bounds how much can queue behind it before callers wait on the event loop.
+_executor: Optional[ThreadPoolExecutor] = None
+_queue_slots: Optional[asyncio.Semaphore] = None
 
 def hash_password(password: str) -> str:
     """
@@ -34,3 +51,33 @@ def check_password(plain_password: str, hashed_password: str) -> bool:
     except Exception as e:
         logger.error(f"Error verifying password: {e}")
         return False
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _queue_slots
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=config.ARGON2_MAX_WORKERS, thread_name_prefix="argon2")
+        _queue_slots = asyncio.Semaphore(config.ARGON2_MAX_WORKERS * config.ARGON2_QUEUE_FACTOR)
+    return _executor
+
+async def _run_bounded(fn, *args):
+    executor = _get_executor()
+    async with _queue_slots:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+async def hash_password_async(password: str) -> str:
+    """
+    hash_password on the bounded Argon2 executor, keeping the event loop free.
+    """
+    return await _run_bounded(hash_password, password)
+
+async def check_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    check_password on the bounded Argon2 executor, keeping the event loop free.
+    """
+    return await _run_bounded(check_password, plain_password, hashed_password)
+
+def shutdown_executor():
+    global _executor, _queue_slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor, _queue_slots = None, None
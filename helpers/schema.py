@@ -0,0 +1,202 @@
+"""
+Declarative schema manifest: the indexes every collection should have, plus one-off migrations.
+
+The manifest is versioned by a fingerprint of its contents, recorded in `schema_state` once it
+has been applied. App startup only compares that version (one find_one). Applying happens:
+
+* explicitly, with `python -m helpers.schema apply` (e.g. as a deploy step), or
+* with SCHEMA_AUTO_APPLY=true, in the background of whichever worker first takes the lease in
+  `schema_state` after noticing the version is behind. The other workers keep serving.
+
+Applying runs pending migrations in order, then builds every index concurrently, timing each
+build. Builds slower than SCHEMA_SLOW_BUILD_SECONDS are reported, and a failed build leaves the
+recorded version unchanged so the next run retries. `python -m helpers.schema check` reports
+drift: missing indexes, indexes whose options differ, and indexes not in the manifest. It does
+not drop anything.
+"""
+import asyncio
+import hashlib
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from config import get_config
+from helpers.lease import acquire_lease, release_lease, worker_id
+from helpers.logger import logger
+
+config = get_config()
+
+STATE_COLLECTION = "schema_state"
+LEASE_SECONDS = 3600
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    keys: Tuple[Tuple[str, Any], ...]
+    options: Dict[str, Any] = {}
+
+    @property
+    def name(self) -> str:
+        return self.options.get("name") or "_".join(f"{field}_{kind}" for field, kind in self.keys)
+
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec("lost_items", (("created_at", 1),)),
+    IndexSpec("lost_items", (("reporter_email", 1),)),
+    IndexSpec("lost_items", (("description", "text"),), {"name": "description_text_index"}),
+    IndexSpec("lost_items", (("location_point", "2dsphere"),)),
+    IndexSpec("found_items", (("created_at", 1),)),
+    IndexSpec("found_items", (("description", "text"),), {"name": "description_text_index"}),
+    IndexSpec("found_items", (("location_point", "2dsphere"),)),
+    IndexSpec("uploads", (("expires_at", 1),), {"expireAfterSeconds": 0}), # Abandoned upload sessions expire on their own
+    IndexSpec("rate_limits", (("expires_at", 1),), {"expireAfterSeconds": 0}),
+    IndexSpec("email_outbox", (("created_at", 1),)),
+    IndexSpec("match_digests", (("last_sent_at", 1),)),
+    IndexSpec("idempotency_keys", (("expires_at", 1),), {"expireAfterSeconds": 0}), # _id is the (unique) hashed key
+]
+
+
+# --- Migrations: (name, coroutine(db)). Append only; each runs once, in order. ---
+
+async def _drop_plaintext_token_index(db: AsyncIOMotorDatabase):
+    # Tokens are stored hashed; the old unique index would reject every second token-less document
+    if "management_token_1" in await db.lost_items.index_information():
+        await db.lost_items.drop_index("management_token_1")
+
+
+MIGRATIONS: List[Tuple[str, Callable[[AsyncIOMotorDatabase], Awaitable[None]]]] = [
+    ("0001_drop_plaintext_token_index", _drop_plaintext_token_index),
+]
+
+
+def manifest_version() -> str:
+    payload = repr(([(s.collection, s.keys, sorted(s.options.items())) for s in INDEXES], [name for name, _ in MIGRATIONS]))
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+MANIFEST_VERSION = manifest_version()
+
+
+async def applied_version(db: AsyncIOMotorDatabase) -> Optional[str]:
+    state = await db[STATE_COLLECTION].find_one({"_id": "schema"}, {"version": 1})
+    return state.get("version") if state else None
+
+
+async def _build(db: AsyncIOMotorDatabase, spec: IndexSpec) -> Dict[str, Any]:
+    started = time.monotonic()
+    result = {"collection": spec.collection, "name": spec.name, "error": None}
+    try:
+        await db[spec.collection].create_index(list(spec.keys), **spec.options)
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+async def apply(db: AsyncIOMotorDatabase) -> Optional[bool]:
+    """
+    Runs pending migrations and builds all manifest indexes under the schema lease.
+    Returns True on success, False if anything failed, None if another worker holds the lease.
+    """
+    if not await acquire_lease(db, STATE_COLLECTION, LEASE_SECONDS):
+        logger.info("Schema lease held by another worker; not applying.")
+        return None
+    started = time.monotonic()
+    try:
+        state = await db[STATE_COLLECTION].find_one({"_id": "schema"}) or {}
+        done = list(state.get("migrations", []))
+        for name, migration in MIGRATIONS:
+            if name in done: continue
+            logger.info(f"Running migration {name}.")
+            await migration(db)
+            done.append(name)
+            await db[STATE_COLLECTION].update_one({"_id": "schema"}, {"$set": {"migrations": done}}, upsert=True)
+
+        builds = await asyncio.gather(*(_build(db, spec) for spec in INDEXES))
+        failed = [b for b in builds if b["error"]]
+        for b in builds:
+            if b["error"]: logger.error(f"Index build failed: {b['collection']}.{b['name']}: {b['error']}")
+            elif b["seconds"] >= config.SCHEMA_SLOW_BUILD_SECONDS: logger.warning(f"Slow index build: {b['collection']}.{b['name']} took {b['seconds']}s")
+        update = {"builds": builds, "last_run_at": datetime.utcnow(), "last_run_by": worker_id}
+        if not failed: update.update(version=MANIFEST_VERSION, applied_at=datetime.utcnow())
+        await db[STATE_COLLECTION].update_one({"_id": "schema"}, {"$set": update}, upsert=True)
+
+        drift = await check(db)
+        if drift["unexpected"]: logger.warning(f"Indexes not in the manifest (left in place): {drift['unexpected']}")
+        logger.info(f"Schema {MANIFEST_VERSION} applied in {time.monotonic() - started:.1f}s ({len(builds)} indexes, {len(failed)} failed).")
+        return not failed
+    finally:
+        await release_lease(db, STATE_COLLECTION)
+
+
+async def check(db: AsyncIOMotorDatabase) -> Dict[str, List[str]]:
+    """Compares live indexes with the manifest: {"missing", "mismatched", "unexpected"} as 'collection.name'."""
+    drift = {"missing": [], "mismatched": [], "unexpected": []}
+    expected: Dict[str, Dict[str, IndexSpec]] = {}
+    for spec in INDEXES: expected.setdefault(spec.collection, {})[spec.name] = spec
+    for collection, specs in expected.items():
+        live = await db[collection].index_information()
+        for name, spec in specs.items():
+            info = live.get(name)
+            if info is None:
+                drift["missing"].append(f"{collection}.{name}")
+                continue
+            # Text indexes report their keys as _fts/_ftsx, so only plain key lists are compared
+            keys_differ = not any(kind == "text" for _, kind in spec.keys) and [tuple(k) for k in info.get("key", [])] != list(spec.keys)
+            options_differ = any(info.get(opt) != spec.options.get(opt) for opt in _COMPARED_OPTIONS)
+            if keys_differ or options_differ: drift["mismatched"].append(f"{collection}.{name}")
+        drift["unexpected"].extend(f"{collection}.{name}" for name in live if name != "_id_" and name not in specs)
+    return drift
+
+
+async def verify(db: AsyncIOMotorDatabase) -> bool:
+    """Startup check: one read of the applied version. Returns True when it matches the manifest."""
+    try:
+        version = await applied_version(db)
+    except Exception as e:
+        logger.error(f"Could not read schema version: {e}")
+        return False
+    if version == MANIFEST_VERSION:
+        logger.info(f"Schema {MANIFEST_VERSION} is current.")
+        return True
+    if not config.SCHEMA_AUTO_APPLY:
+        logger.error(f"Schema is at {version}, expected {MANIFEST_VERSION}. Run `python -m helpers.schema apply`.")
+        return False
+    logger.warning(f"Schema is at {version}, expected {MANIFEST_VERSION}; applying in the background.")
+    return False
+
+
+async def apply_in_background(db: AsyncIOMotorDatabase):
+    try: await apply(db)
+    except Exception as e: logger.error(f"Schema apply failed: {e}", exc_info=True)
+
+
+if __name__ == "__main__":
+    from db_setup import mongo_manager
+
+    async def _main(command: str) -> int:
+        await mongo_manager.connect()
+        db = mongo_manager.get_db()
+        try:
+            if command == "apply":
+                ok = await apply(db)
+                if ok is None: print("Another worker is applying the schema; try again later.")
+                return 0 if ok else 1
+            if command == "check":
+                drift = await check(db)
+                for kind, names in drift.items():
+                    for name in names: print(f"{kind}: {name}")
+                return 1 if drift["missing"] or drift["mismatched"] else 0
+            version = await applied_version(db)
+            print(f"applied: {version}\nmanifest: {MANIFEST_VERSION}")
+            return 0 if version == MANIFEST_VERSION else 1
+        finally:
+            await mongo_manager.disconnect()
+
+    commands = ("apply", "check", "status")
+    if len(sys.argv) != 2 or sys.argv[1] not in commands: sys.exit(f"usage: python -m helpers.schema {{{'|'.join(commands)}}}")
+    sys.exit(asyncio.run(_main(sys.argv[1])))
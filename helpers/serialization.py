@@ -0,0 +1,29 @@
+import fastapi as f
+import pydantic as p
+from fastapi.responses import ORJSONResponse
+from typing import Any, Dict, Iterable, Type
+
+__all__ = ["ORJSONResponse", "public_projection", "dump_list", "list_response"]
+
+
+def public_projection(model: Type[p.BaseModel]) -> Dict[str, int]:
+    """
+    Builds a Mongo projection containing only the fields a response model exposes,
+    so private fields (reporter_email, management_token, ...) never leave the database.
+    """
+    return {(field.alias or name): 1 for name, field in model.model_fields.items()}
+
+
+def dump_list(adapter: p.TypeAdapter, docs: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Validates and serializes a page of raw Mongo documents with a precompiled TypeAdapter.
+    Both steps run inside pydantic-core and produce JSON bytes directly, skipping
+    FastAPI's per-item response_model validation and jsonable_encoder pass.
+    Keys are dumped by alias to match FastAPI's default response_model_by_alias=True ('_id').
+    """
+    return adapter.dump_json(adapter.validate_python(docs), by_alias=True)
+
+
+def list_response(adapter: p.TypeAdapter, docs: Iterable[Dict[str, Any]]) -> f.Response:
+    """Plain JSON response for a page of documents (see dump_list)."""
+    return f.Response(content=dump_list(adapter, docs), media_type="application/json")
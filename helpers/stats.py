@@ -0,0 +1,191 @@
+"""
+Pre-aggregated facet counters for the homepage statistics.
+
+All counters live in one summary document in the `stats` collection:
+    {"_id": "summary", "lost": {"total": 42, "by_country": {"India": 17}, "by_week": {"2025-W07": 3}, ...}, ...}
+Writers adjust counters atomically with one `$inc` (upsert) on create/update/delete, so reading the
+stats is a single `find_one` - its cost never depends on the size of lost_items/found_items or on
+how many distinct locations/weeks have been counted.
+
+Facet keys become field names, so "." and "$" (and "%", the escape character) are percent-encoded
+on write and decoded on read ("St. Louis" is stored as "St%2E Louis").
+
+`rebuild_stats` recomputes every counter from scratch with an aggregation pipeline and replaces the
+summary in one write. Run it after deploying, or whenever counters are suspected to have drifted:
+    python -m helpers.stats rebuild
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from urllib.parse import unquote
+
+from helpers.logger import logger
+from helpers.archive import archive_name
+
+STATS_COLLECTION = "stats"
+SUMMARY_ID = "summary"
+KINDS = ("lost", "found", "found_report")
+KEY_SEPARATOR = " / "
+
+Bucket = Tuple[str, str, str] # (kind, facet, key)
+
+
+def week_key(dt: Optional[datetime]) -> Optional[str]:
+    """ISO week label, e.g. '2025-W07' (matches $dateToString '%G-W%V')."""
+    if dt is None: return None
+    year, week, _ = dt.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def location_keys(country: Optional[str], state: Optional[str], city: Optional[str]) -> List[Tuple[str, str]]:
+    """States and cities are keyed by their full path so 'Springfield' in two states stays two buckets."""
+    keys = []
+    if country: keys.append(("country", country))
+    if state: keys.append(("state", KEY_SEPARATOR.join([country or "", state])))
+    if city: keys.append(("city", KEY_SEPARATOR.join([country or "", state or "", city])))
+    return keys
+
+
+def item_buckets(kind: str, doc: Dict[str, Any]) -> List[Bucket]:
+    """Buckets a lost/found item document contributes to."""
+    buckets = [(kind, "total", "all")]
+    buckets += [(kind, facet, key) for facet, key in location_keys(doc.get("country"), doc.get("state"), doc.get("city"))]
+    week = week_key(doc.get("created_at"))
+    if week: buckets.append((kind, "week", week))
+    return buckets
+
+
+def found_report_buckets(report: Dict[str, Any]) -> List[Bucket]:
+    """Buckets a found report embedded in a lost item contributes to."""
+    buckets = [("found_report", "total", "all")]
+    week = week_key(report.get("report_timestamp"))
+    if week: buckets.append(("found_report", "week", week))
+    return buckets
+
+
+def _encode_key(key: str) -> str:
+    return key.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _field(bucket: Bucket) -> str:
+    """Dotted path of a bucket's counter in the summary document."""
+    kind, facet, key = bucket
+    return f"{kind}.total" if facet == "total" else f"{kind}.by_{facet}.{_encode_key(key)}"
+
+
+async def apply_deltas(db: AsyncIOMotorDatabase, deltas: Dict[Bucket, int]):
+    """Applies counter deltas in one atomic update of the summary. Never raises: stats must not fail a request."""
+    inc = {_field(bucket): delta for bucket, delta in deltas.items() if delta}
+    if not inc: return
+    try:
+        await db[STATS_COLLECTION].update_one({"_id": SUMMARY_ID}, {"$inc": inc}, upsert=True)
+    except Exception as e:
+        logger.error(f"Failed to update stats counters ({len(inc)} buckets): {e}")
+
+
+async def record_item(db: AsyncIOMotorDatabase, kind: str, doc: Dict[str, Any], delta: int = 1):
+    """Counts a created (delta=1) or deleted (delta=-1) item, including its embedded found reports."""
+    deltas = Counter({bucket: delta for bucket in item_buckets(kind, doc)})
+    for report in doc.get("found_reports", []):
+        for bucket in found_report_buckets(report):
+            deltas[bucket] += delta
+    await apply_deltas(db, deltas)
+
+
+async def record_item_update(db: AsyncIOMotorDatabase, kind: str, old_doc: Dict[str, Any], new_doc: Dict[str, Any]):
+    """Moves counts between buckets when an update changes the item's location."""
+    deltas = Counter()
+    for bucket in item_buckets(kind, old_doc): deltas[bucket] -= 1
+    for bucket in item_buckets(kind, new_doc): deltas[bucket] += 1
+    await apply_deltas(db, deltas)
+
+
+async def record_found_report(db: AsyncIOMotorDatabase, report: Dict[str, Any]):
+    await apply_deltas(db, Counter(found_report_buckets(report)))
+
+
+async def read_stats(db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns {kind: {"total": n, "by_country": {...}, "by_state": {...}, "by_city": {...}, "by_week": {...}}}.
+    One read of the summary document; empty counters left behind by decrements are skipped.
+    """
+    summary = await db[STATS_COLLECTION].find_one({"_id": SUMMARY_ID}) or {}
+    stats = {}
+    for kind in KINDS:
+        counters = summary.get(kind, {})
+        stats[kind] = {"total": max(counters.get("total", 0), 0)}
+        for facet, counts in counters.items():
+            if facet.startswith("by_"): stats[kind][facet] = {unquote(key): n for key, n in counts.items() if n > 0}
+    return stats
+
+
+# --- Rebuild job ---
+
+def _week_expr(field: str) -> Dict[str, Any]:
+    return {"$cond": [{"$eq": [{"$type": f"${field}"}, "date"]},
+                      {"$dateToString": {"format": "%G-W%V", "date": f"${field}"}}, None]}
+
+
+async def _aggregate_items(db: AsyncIOMotorDatabase, collection: str, kind: str, deltas: Counter):
+    pipeline = [{"$group": {
+        "_id": {"country": "$country", "state": "$state", "city": "$city", "week": _week_expr("created_at")},
+        "count": {"$sum": 1},
+    }}]
+    # Counters cover every report ever made, so archived items are counted too
+    for name in (collection, archive_name(collection)):
+        async for group in db[name].aggregate(pipeline, allowDiskUse=True):
+            g = group["_id"]
+            deltas[(kind, "total", "all")] += group["count"]
+            for facet, key in location_keys(g.get("country"), g.get("state"), g.get("city")):
+                deltas[(kind, facet, key)] += group["count"]
+            if g.get("week"): deltas[(kind, "week", g["week"])] += group["count"]
+
+
+async def _aggregate_found_reports(db: AsyncIOMotorDatabase, deltas: Counter):
+    pipeline = [
+        {"$unwind": "$found_reports"},
+        {"$group": {"_id": _week_expr("found_reports.report_timestamp"), "count": {"$sum": 1}}},
+    ]
+    for name in ("lost_items", archive_name("lost_items")):
+        async for group in db[name].aggregate(pipeline, allowDiskUse=True):
+            deltas[("found_report", "total", "all")] += group["count"]
+            if group["_id"]: deltas[("found_report", "week", group["_id"])] += group["count"]
+
+
+async def rebuild_stats(db: AsyncIOMotorDatabase) -> int:
+    """
+    Recomputes all counters from lost_items/found_items (live and archived) and replaces the summary in one write.
+    Increments that land between the aggregation and the write are lost; rerun if that matters.
+    Returns the number of buckets written.
+    """
+    counts: Counter = Counter()
+    await _aggregate_items(db, "lost_items", "lost", counts)
+    await _aggregate_items(db, "found_items", "found", counts)
+    await _aggregate_found_reports(db, counts)
+
+    summary: Dict[str, Any] = {kind: {"total": 0} for kind in KINDS}
+    for (kind, facet, key), n in counts.items():
+        if facet == "total": summary[kind]["total"] = n
+        else: summary[kind].setdefault(f"by_{facet}", {})[_encode_key(key)] = n
+    await db[STATS_COLLECTION].replace_one({"_id": SUMMARY_ID}, summary, upsert=True)
+    await db[STATS_COLLECTION].delete_many({"_id": {"$ne": SUMMARY_ID}}) # Per-bucket documents from before the summary
+    logger.info(f"Rebuilt stats: {len(counts)} buckets.")
+    return len(counts)
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+    from db_setup import mongo_manager
+
+    async def _main(command: str):
+        await mongo_manager.connect()
+        try:
+            if command == "rebuild": await rebuild_stats(mongo_manager.get_db())
+            else: raise SystemExit(f"Unknown command: {command}. Usage: python -m helpers.stats rebuild")
+        finally:
+            await mongo_manager.disconnect()
+
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "rebuild"))
@@ -0,0 +1,192 @@
+"""
+Resumable (tus-style) image uploads.
+
+A session document in `uploads` tracks how many bytes of a file have reached disk. Clients
+PATCH byte ranges starting at the current offset; each chunk is streamed straight from the
+request body into `UPLOAD_TMP_DIR/<upload_id>.part` without buffering the whole file.
+Once complete, item-creation endpoints claim the upload by id (`claim_uploads`), which moves
+the file into the image directory and removes the session so it cannot be reused.
+
+Abandoned sessions expire through the TTL index on `expires_at`; `purge_orphaned_parts`
+removes the matching partial files from disk.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List
+
+import aiofiles
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from config import Config
+from helpers.logger import logger
+
+UPLOADS_COLLECTION = "uploads"
+WRITER_LOCK_SECONDS = 330 # A little over the PATCH request budget (helpers.deadline)
+
+
+class UploadError(Exception):
+    """Raised for protocol violations; carries the HTTP status the router should answer with."""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def part_path(config: Config, upload_id: str) -> str:
+    return os.path.join(config.UPLOAD_TMP_DIR, f"{upload_id}.part")
+
+
+async def create_session(db: AsyncIOMotorDatabase, config: Config, filename: str, content_type: str, size: int) -> dict:
+    if size > config.UPLOAD_MAX_BYTES:
+        raise UploadError(413, f"File exceeds the {config.UPLOAD_MAX_BYTES} byte limit.")
+    now = datetime.utcnow()
+    session = {
+        "_id": str(uuid.uuid4()), "filename": filename, "content_type": content_type,
+        "size": size, "offset": 0, "status": "pending",
+        "created_at": now, "expires_at": now + timedelta(seconds=config.UPLOAD_SESSION_TTL_SECONDS),
+    }
+    os.makedirs(config.UPLOAD_TMP_DIR, exist_ok=True)
+    async with aiofiles.open(part_path(config, session["_id"]), "wb"): pass # Reserve the file so PATCH can open it r+b
+    await db[UPLOADS_COLLECTION].insert_one(session)
+    return session
+
+
+async def get_session(db: AsyncIOMotorDatabase, upload_id: str) -> dict:
+    session = await db[UPLOADS_COLLECTION].find_one({"_id": upload_id})
+    if session is None: raise UploadError(404, "Upload not found or expired.")
+    return session
+
+
+async def _take_writer(db: AsyncIOMotorDatabase, upload_id: str, offset: int, writer: str) -> datetime:
+    """
+    Makes `writer` the only PATCH allowed to write the part file, if `offset` is the stored offset.
+    Returns when the claim expires. A claim left by a crashed worker expires after WRITER_LOCK_SECONDS.
+    """
+    now = datetime.utcnow()
+    lock_expires_at = now + timedelta(seconds=WRITER_LOCK_SECONDS)
+    taken = await db[UPLOADS_COLLECTION].find_one_and_update(
+        {"_id": upload_id, "status": "pending", "offset": offset, "$or": [{"writer": None}, {"writer_expires_at": {"$lt": now}}]},
+        {"$set": {"writer": writer, "writer_expires_at": lock_expires_at}},
+    )
+    if taken is not None: return lock_expires_at
+    session = await get_session(db, upload_id) # Explain why not
+    if session["status"] != "pending": raise UploadError(409, "Upload already completed.")
+    if offset != session["offset"]: raise UploadError(409, f"Offset mismatch; resume from {session['offset']}.")
+    raise UploadError(409, "Another chunk is being written to this upload; query the offset and retry.")
+
+
+async def write_chunk(db: AsyncIOMotorDatabase, config: Config, upload_id: str, offset: int, stream: AsyncIterator[bytes]) -> dict:
+    """
+    Streams `stream` into the part file at `offset`, which must equal the stored offset (tus semantics).
+    The session is claimed for this request before any byte is written, so two PATCHes at the same
+    offset can't interleave on disk. Bytes that do reach disk are kept even if the connection drops
+    mid-chunk, so the client can resume from whatever offset was recorded.
+    """
+    writer = str(uuid.uuid4())
+    lock_expires_at = await _take_writer(db, upload_id, offset, writer)
+    session = await get_session(db, upload_id)
+
+    written = 0
+    try:
+        async with aiofiles.open(part_path(config, upload_id), "r+b") as out:
+            await out.seek(offset)
+            async for chunk in stream:
+                if not chunk: continue
+                if offset + written + len(chunk) > session["size"]:
+                    raise UploadError(413, "Chunk exceeds declared upload size.")
+                if datetime.utcnow() >= lock_expires_at: # Stop before another PATCH may take over the file
+                    raise UploadError(408, "Chunk took too long; query the offset and resume.")
+                await out.write(chunk)
+                written += len(chunk)
+    finally:
+        # Record progress even on disconnect, and release the session for the next chunk
+        new_offset = offset + written
+        result = await db[UPLOADS_COLLECTION].update_one(
+            {"_id": upload_id, "writer": writer},
+            {"$set": {"offset": new_offset, "writer": None,
+                      "expires_at": datetime.utcnow() + timedelta(seconds=config.UPLOAD_SESSION_TTL_SECONDS)}},
+        )
+    if result.matched_count == 0: raise UploadError(409, "Upload was modified concurrently; query the offset and retry.")
+    session["offset"] = new_offset
+    return session
+
+
+async def complete_session(db: AsyncIOMotorDatabase, upload_id: str) -> dict:
+    session = await get_session(db, upload_id)
+    if session["offset"] != session["size"]:
+        raise UploadError(409, f"Upload incomplete: {session['offset']} of {session['size']} bytes received.")
+    await db[UPLOADS_COLLECTION].update_one({"_id": upload_id}, {"$set": {"status": "complete"}})
+    session["status"] = "complete"
+    return session
+
+
+async def claim_uploads(db: AsyncIOMotorDatabase, config: Config, upload_ids: List[str], image_dir: str, prefix: str = "") -> List[dict]:
+    """
+    Consumes completed uploads and moves their files into `image_dir`, all or nothing.
+    Returns the claimed sessions, each with its new `image_filename`. Raises UploadError(400) if any id
+    is unknown or incomplete. Uploads claimed before a failure are restored, and callers hand the
+    sessions to `restore_uploads` if the item can't be saved, so the client can retry with the same ids.
+    """
+    if not upload_ids: return []
+    if len(set(upload_ids)) != len(upload_ids): raise UploadError(400, "Duplicate upload ids.")
+    ready = {s["_id"] async for s in db[UPLOADS_COLLECTION].find({"_id": {"$in": upload_ids}, "status": "complete"}, {"_id": 1})}
+    missing = [upload_id for upload_id in upload_ids if upload_id not in ready]
+    if missing: raise UploadError(400, f"Upload {missing[0]} is not a completed upload.")
+
+    claimed = []
+    try:
+        for upload_id in upload_ids:
+            session = await db[UPLOADS_COLLECTION].find_one_and_delete({"_id": upload_id, "status": "complete"})
+            if session is None: raise UploadError(400, f"Upload {upload_id} is not a completed upload.") # Claimed concurrently
+            image_filename = f"{prefix}{uuid.uuid4()}{os.path.splitext(session['filename'])[1]}"
+            try: os.replace(part_path(config, upload_id), os.path.join(image_dir, image_filename))
+            except Exception:
+                await db[UPLOADS_COLLECTION].insert_one(session)
+                raise
+            claimed.append({**session, "image_filename": image_filename})
+    except BaseException:
+        await restore_uploads(db, config, claimed, image_dir)
+        raise
+    for session in claimed: logger.info(f"Claimed upload {session['_id']} as image {session['image_filename']}")
+    return claimed
+
+
+async def restore_uploads(db: AsyncIOMotorDatabase, config: Config, claimed: List[dict], image_dir: str):
+    """Undoes `claim_uploads`: moves the files back and re-creates the completed sessions."""
+    for session in reversed(claimed):
+        session = dict(session)
+        try:
+            os.replace(os.path.join(image_dir, session.pop("image_filename")), part_path(config, session["_id"]))
+            await db[UPLOADS_COLLECTION].insert_one(session)
+        except Exception as e: logger.error(f"Could not restore upload {session['_id']}: {e}")
+
+
+async def purge_orphaned_parts(db: AsyncIOMotorDatabase, config: Config) -> int:
+    """Deletes part files whose session has expired (TTL-removed) and that are older than the session TTL."""
+    if not os.path.isdir(config.UPLOAD_TMP_DIR): return 0
+    cutoff = time.time() - config.UPLOAD_SESSION_TTL_SECONDS
+    removed = 0
+    for entry in os.scandir(config.UPLOAD_TMP_DIR):
+        if not entry.name.endswith(".part") or entry.stat().st_mtime > cutoff: continue
+        if await db[UPLOADS_COLLECTION].count_documents({"_id": entry.name[:-5]}, limit=1): continue
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except FileNotFoundError: pass
+    if removed: logger.info(f"Purged {removed} abandoned upload part files.")
+    return removed
+
+
+async def upload_cleanup_loop(db: AsyncIOMotorDatabase, config: Config):
+    """Background task: purges orphaned part files every UPLOAD_CLEANUP_INTERVAL_SECONDS until cancelled."""
+    while True:
+        try:
+            await purge_orphaned_parts(db, config)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Upload cleanup failed: {e}", exc_info=True)
+        await asyncio.sleep(config.UPLOAD_CLEANUP_INTERVAL_SECONDS)
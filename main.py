@@ -1,24 +1,53 @@
 import fastapi as f
+import asyncio
 from contextlib import asynccontextmanager
 import os
-from fastapi import staticfiles, Depends, Depends
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi.middleware.cors import CORSMiddleware
 
 from db_setup import mongo_manager, get_db, config
-from helpers.logger import logger, ic
-import os
+from helpers.logger import logger
 from fastapi import HTTPException
 from fastapi.staticfiles import StaticFiles
+from helpers.serialization import ORJSONResponse
+from helpers.compression import CompressionMiddleware
+from helpers.admission import AdmissionMiddleware
+from helpers.idempotency import IdempotencyMiddleware
+from helpers.deadline import DeadlineMiddleware, DeadlineExceeded
+from helpers.email_utils import email_outbox_loop
+from helpers.location_client import location_client
+from pymongo.errors import PyMongoError
+from helpers.archive import archive_loop
+from helpers.uploads import upload_cleanup_loop
+from helpers.password_helpers import shutdown_executor
+from helpers import image_hash
+from helpers.image_index import rebuild_image_index
+from helpers.invalidation import bus as invalidation_bus
+from helpers.dedup import rebuild_duplicate_index
+from helpers.match_notifier import match_notifier_loop
+from helpers import schema
+from helpers.nginx import image_response
 
 # Import API routers
 from api import items as items_router
 from api import locations as locations_router
 from api import found_items as found_items_router # Import found items router
+from api import stats as stats_router
+from api import uploads as uploads_router
+from api import images as images_router
+from api import duplicates as duplicates_router
+
+@asynccontextmanager
+async def lifespan(app: f.FastAPI):
+    # Clients, directories and background tasks start here rather than at import, so importing the app stays cheap
+    await startup_event()
+    try: yield
+    finally: await shutdown_event()
 
 app = f.FastAPI(
     title="Lost & Found Backend",
-    # lifespan=lifespan #lifespan for cleaner startup/shutdown
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 origins = [
@@ -27,59 +56,95 @@ origins = [
     *config.ALLOWED_ORIGINS,
 ]
 
+# Innermost: every /api request runs under its time budget (also bounds Mongo via maxTimeMS)
+app.add_middleware(DeadlineMiddleware)
+
+# Rejects excess writes before their bodies are read (CORS still wraps the 429/503)
+app.add_middleware(AdmissionMiddleware)
+
+# Replays stored responses for repeated Idempotency-Keys before admission or any body is read
+app.add_middleware(IdempotencyMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Login"],
+    expose_headers=["X-Login", "Location", "Upload-Offset", "Upload-Length", "Tus-Resumable", "Idempotent-Replayed"],
 )
 
+# Outermost: compresses everything the app (including CORS) produced
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MIN_SIZE)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: f.Request, exc: DeadlineExceeded):
+    return ORJSONResponse({"detail": "Request took too long. Please retry."}, status_code=504)
+
+@app.exception_handler(PyMongoError)
+async def mongo_error_handler(request: f.Request, exc: PyMongoError):
+    if exc.timeout: return ORJSONResponse({"detail": "Database timed out. Please retry."}, status_code=504)
+    logger.error(f"Unhandled database error on {request.url.path}: {exc}")
+    return ORJSONResponse({"detail": "Database unavailable."}, status_code=503)
+
 # Include API routers
 app.include_router(items_router.router)
 app.include_router(locations_router.router)
 app.include_router(found_items_router.router) # Include found items router
+app.include_router(stats_router.router)
+app.include_router(uploads_router.router)
+app.include_router(images_router.router)
+app.include_router(duplicates_router.router)
 
 
-@app.on_event("startup")
 async def startup_event():
     logger.info("Starting up the FastAPI application.")
+    os.makedirs(items_router.IMAGE_DIR, exist_ok=True)
     await mongo_manager.connect()
+    await location_client.start()
+    locations_router.connect_world_db()
     db_instance = mongo_manager.get_db()
-    try:
-        # Indexes for the lost_items collection
-        # Indexes for the lost_items collection
-        await db_instance.lost_items.create_index("management_token", unique=True)
-        await db_instance.lost_items.create_index("created_at")
-        await db_instance.lost_items.create_index("reporter_email")
-        await db_instance.lost_items.create_index([("description", "text")], name="description_text_index") # Add text index
-        # TODO: Consider indexes on location for matching?
-        logger.info("Ensured indexes on 'lost_items'.")
-
-        # Indexes for the found_items collection
-        await db_instance.found_items.create_index("created_at")
-        await db_instance.found_items.create_index([("description", "text")], name="description_text_index") # Add text index
-        # TODO: Consider indexes on location for matching?
-        logger.info("Ensured indexes on 'found_items'.")
-    except Exception as e:
-        logger.error(f"Error creating database indexes during startup: {e}")
-
-@app.on_event("shutdown")
+    # Indexes and migrations are applied by `python -m helpers.schema apply` (or once, in the background, with SCHEMA_AUTO_APPLY)
+    if not await schema.verify(db_instance) and config.SCHEMA_AUTO_APPLY:
+        app.state.schema_task = asyncio.create_task(schema.apply_in_background(db_instance))
+
+    app.state.upload_cleanup_task = asyncio.create_task(upload_cleanup_loop(db_instance, config))
+    app.state.email_outbox_task = asyncio.create_task(email_outbox_loop(db_instance))
+    await invalidation_bus.start(db_instance) # Before serving: writes made from here on must reach the other workers
+    app.state.invalidation_task = asyncio.create_task(invalidation_bus.run(db_instance)) # Other workers' writes evict our caches
+    app.state.image_index_task = asyncio.create_task(rebuild_image_index(db_instance)) # Searches see a partial index until done
+    app.state.duplicate_index_task = asyncio.create_task(rebuild_duplicate_index(db_instance))
+
+    if config.ARCHIVE_ENABLED:
+        app.state.archive_task = asyncio.create_task(archive_loop(db_instance, config))
+        logger.info(f"Archiver enabled: items older than {config.ARCHIVE_AFTER_DAYS} days move to *_archive.")
+
+    if config.MATCH_NOTIFY_ENABLED:
+        app.state.match_notifier_task = asyncio.create_task(match_notifier_loop(db_instance, config))
+
 async def shutdown_event():
     logger.info("Shutting down the FastAPI application.")
+    for task_name in ("archive_task", "upload_cleanup_task", "email_outbox_task", "image_index_task", "match_notifier_task", "schema_task", "invalidation_task", "duplicate_index_task"):
+        task = getattr(app.state, task_name, None)
+        if task is None: continue
+        task.cancel()
+        try: await task
+        except asyncio.CancelledError: pass
     await mongo_manager.disconnect()
+    await location_client.close()
+    locations_router.close_world_db()
+    shutdown_executor()
+    image_hash.shutdown_executor()
     logger.info("FastAPI application has been shut down.")
 
-# Import required dependencies
-from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-import httpx
-
-
-# Mount static files directory for uploaded images
-app.mount("/images", StaticFiles(directory="images"), name="uploaded_images")
+if config.NGINX_ENABLED:
+    # nginx serves the bytes from its internal location; the app only answers with X-Accel-Redirect
+    @app.get("/images/{filename}", include_in_schema=False)
+    async def serve_image(filename: str):
+        return image_response(filename)
+else:
+    # Mount static files directory for uploaded images
+    app.mount("/images", StaticFiles(directory="images", check_dir=False), name="uploaded_images") # Directory is created by the lifespan
 
 # Add proxy middleware in development
 
@@ -0,0 +1,9 @@
+import pydantic as p
+from typing import List
+
+# --- A cluster of near-duplicate reports (GET /api/duplicates) ---
+class DuplicateCluster(p.BaseModel):
+    kind: str = p.Field(..., description="'lost' or 'found'")
+    canonical_id: str = p.Field(..., description="The first report of the cluster; the others point to it with duplicate_of")
+    duplicate_ids: List[str]
+    size: int
@@ -23,15 +23,11 @@ class FoundItemCreate(FoundItemBase):
 class FoundItemDB(FoundItemBase):
     id: str = p.Field(default_factory=lambda: str(uuid.uuid4()), alias="_id")
     created_at: datetime = p.Field(default_factory=datetime.utcnow)
+    duplicate_of: Optional[str] = None # Canonical report this one near-duplicates (helpers/dedup.py)
     # Could add status later (e.g., 'reported', 'claimed')
     # claimed_by_lost_item_id: Optional[str] = None # Link if matched later?
 
-    class Config:
-        allow_population_by_field_name = True
-        json_encoders = {
-            datetime: lambda dt: dt.isoformat(),
-            uuid.UUID: str,
-        }
+    model_config = p.ConfigDict(populate_by_name=True)
 
 # --- Model for Public Response ---
 class FoundItemPublicResponse(p.BaseModel):
@@ -43,10 +39,11 @@ class FoundItemPublicResponse(p.BaseModel):
     city: Optional[str] = None
     image_filenames: List[str]
     created_at: datetime
+    duplicate_of: Optional[str] = None
+    distance_km: Optional[float] = None # Only set for ?near= queries
     # Exclude finder_contact from public view
 
-    class Config:
-        allow_population_by_field_name = True
-        json_encoders = {
-            datetime: lambda dt: dt.isoformat()
-        }
\ No newline at end of file
+    model_config = p.ConfigDict(populate_by_name=True)
+
+# --- Precompiled list serializer (see models/item.py) ---
+FoundItemPublicListAdapter = p.TypeAdapter(List[FoundItemPublicResponse])
\ No newline at end of file
@@ -26,13 +26,9 @@ class LostItemDB(LostItemBase):
     # found_by_contact: Optional[str] = None # Replaced by found_reports
     # found_at: Optional[datetime] = None    # Replaced by found_reports
     found_reports: List['FoundReportDetail'] = p.Field(default_factory=list) # Embed list of found reports
+    duplicate_of: Optional[str] = None # Canonical report this one near-duplicates (helpers/dedup.py)
 
-    class Config:
-        allow_population_by_field_name = True # Allows using '_id' when populating from DB
-        json_encoders = {
-            datetime: lambda dt: dt.isoformat(),
-            uuid.UUID: str,
-        }
+    model_config = p.ConfigDict(populate_by_name=True) # Allows using '_id' when populating from DB
 
 
 class LostItemPublicResponse(p.BaseModel):
@@ -46,17 +42,15 @@ class LostItemPublicResponse(p.BaseModel):
     state: Optional[str] = None
     city: Optional[str] = None
     created_at: datetime
+    distance_km: Optional[float] = None # Only set for ?near= queries
 
-    class Config:
-        allow_population_by_field_name = True
-        json_encoders = {
-            datetime: lambda dt: dt.isoformat()
-        }
+    model_config = p.ConfigDict(populate_by_name=True)
 
 class LostItemManagementResponse(LostItemDB):
     # For the management view, we can return everything in the DB model
     # No need to hide the management token here as it's required for auth
-    pass
+    # duplicate_of is hidden: lost duplicates share a reporter_email, and the creator of a report gets its token
+    duplicate_of: Optional[str] = p.Field(None, exclude=True)
 # --- Payload Model for Found Endpoint ---
 
 class ItemFoundPayload(p.BaseModel):
@@ -78,12 +72,6 @@ class FoundReportDetail(p.BaseModel):
     found_city: Optional[str] = None
     finder_image_filenames: List[str] = p.Field(default_factory=list, max_length=5) # Images uploaded by the finder
 
-    class Config:
-         json_encoders = {
-             datetime: lambda dt: dt.isoformat(),
-             uuid.UUID: str,
-         }
-
 # --- Payload Model for Update Endpoint ---
 
 class LostItemUpdate(p.BaseModel):
@@ -101,11 +89,11 @@ class LostItemUpdate(p.BaseModel):
     city: Optional[str] = None
     # We don't allow updating found status via this endpoint
 
-    class Config:
-        # Allow extra fields to be ignored
-        extra = 'ignore'
-        # Handle None values correctly when building update dict
-        exclude_unset = True # Important for building $set update
-        json_encoders = {
-            datetime: lambda dt: dt.isoformat(),
-        }
\ No newline at end of file
+    # Allow extra fields to be ignored; build the $set payload with model_dump(exclude_unset=True)
+    model_config = p.ConfigDict(extra='ignore')
+
+# --- Precompiled list serializers ---
+# Built once at import so list endpoints validate + dump a whole page in a single pydantic-core call
+# instead of re-validating every document through FastAPI's response_model machinery.
+LostItemDB.model_rebuild()
+LostItemPublicListAdapter = p.TypeAdapter(List[LostItemPublicResponse])
\ No newline at end of file
@@ -0,0 +1,24 @@
+import pydantic as p
+from typing import Optional
+
+from models.found_item import FoundItemPublicResponse
+
+# --- One visually similar photo (GET/POST /api/images/similar) ---
+class ImageMatch(p.BaseModel):
+    kind: str = p.Field(..., description="'lost', 'found' or 'found_report' (finder photos on a lost item)")
+    item_id: str
+    filename: str
+    distance: float = p.Field(..., description="Mean pHash/dHash Hamming distance in bits (0 = identical)")
+
+# --- Score breakdown; each component is in [0, 1] ---
+class MatchScore(p.BaseModel):
+    score: float
+    location: float
+    date: float
+    text: float
+    image: Optional[float] = p.Field(None, description="None when either side has no hashed photos")
+
+# --- A found item scored against a lost item (GET /api/items/{item_id}/matches) ---
+class FoundItemMatch(p.BaseModel):
+    item: FoundItemPublicResponse
+    score: MatchScore
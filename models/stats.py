@@ -0,0 +1,16 @@
+import pydantic as p
+from typing import Dict
+
+# --- Facet counts for one kind of record ---
+class FacetCounts(p.BaseModel):
+    total: int = 0
+    by_country: Dict[str, int] = p.Field(default_factory=dict)
+    by_state: Dict[str, int] = p.Field(default_factory=dict, description="Keyed 'Country / State'")
+    by_city: Dict[str, int] = p.Field(default_factory=dict, description="Keyed 'Country / State / City'")
+    by_week: Dict[str, int] = p.Field(default_factory=dict, description="Keyed by ISO week of creation, e.g. '2025-W07'")
+
+# --- Response for GET /api/stats ---
+class StatsResponse(p.BaseModel):
+    lost: FacetCounts
+    found: FacetCounts
+    found_report: FacetCounts = p.Field(..., description="Found reports submitted against lost items (total and by_week only)")
@@ -0,0 +1,23 @@
+import pydantic as p
+from typing import Literal
+from datetime import datetime
+
+ALLOWED_IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+
+# --- Payload for creating an upload session ---
+class UploadCreate(p.BaseModel):
+    filename: str = p.Field(..., min_length=1, max_length=255)
+    content_type: Literal[ALLOWED_IMAGE_TYPES] # type: ignore[valid-type]
+    size: int = p.Field(..., gt=0, description="Total size of the file in bytes (tus Upload-Length)")
+
+# --- Session state returned to the client ---
+class UploadStatus(p.BaseModel):
+    id: str = p.Field(..., alias="_id")
+    filename: str
+    content_type: str
+    size: int
+    offset: int = p.Field(..., description="Bytes received so far; resume PATCHes from here")
+    status: Literal["pending", "complete"]
+    expires_at: datetime
+
+    model_config = p.ConfigDict(populate_by_name=True)
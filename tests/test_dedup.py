@@ -0,0 +1,47 @@
+"""
+DuplicateIndex clustering (in memory, no Mongo).
+
+Run from the project root:
+    python -m unittest discover tests
+"""
+import unittest
+
+from helpers.dedup import DuplicateIndex, dedup_fields
+
+WALLET = "Black leather wallet with two credit cards near the central station"
+
+
+def _found(description: str, city: str = "Berlin") -> dict:
+    return dedup_fields("found", description, "Germany", city)
+
+
+class DuplicateIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = DuplicateIndex()
+
+    def test_near_duplicates_share_a_shard(self):
+        self.index.add("found", "a", _found(WALLET))
+        self.assertEqual(self.index.find_duplicate("found", _found("black leather wallet w/ two credit cards near central station"))[0], "a")
+        self.assertIsNone(self.index.find_duplicate("found", _found(WALLET, city="Munich")))
+        self.assertIsNone(self.index.find_duplicate("found", _found("Red umbrella with a wooden handle left on tram 12")))
+
+    def test_lost_duplicates_need_the_same_owner(self):
+        fields = lambda email: dedup_fields("lost", WALLET, "Germany", "Berlin", reporter_email=email)
+        self.index.add("lost", "a", fields("owner@example.com"))
+        self.assertEqual(self.index.find_duplicate("lost", fields(" Owner@Example.com"))[0], "a")
+        self.assertIsNone(self.index.find_duplicate("lost", fields("someone@example.com")))
+
+    def test_removing_the_canonical_promotes_the_smallest_member(self):
+        self.index.add("found", "a", _found(WALLET))
+        self.index.add("found", "c", _found(WALLET), duplicate_of="a")
+        self.index.add("found", "b", _found(WALLET), duplicate_of="a")
+        self.index.remove("found", "a")
+        self.assertEqual(self.index.clusters("found"), [{"kind": "found", "canonical_id": "b", "duplicate_ids": ["c"], "size": 2}])
+        self.assertEqual(self.index.find_duplicate("found", _found(WALLET))[0], "b")
+        self.index.remove("found", "b")
+        self.assertEqual(self.index.clusters("found"), [])
+        self.assertEqual(self.index.find_duplicate("found", _found(WALLET))[0], "c")
+
+
+if __name__ == "__main__":
+    unittest.main()
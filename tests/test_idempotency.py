@@ -0,0 +1,48 @@
+"""
+Idempotency request fingerprints and stored-body redaction (no Mongo).
+
+Run from the project root:
+    python -m unittest discover tests
+"""
+import json
+import unittest
+
+from helpers.idempotency import _Fingerprint, _redact
+
+
+def _multipart(boundary: str, value: str) -> bytes:
+    return f'--{boundary}\r\nContent-Disposition: form-data; name="description"\r\n\r\n{value}\r\n--{boundary}--\r\n'.encode()
+
+
+def _fingerprint(body: bytes, content_type: str, chunk_size: int = 1 << 20, path: str = "/api/items") -> str:
+    fingerprint = _Fingerprint({"method": "POST", "path": path, "headers": [(b"content-type", content_type.encode())]})
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    for i, chunk in enumerate(chunks):
+        fingerprint.update({"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1})
+    assert fingerprint.complete
+    return fingerprint.hexdigest()
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_multipart_boundary_and_chunking_do_not_matter(self):
+        digests = {_fingerprint(_multipart(b, "wallet"), f"multipart/form-data; boundary={b}", n)
+                   for b in ("abc123", "----WebKitFormBoundaryX") for n in (1, 5, 1 << 20)}
+        self.assertEqual(len(digests), 1)
+
+    def test_body_path_and_media_type_matter(self):
+        base = _fingerprint(_multipart("b", "wallet"), "multipart/form-data; boundary=b")
+        self.assertNotEqual(base, _fingerprint(_multipart("b", "purse"), "multipart/form-data; boundary=b"))
+        self.assertNotEqual(base, _fingerprint(_multipart("b", "wallet"), "multipart/form-data; boundary=b", path="/api/found-items"))
+        self.assertNotEqual(_fingerprint(b"{}", "application/json"), _fingerprint(b"{}", "text/plain"))
+
+
+class RedactTest(unittest.TestCase):
+    def test_removes_listed_fields_from_json_only(self):
+        body = json.dumps({"_id": "x", "management_token": "secret"}).encode()
+        self.assertEqual(json.loads(_redact(body, [("content-type", "application/json")], ("management_token",))), {"_id": "x"})
+        self.assertEqual(_redact(body, [("content-type", "text/plain")], ("management_token",)), body)
+        self.assertEqual(_redact(body, [("content-type", "application/json")], ()), body)
+
+
+if __name__ == "__main__":
+    unittest.main()
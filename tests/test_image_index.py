@@ -0,0 +1,40 @@
+"""
+ImageIndex searches (in memory, no Mongo).
+
+Run from the project root:
+    python -m unittest discover tests
+"""
+import unittest
+
+from helpers.image_index import ImageIndex
+
+
+def _hash(filename: str, phash: int, dhash: int = 0) -> dict:
+    return {"filename": filename, "phash": f"{phash:016x}", "dhash": f"{dhash:016x}"}
+
+
+class SearchHashesTest(unittest.TestCase):
+    def setUp(self):
+        self.index = ImageIndex()
+        self.index.add_hashes("found", "near", [_hash("n1.jpg", 0b1), _hash("n2.jpg", 0b111)])
+        self.index.add_hashes("found", "far", [_hash("f1.jpg", 0b1111)])
+        self.index.add_hashes("lost", "self", [_hash("s1.jpg", 0)])
+
+    def test_one_hit_per_item_at_its_closest_photo(self):
+        hits = self.index.search_hashes([_hash("q1.jpg", 0), _hash("q2.jpg", 0b1111)], max_distance=4, exclude_item="self")
+        self.assertEqual([(h["item_id"], h["filename"], h["distance"]) for h in hits],
+                         [("far", "f1.jpg", 0.0), ("near", "n1.jpg", 0.5)])
+
+    def test_matches_single_search(self):
+        query = _hash("q.jpg", 0b11, 0b1)
+        self.assertEqual(self.index.search_hashes([query], max_distance=8), self.index.search(0b11, 0b1, max_distance=8))
+
+    def test_filters_kinds_removed_items_and_limit(self):
+        self.index.remove_item("found", "far")
+        hits = self.index.search_hashes([_hash("q.jpg", 0)], max_distance=8, kinds=("found",), limit=5)
+        self.assertEqual([h["item_id"] for h in hits], ["near"])
+        self.assertEqual(len(self.index.search_hashes([_hash("q.jpg", 0)], max_distance=8, limit=1)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
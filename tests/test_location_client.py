@@ -0,0 +1,161 @@
+"""
+LocationClient against a local stub of the location API (no network, no Mongo).
+
+Run from the project root:
+    python -m unittest discover tests
+"""
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from helpers import deadline, location_client as lc
+
+
+class StubLocationAPI(ThreadingHTTPServer):
+    """Answers /countrieslist and friends with JSON echoing the query; counts requests and connections."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.requests = []
+        self.connections = set()
+        self.delay = 0.0
+        self.status = 200
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so connection reuse is observable
+
+    def do_GET(self):
+        server: StubLocationAPI = self.server
+        url = urlparse(self.path)
+        with server.lock:
+            server.requests.append((url.path, parse_qs(url.query), self.headers.get("X-API-KEY")))
+            server.connections.add(self.client_address)
+        if server.delay: time.sleep(server.delay)
+        body = json.dumps([{"path": url.path, "query": url.query, "n": len(server.requests)}]).encode()
+        self.send_response(server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try: self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError): pass # Client gave up (cancellation tests)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocationClientTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.stub = StubLocationAPI()
+        threading.Thread(target=self.stub.serve_forever, daemon=True).start()
+        lc.location_api_breaker.record_success() # Breakers are process-wide; start each test closed
+        self.client = lc.LocationClient(self.stub.base_url, {"X-API-KEY": "k"}, ttl=60, stale_ttl=600, max_connections=4)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    def tearDown(self):
+        self.stub.shutdown()
+        self.stub.server_close()
+
+    async def test_reuses_pooled_connection(self):
+        await self.client.start()
+        for country in ("France", "Spain", "Italy"):
+            await self.client.get("/getstatesincountry", {"country": country})
+        self.assertEqual(len(self.stub.requests), 3)
+        self.assertEqual(len(self.stub.connections), 1)
+        self.assertEqual({key for _, _, key in self.stub.requests}, {"k"})
+
+    async def test_caches_by_normalized_params(self):
+        first = await self.client.get("/getcitiesinstate", {"country": "France", "state": "Bretagne"})
+        again = await self.client.get("/getcitiesinstate", {"state": " bretagne", "country": "FRANCE "})
+        self.assertEqual(first, again)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    async def test_concurrent_misses_share_one_request(self):
+        self.stub.delay = 0.2
+        results = await asyncio.gather(*(self.client.get("/countrieslist", {}) for _ in range(10)))
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertTrue(all(r == results[0] for r in results))
+
+    async def test_stale_while_revalidate_and_stale_if_error(self):
+        self.client.ttl = 0.05
+        first = await self.client.get("/countrieslist", {})
+        await asyncio.sleep(0.1)
+        self.stub.delay = 0.2
+        self.assertEqual(await self.client.get("/countrieslist", {}), first) # Stale, served at once
+        self.assertEqual(await self.client.get("/countrieslist", {}), first) # Refresh already running: no second one
+        await asyncio.sleep(0.4)
+        self.assertEqual(len(self.stub.requests), 2)
+        refreshed = await self.client.get("/countrieslist", {})
+        self.assertNotEqual(refreshed, first)
+
+        # Upstream down: the stale entry keeps being served
+        await asyncio.sleep(0.1)
+        self.stub.delay, self.stub.status = 0.0, 500
+        self.client._cache[("/countrieslist",)] = (time.monotonic() - 1, refreshed) # Past TTL, within stale TTL
+        self.client._refresh_in_background = lambda *args: None
+        self.assertEqual(await self.client.get("/countrieslist", {}), refreshed)
+
+    async def test_errors_without_cache_propagate(self):
+        self.stub.status = 500
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.client.get("/countrieslist", {})
+
+    async def test_followers_survive_leader_cancellation(self):
+        self.stub.delay = 0.2
+        leader = asyncio.create_task(self.client.get("/countrieslist", {}))
+        await asyncio.sleep(0.05)
+        followers = [asyncio.create_task(self.client.get("/countrieslist", {})) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        with self.assertRaises(asyncio.CancelledError): await leader
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(len(self.stub.requests), 2) # The cancelled one, then one shared by the followers
+
+    async def test_callers_running_out_of_budget_do_not_trip_the_breaker(self):
+        self.stub.delay = 0.3
+        for budget in (0.05, -1): # Times out mid-request; no time left before the request
+            token = deadline._deadline.set(time.monotonic() + budget)
+            try:
+                with self.assertRaises((httpx.TimeoutException, deadline.DeadlineExceeded)):
+                    await self.client.get("/countrieslist", {})
+            finally: deadline._deadline.reset(token)
+        self.assertEqual(lc.location_api_breaker.failures, 0)
+
+    async def test_cancelled_half_open_trial_frees_the_breaker(self):
+        breaker = lc.location_api_breaker
+        breaker.failures, breaker.opened_at = breaker.failure_threshold, time.monotonic() - breaker.recovery_timeout
+        self.stub.delay = 0.2
+        trial = asyncio.create_task(self.client.get("/countrieslist", {}))
+        await asyncio.sleep(0.05)
+        trial.cancel()
+        with self.assertRaises(asyncio.CancelledError): await trial
+        self.assertFalse(breaker.trial_in_flight)
+        await self.client.get("/countrieslist", {}) # The next call is the trial, and closes the breaker
+        self.assertEqual(breaker.state, "closed")
+
+    async def test_cache_is_lru_bounded(self):
+        with mock.patch.object(lc, "CACHE_MAX_ENTRIES", 2):
+            for country in ("A", "B"): await self.client.get("/getstatesincountry", {"country": country})
+            await self.client.get("/getstatesincountry", {"country": "A"}) # A is now most recently used
+            await self.client.get("/getstatesincountry", {"country": "C"})
+        self.assertEqual(set(self.client._cache), {("/getstatesincountry", "a"), ("/getstatesincountry", "c")})
+
+
+if __name__ == "__main__":
+    unittest.main()